@@ -0,0 +1,95 @@
+# app/api/v1/endpoints/admin.py
+import time
+from typing import List
+
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.db.models import User
+from app.services.auth_service import get_admin_user
+from app.services.profiling_service import profiler, MODES
+from config import PROFILE_MAX_SECONDS, DATE_COL, SYMBOL_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL
+
+router = APIRouter()
+
+
+class Bar(BaseModel):
+    symbol: str
+    date: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+class BarsRequest(BaseModel):
+    bars: List[Bar]
+
+
+@router.post("/admin/bars")
+async def post_bars(
+    request: Request,
+    payload: BarsRequest,
+    user: User = Depends(get_admin_user)
+):
+    """Append new daily bars to the live dataset without reloading it."""
+    if not payload.bars:
+        raise HTTPException(status_code=400, detail="No bars to append")
+    bars = pd.DataFrame({
+        SYMBOL_COL: [bar.symbol for bar in payload.bars],
+        DATE_COL: [bar.date for bar in payload.bars],
+        OPEN_COL: [bar.open for bar in payload.bars],
+        HIGH_COL: [bar.high for bar in payload.bars],
+        LOW_COL: [bar.low for bar in payload.bars],
+        CLOSE_COL: [bar.close for bar in payload.bars],
+        VOLUME_COL: [bar.volume for bar in payload.bars],
+    })
+
+    started = time.perf_counter()
+    try:
+        store = await run_in_threadpool(request.app.state.dataset.append_bars, bars)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "version": store.version,
+        "rows": len(store),
+        "appended": len(bars),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+@router.post("/admin/reload")
+async def post_reload(request: Request, user: User = Depends(get_admin_user)):
+    """Reload the source parquet in the background and switch to it once it is ready; other workers follow the snapshot."""
+    try:
+        return await run_in_threadpool(request.app.state.dataset.reload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous dataset: {str(e)}")
+
+
+@router.get("/admin/dataset")
+def get_dataset(request: Request, user: User = Depends(get_admin_user)):
+    return request.app.state.dataset.status()
+
+
+@router.post("/admin/profile")
+async def post_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    mode: str = Query("sample", description="sample (collapsed stacks) or cprofile (pstats dump)"),
+    user: User = Depends(get_admin_user)
+):
+    """Profile this API worker for `seconds` while it serves traffic and return the profile."""
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile mode: {mode}")
+    try:
+        body = await run_in_threadpool(profiler.profile, seconds, mode)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not body:
+        return Response(status_code=204)
+    media_type, filename = MODES[mode]
+    return Response(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -3,30 +3,35 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.db.models import User
-from app.db.database import get_db
-from app.services.auth_service import verify_password, hash_password, create_access_token
+from app.db.database import get_auth_db
+from app.services.auth_service import (
+    verify_password_async, hash_password_async, create_access_token, find_user, commit,
+)
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+
+# bcrypt runs on the dedicated password pool and database calls go through the async
+# engine (or the threadpool without one), so these handlers never block the event loop
 @router.post("/register")
-def register_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
+async def register_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_auth_db)):
+    user = await find_user(db, form_data.username)
     if user:
         raise HTTPException(status_code=400, detail="User already exists")
     new_user = User(
         username=form_data.username,
-        hashed_password=hash_password(form_data.password),
+        hashed_password=await hash_password_async(form_data.password),
         subscription_tier="Free"
     )
     db.add(new_user)
-    db.commit()
+    await commit(db)
     return {"msg": "User created"}
 
 @router.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_auth_db)):
+    user = await find_user(db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token(data={"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
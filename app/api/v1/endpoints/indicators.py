@@ -1,22 +1,16 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
-from sqlalchemy.orm import Session
 from fastapi import Request
-import pandas as pd
-
-from app.services.loader import load_and_clean_data
-from app.utils.data_related_utils import clean_stock_data
-from app.services.indicators_service import (
-    calculate_simple_moving_average,
-    calculate_exponential_moving_average,
-    calculate_rsi,
-    calculate_macd,
-    calculate_bollinger_bands
-)
-
-from config import DATA_DIR, DATE_COL
+from pydantic import BaseModel, Field
+from typing import Dict, List
+
+from app.services.indicators_service import resolve_params
+from app.services.serialization_service import BATCH_FORMATS, negotiate_format, build_response, build_batch_response
+from app.services.http_cache_service import indicator_etag, conditional_response, with_cache_headers
+
+from config import BATCH_MAX_ITEMS
 from app.services.auth_service import get_current_user
-from app.db.database import get_db
-from app.services.tier_access_service import check_access
+from app.services.tier_access_service import check_access, check_screen_access
+from app.services.metrics_service import label_request
 from app.db.models import User
 
 router = APIRouter()
@@ -27,72 +21,104 @@ def hello_world():
     return {"message": "Hello, World!"}
 
 @router.get("/indicators/sma")
-def get_sma(
+async def get_sma(
     request: Request,
     stock_symbol: str = Query(...),
     start_date: str = Query(...),
     end_date: str = Query(...),
     period: int = Query(20),
-    db: Session = Depends(get_db),
+    response_format: str = Query(None, alias="format"),
     user: User = Depends(get_current_user)
 ):
-    print("entered sma")
-    check_access(user, "SMA", start_date, end_date)
-    df = request.app.state.stock_data
+    fmt = negotiate_format(request.headers.get("accept"), response_format)
+    usage = request.app.state.usage_counter
+    label_request("SMA", user, start_date, end_date)
+    cost = check_access(user, "SMA", start_date, end_date, usage)
+    pool = request.app.state.compute_pool
+    params = {"period": period}
+    etag = indicator_etag(pool.store.version, stock_symbol, "SMA", params, start_date, end_date, fmt)
+    cached = conditional_response(request, usage, user, etag)
+    if cached is not None:
+        return cached
 
     try:
-        result_df = calculate_simple_moving_average(df, stock_symbol, period, start_date, end_date)
+        dates, values = await pool.run(
+            "window", stock_symbol, "SMA", params, start_date, end_date, weight=cost
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to calculate SMA: {str(e)}")
-    user.requests_today += 1
-    db.commit()
-    return result_df.to_dict(orient="records")
+    usage.increment(user.username)
+    return with_cache_headers(build_response(stock_symbol, dates, values, fmt), etag)
 
 @router.get("/indicators/ema")
-def get_ema(
+async def get_ema(
     request: Request,
     stock_symbol: str = Query(...),
     start_date: str = Query(...),
     end_date: str = Query(...),
     period: int = Query(20),
-    db: Session = Depends(get_db),
+    response_format: str = Query(None, alias="format"),
     user: User = Depends(get_current_user)
 ):
-    check_access(user, "EMA", start_date, end_date)
-    df = request.app.state.stock_data
+    fmt = negotiate_format(request.headers.get("accept"), response_format)
+    usage = request.app.state.usage_counter
+    label_request("EMA", user, start_date, end_date)
+    cost = check_access(user, "EMA", start_date, end_date, usage)
+    pool = request.app.state.compute_pool
+    params = {"period": period}
+    etag = indicator_etag(pool.store.version, stock_symbol, "EMA", params, start_date, end_date, fmt)
+    cached = conditional_response(request, usage, user, etag)
+    if cached is not None:
+        return cached
 
     try:
-        result_df = calculate_exponential_moving_average(df, stock_symbol, period, start_date, end_date)
+        dates, values = await pool.run(
+            "window", stock_symbol, "EMA", params, start_date, end_date, weight=cost
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to calculate EMA: {str(e)}")
-    user.requests_today += 1
-    db.commit()
-    return result_df.to_dict(orient="records")
+    usage.increment(user.username)
+    return with_cache_headers(build_response(stock_symbol, dates, values, fmt), etag)
 
 @router.get("/indicators/rsi")
-def get_rsi(
+async def get_rsi(
     request: Request,
     stock_symbol: str = Query(...),
     start_date: str = Query(...),
     end_date: str = Query(...),
     period: int = Query(14),
-    db: Session = Depends(get_db),
+    response_format: str = Query(None, alias="format"),
     user: User = Depends(get_current_user)
 ):
-    check_access(user, "RSI", start_date, end_date)
-    df = request.app.state.stock_data
+    fmt = negotiate_format(request.headers.get("accept"), response_format)
+    usage = request.app.state.usage_counter
+    label_request("RSI", user, start_date, end_date)
+    cost = check_access(user, "RSI", start_date, end_date, usage)
+    pool = request.app.state.compute_pool
+    params = {"period": period}
+    etag = indicator_etag(pool.store.version, stock_symbol, "RSI", params, start_date, end_date, fmt)
+    cached = conditional_response(request, usage, user, etag)
+    if cached is not None:
+        return cached
 
     try:
-        result_df = calculate_rsi(df, stock_symbol, period, start_date, end_date)
+        dates, values = await pool.run(
+            "window", stock_symbol, "RSI", params, start_date, end_date, weight=cost
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to calculate RSI: {str(e)}")
 
-    user.requests_today += 1
-    db.commit()
-    return result_df.to_dict(orient="records")
+    usage.increment(user.username)
+    return with_cache_headers(build_response(stock_symbol, dates, values, fmt), etag)
 
 @router.get("/indicators/macd")
-def get_macd(
+async def get_macd(
     request: Request,
     stock_symbol: str = Query(...),
     start_date: str = Query(...),
@@ -100,40 +126,169 @@ def get_macd(
     fast_period: int = Query(12),
     slow_period: int = Query(26),
     signal_period: int = Query(9),
-    db: Session = Depends(get_db),
+    response_format: str = Query(None, alias="format"),
     user: User = Depends(get_current_user)
 ):
-    check_access(user, "MACD", start_date, end_date)
-    df = request.app.state.stock_data
+    fmt = negotiate_format(request.headers.get("accept"), response_format)
+    usage = request.app.state.usage_counter
+    label_request("MACD", user, start_date, end_date)
+    cost = check_access(user, "MACD", start_date, end_date, usage)
+    pool = request.app.state.compute_pool
+    params = {"fast_period": fast_period, "slow_period": slow_period, "signal_period": signal_period}
+    etag = indicator_etag(pool.store.version, stock_symbol, "MACD", params, start_date, end_date, fmt)
+    cached = conditional_response(request, usage, user, etag)
+    if cached is not None:
+        return cached
 
     try:
-        result_df = calculate_macd(df, stock_symbol, fast_period, slow_period, signal_period, start_date, end_date)
+        dates, values = await pool.run(
+            "window", stock_symbol, "MACD", params, start_date, end_date, weight=cost
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to calculate RSI: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to calculate MACD: {str(e)}")
 
-    user.requests_today += 1
-    db.commit()
-    return result_df.to_dict(orient="records")
+    usage.increment(user.username)
+    return with_cache_headers(build_response(stock_symbol, dates, values, fmt), etag)
 
 @router.get("/indicators/bollinger")
-def get_bollinger(
+async def get_bollinger(
     request: Request,
     stock_symbol: str = Query(...),
     start_date: str = Query(...),
     end_date: str = Query(...),
     period: int = Query(20),
     num_std_dev: int = Query(2),
-    db: Session = Depends(get_db),
+    response_format: str = Query(None, alias="format"),
     user: User = Depends(get_current_user)
 ):
-    check_access(user, "Bollinger", start_date, end_date)
-    df = request.app.state.stock_data
+    fmt = negotiate_format(request.headers.get("accept"), response_format)
+    usage = request.app.state.usage_counter
+    label_request("Bollinger", user, start_date, end_date)
+    cost = check_access(user, "Bollinger", start_date, end_date, usage)
+    pool = request.app.state.compute_pool
+    params = {"period": period, "num_std_dev": num_std_dev}
+    etag = indicator_etag(pool.store.version, stock_symbol, "Bollinger", params, start_date, end_date, fmt)
+    cached = conditional_response(request, usage, user, etag)
+    if cached is not None:
+        return cached
 
     try:
-        result_df = calculate_bollinger_bands(df, stock_symbol, period, num_std_dev, start_date, end_date)
+        dates, values = await pool.run(
+            "window", stock_symbol, "Bollinger", params, start_date, end_date, weight=cost
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to calculate RSI: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to calculate Bollinger Bands: {str(e)}")
+
+    usage.increment(user.username)
+    return with_cache_headers(build_response(stock_symbol, dates, values, fmt), etag)
+
+@router.get("/indicators/screen")
+async def get_screen(
+    request: Request,
+    indicator: str = Query(..., description="SMA, EMA, RSI, MACD or Bollinger"),
+    date: str = Query(...),
+    period: int = Query(None, gt=0),
+    fast_period: int = Query(12),
+    slow_period: int = Query(26),
+    signal_period: int = Query(9),
+    num_std_dev: int = Query(2),
+    response_format: str = Query(None, alias="format"),
+    user: User = Depends(get_current_user)
+):
+    params = {
+        "SMA": {"period": 20 if period is None else period},
+        "EMA": {"period": 20 if period is None else period},
+        "RSI": {"period": 14 if period is None else period},
+        "MACD": {"fast_period": fast_period, "slow_period": slow_period, "signal_period": signal_period},
+        "Bollinger": {"period": 20 if period is None else period, "num_std_dev": num_std_dev},
+    }
+    if indicator not in params:
+        raise HTTPException(status_code=400, detail=f"Unknown indicator: {indicator}")
+    fmt = negotiate_format(request.headers.get("accept"), response_format)
+    usage = request.app.state.usage_counter
+    label_request(indicator, user, date, date)
+    pool = request.app.state.compute_pool
+    cost = check_screen_access(user, indicator, len(pool.store.symbols), usage)
+    etag = indicator_etag(pool.store.version, None, indicator, params[indicator], date, date, fmt)
+    cached = conditional_response(request, usage, user, etag)
+    if cached is not None:
+        return cached
+
+    try:
+        symbols, dates, values = await pool.run("screen", indicator, params[indicator], date, weight=cost)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to screen {indicator}: {str(e)}")
+
+    usage.increment(user.username)
+    return with_cache_headers(build_response(symbols, dates, values, fmt), etag)
+
+
+class IndicatorSpec(BaseModel):
+    stock_symbol: str
+    indicator: str = Field(..., description="SMA, EMA, RSI, MACD or Bollinger")
+    start_date: str
+    end_date: str
+    params: Dict[str, int] = Field(default_factory=dict)
+
+
+class BatchRequest(BaseModel):
+    items: List[IndicatorSpec]
+
+
+@router.post("/indicators/batch")
+async def post_batch(
+    request: Request,
+    batch: BatchRequest,
+    response_format: str = Query(None, alias="format"),
+    user: User = Depends(get_current_user)
+):
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    fmt = negotiate_format(request.headers.get("accept"), response_format, formats=BATCH_FORMATS)
+
+    label_request(
+        "batch", user,
+        min((item.start_date for item in batch.items), default=None),
+        max((item.end_date for item in batch.items), default=None),
+    )
+
+    # Access checks and request accounting apply to every item on its own
+    usage = request.app.state.usage_counter
+    results = [None] * len(batch.items)
+    accepted = []
+    total_cost = 0
+    for i, item in enumerate(batch.items):
+        try:
+            params = resolve_params(item.indicator, item.params)
+            total_cost += check_access(user, item.indicator, item.start_date, item.end_date, usage)
+        except HTTPException as e:
+            results[i] = ({"status_code": e.status_code, "detail": e.detail}, None)
+            continue
+        except ValueError as e:
+            results[i] = ({"status_code": 400, "detail": str(e)}, None)
+            continue
+        usage.increment(user.username)
+        accepted.append((i, (item.stock_symbol, item.indicator, params, item.start_date, item.end_date)))
+
+    pool = request.app.state.compute_pool
+    try:
+        windows = await pool.run("batch", [spec for _, spec in accepted], weight=total_cost)
+    except HTTPException:
+        usage.increment(user.username, -len(accepted))
+        raise
+    except Exception as e:
+        usage.increment(user.username, -len(accepted))
+        raise HTTPException(status_code=500, detail=f"Failed to calculate batch: {str(e)}")
 
-    user.requests_today += 1
-    db.commit()
-    return result_df.to_dict(orient="records")
\ No newline at end of file
+    for (i, spec), (dates, values) in zip(accepted, windows):
+        results[i] = ({"status_code": 200}, (spec[0], dates, values))
+    return build_batch_response([
+        ({"stock_symbol": item.stock_symbol, "indicator": item.indicator, "params": item.params, **status}, result)
+        for item, (status, result) in zip(batch.items, results)
+    ], fmt)
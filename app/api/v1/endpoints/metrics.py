@@ -0,0 +1,13 @@
+# app/api/v1/endpoints/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.services.metrics_service import registry, CONTENT_TYPE
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Request and per-stage latency histograms in the Prometheus text format."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,61 @@
+"""
+Throughput of concurrent uncached 3-year Bollinger windows through ComputePool in
+thread and process mode, on a synthetic store.
+
+Run with: python -m app.benchmarks.bench_compute_pool [workers]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.services.compute_pool import ComputePool
+from app.services.stock_store import StockStore
+from config import SYMBOL_COL, DATE_COL, CLOSE_COL
+
+
+def synthetic_store(symbols: int = 200, days: int = 2000, seed: int = 0) -> StockStore:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2015-01-01", periods=days)
+    frame = pd.DataFrame({
+        SYMBOL_COL: np.repeat([f"S{i:04d}" for i in range(symbols)], days),
+        DATE_COL: np.tile(dates, symbols),
+        CLOSE_COL: 100 + rng.standard_normal(symbols * days).cumsum() / 10,
+    })
+    return StockStore.from_frame(frame, version="bench")
+
+
+async def _drive(pool, store, requests):
+    symbols = store.symbols
+    calls = [
+        pool.run("window", symbols[i % len(symbols)], "Bollinger", {"period": 20, "num_std_dev": 2},
+                 "2019-01-01", "2021-12-31", weight=0)
+        for i in range(requests)
+    ]
+    await asyncio.gather(*calls)
+
+
+def run(workers: int, requests: int = 400) -> dict:
+    store = synthetic_store()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store.save(Path(tmp) / "snapshot")
+        for mode in ("thread", "process"):
+            pool = ComputePool(store, cache=None, mode=mode, workers=workers, timeout=600,
+                               snapshot_dir=Path(tmp) / "snapshot", worker_cache_bytes=0)
+            asyncio.run(_drive(pool, store, workers * 2))  # warm up workers
+            started = time.perf_counter()
+            asyncio.run(_drive(pool, store, requests))
+            results[mode] = requests / (time.perf_counter() - started)
+            pool.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    for mode, rate in run(workers).items():
+        print(f"{mode:>7} mode, {workers} workers: {rate:,.0f} requests/s")
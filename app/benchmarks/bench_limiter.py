@@ -0,0 +1,43 @@
+"""
+Throughput of LimiterEngine.check over a mix of tiers, indicators and window lengths.
+
+Run with: python -m app.benchmarks.bench_limiter
+"""
+import time
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from app.services.tier_access_service import LimiterEngine
+from app.services.usage_service import InProcessUsageCounter
+
+WINDOWS = [("2022-01-01", "2022-01-31"), ("2022-01-01", "2022-03-31"), ("2021-01-01", "2021-12-31"), ("2020-01-01", "2022-12-31")]
+INDICATORS = ["SMA", "EMA", "RSI", "MACD", "Bollinger"]
+
+
+def run(checks: int = 200_000, users: int = 1000) -> dict:
+    engine = LimiterEngine()
+    usage = InProcessUsageCounter()
+    tiers = list(engine.policies)
+    population = [
+        SimpleNamespace(username=f"user{i}", subscription_tier=tiers[i % len(tiers)])
+        for i in range(users)
+    ]
+    outcomes = {}
+    started = time.perf_counter()
+    for i in range(checks):
+        start_date, end_date = WINDOWS[i % len(WINDOWS)]
+        try:
+            engine.check(population[i % users], INDICATORS[i % len(INDICATORS)], start_date, end_date, usage)
+            status = 200
+        except HTTPException as e:
+            status = e.status_code
+        outcomes[status] = outcomes.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    return {"checks_per_second": checks / elapsed, "microseconds_per_check": elapsed / checks * 1e6, "outcomes": outcomes}
+
+
+if __name__ == "__main__":
+    result = run()
+    print(f"{result['checks_per_second']:,.0f} checks/s ({result['microseconds_per_check']:.2f} us/check), "
+          f"outcomes by status: {result['outcomes']}")
@@ -0,0 +1,46 @@
+"""
+Memory report: bytes per row of the cleaned pandas frame against the StockStore in its
+float64 layout and in its compact layout (float32 OHLC, datetime64[D] dates, int64 volume).
+
+Run with: python -m app.benchmarks.bench_memory [symbols] [days]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app.services.stock_store import StockStore
+from app.utils import clean_stock_data
+from config import SYMBOL_COL, DATE_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL
+
+
+def synthetic_source(symbols: int, days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(symbols * days).cumsum() * 0.1
+    return pd.DataFrame({
+        SYMBOL_COL: np.repeat([f"S{i:05d}" for i in range(symbols)], days),
+        DATE_COL: np.tile(pd.bdate_range("2021-01-01", periods=days), symbols),
+        OPEN_COL: close, HIGH_COL: close + 1, LOW_COL: close - 1, CLOSE_COL: close,
+        VOLUME_COL: rng.integers(1_000, 1_000_000, symbols * days).astype(np.float64),
+    })
+
+
+def run(symbols: int = 2000, days: int = 750) -> dict:
+    frame = clean_stock_data(synthetic_source(symbols, days))
+    rows = len(frame)
+    return {
+        "rows": rows,
+        "pandas frame": frame.memory_usage(index=True).sum() / rows,
+        "pandas frame (deep)": frame.memory_usage(index=True, deep=True).sum() / rows,
+        "StockStore": StockStore.from_frame(frame).memory_report()["bytes_per_row"],
+        "StockStore compact": StockStore.from_frame(frame, compact=True).memory_report()["bytes_per_row"],
+    }
+
+
+if __name__ == "__main__":
+    report = run(*(int(arg) for arg in sys.argv[1:3]))
+    rows = report.pop("rows")
+    baseline = report["pandas frame"]
+    print(f"{rows} rows")
+    for name, bytes_per_row in report.items():
+        print(f"{name:22s} {bytes_per_row:7.2f} bytes/row  ({bytes_per_row / baseline:.0%} of the frame)")
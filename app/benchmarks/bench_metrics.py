@@ -0,0 +1,52 @@
+"""
+Cost of a timing span outside a measured request (METRICS_ENABLED=0, or code called
+directly) and inside one, plus recording a ten-span request into the registry.
+
+Run with: python -m app.benchmarks.bench_metrics
+"""
+import time
+
+from app.services import metrics_service
+from app.services.metrics_service import MetricsRegistry, RequestMetrics, span
+
+STAGES = ("jwt_decode", "check_access", "compute", "worker", "symbol_slice", "kernel", "serialize")
+
+
+def _per_call(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def _span():
+    with span("kernel"):
+        pass
+
+
+def run(calls: int = 200_000) -> dict:
+    baseline = _per_call(lambda: None, calls)
+    disabled = _per_call(_span, calls)
+
+    request = RequestMetrics()
+    token = metrics_service._current.set(request)
+    try:
+        enabled = _per_call(_span, calls)
+    finally:
+        metrics_service._current.reset(token)
+
+    registry = MetricsRegistry()
+    request = RequestMetrics()
+    request.labels = ("SMA", "Pro", "1y")
+    request.spans = [(stage, 0.001) for stage in STAGES] * 2
+    record = _per_call(lambda: registry.record("get_sma", "GET", 200, 0.005, request), calls // 10)
+    return {
+        "span_disabled_ns": disabled - baseline,
+        "span_enabled_ns": enabled - baseline,
+        "record_request_ns": record - baseline,
+    }
+
+
+if __name__ == "__main__":
+    for name, ns in run().items():
+        print(f"{name:20s} {ns:8.0f} ns")
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark of the JSON records response: the previous path (DataFrame -> list of
+dicts -> jsonable_encoder -> json.dumps, as FastAPI does for a returned list) against
+records_json on the NumPy columns.
+
+Run with: python -m app.benchmarks.bench_serialization
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.services.indicators_service import to_output_frame
+from app.services.serialization_service import records_json
+from config import MACD_COL, SIGNAL_COL, HIST_COL
+
+WINDOWS = {"1y": 252, "3y": 756}
+
+
+def dataframe_path(stock_symbol, dates, values) -> bytes:
+    records = to_output_frame(stock_symbol, dates, values).to_dict(orient="records")
+    return JSONResponse(jsonable_encoder(records)).body
+
+
+def numpy_path(stock_symbol, dates, values) -> bytes:
+    return records_json(stock_symbol, dates, values)
+
+
+def synthetic_window(rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=rows).to_numpy()
+    macd = rng.normal(size=rows).cumsum()
+    macd[:25] = np.nan
+    signal = pd.Series(macd).ewm(span=9, adjust=False).mean().to_numpy()
+    return dates, {MACD_COL: macd, SIGNAL_COL: signal, HIST_COL: macd - signal}
+
+
+def run(number: int = 200) -> dict:
+    results = {}
+    for name, rows in WINDOWS.items():
+        dates, values = synthetic_window(rows)
+        results[name] = {
+            path.__name__: min(timeit.repeat(lambda: path("AAPL", dates, values), number=number, repeat=5)) / number
+            for path in (dataframe_path, numpy_path)
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for name, timings in run().items():
+        old, new = timings["dataframe_path"], timings["numpy_path"]
+        print(f"{name} ({WINDOWS[name]} rows): dataframe {old * 1e3:.3f} ms, numpy {new * 1e3:.3f} ms, {old / new:.1f}x")
@@ -0,0 +1,270 @@
+"""
+Benchmark suite: loader, indicator calculators, serialisation and the HTTP endpoints on
+synthetic data, with a regression check against a stored baseline.
+
+Every case reports throughput, p50/p99 latency and the peak memory (tracemalloc) of
+one call. The endpoints run in-process through FastAPI's TestClient against a stubbed
+app state: a Premium user without rate limits stands in for auth, and an in-memory
+usage counter stands in for the database.
+
+    python -m app.benchmarks.suite                      # run and compare with baseline.json
+    python -m app.benchmarks.suite --update-baseline    # run and store the results as the baseline
+    python -m app.benchmarks.suite --symbols 50 --days 252 --only calc
+
+A case regresses when its p50 latency or its peak memory exceeds the baseline by more
+than --tolerance (default 50%); the run then exits with status 1. p99 and throughput
+are reported but not gated, as they are too noisy on shared machines.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.benchmarks.synthetic import synthetic_ohlc
+from app.services import tier_access_service
+from app.services.indicators_service import (
+    calculate_simple_moving_average, calculate_exponential_moving_average, calculate_rsi, calculate_macd,
+    calculate_bollinger_bands, compute_indicator_window,
+)
+from app.services.loader import load_and_clean_data, load_stock_store
+from app.services.serialization_service import build_response, iter_ndjson
+from config import TIER_POLICIES
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+DEFAULT_TOLERANCE = 0.5
+# Changes smaller than these are timer and allocator noise, whatever the relative change
+NOISE_FLOOR = {"p50_ms": 0.5, "peak_mb": 0.25}
+
+# Calculator calls, each run over a short (1 month) and a long (whole history) window.
+# Non-default parameters, so the kernels run: default-parameter series are materialized
+# with the store and only sliced (MATERIALIZED_CALCULATORS)
+CALCULATORS = {
+    "sma": lambda store, symbol, start, end: calculate_simple_moving_average(store, symbol, 50, start, end),
+    "ema": lambda store, symbol, start, end: calculate_exponential_moving_average(store, symbol, 50, start, end),
+    "rsi": lambda store, symbol, start, end: calculate_rsi(store, symbol, 21, start, end),
+    "macd": lambda store, symbol, start, end: calculate_macd(store, symbol, 5, 35, 5, start, end),
+    "bollinger": lambda store, symbol, start, end: calculate_bollinger_bands(store, symbol, 50, 2.5, start, end),
+}
+MATERIALIZED_CALCULATORS = {
+    "sma": lambda store, symbol, start, end: calculate_simple_moving_average(store, symbol, 20, start, end),
+    "ema": lambda store, symbol, start, end: calculate_exponential_moving_average(store, symbol, 20, start, end),
+    "rsi": lambda store, symbol, start, end: calculate_rsi(store, symbol, 14, start, end),
+    "macd": lambda store, symbol, start, end: calculate_macd(store, symbol, 12, 26, 9, start, end),
+    "bollinger": lambda store, symbol, start, end: calculate_bollinger_bands(store, symbol, 20, 2, start, end),
+}
+
+
+def measure(fn, repeat: int, warmup: int = 2) -> dict:
+    """
+    Time `repeat` calls of `fn()` after `warmup` untimed ones, then trace one more call
+    for its peak memory.
+
+    Returns:
+        dict: throughput (calls/s), p50_ms, p99_ms and peak_mb
+    """
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "throughput": round(repeat / samples.sum(), 2),
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1e3, 4),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1e3, 4),
+        "peak_mb": round(peak / 2 ** 20, 3),
+    }
+
+
+def _cycle(values):
+    state = {"i": -1}
+
+    def next_value():
+        state["i"] = (state["i"] + 1) % len(values)
+        return values[state["i"]]
+    return next_value
+
+
+def loader_cases(source, repeat):
+    yield "loader/load_and_clean_data", lambda: load_and_clean_data(source), repeat
+    yield "loader/load_stock_store_cold", lambda: load_stock_store(source, snapshot_dir=None, backend="memory"), repeat
+
+
+def calculator_cases(store, repeat):
+    symbol = _cycle(list(store.symbols))
+    dates = store.get_symbol_columns(store.symbols[0])["date"]
+    windows = {
+        "short": (str(dates[-21])[:10], str(dates[-1])[:10]),
+        "long": (str(dates[0])[:10], str(dates[-1])[:10]),
+    }
+    for name, calculate in CALCULATORS.items():
+        for window, (start, end) in windows.items():
+            yield f"calc/{name}_{window}", (lambda c=calculate, s=start, e=end: c(store, symbol(), s, e)), repeat
+    for name, calculate in MATERIALIZED_CALCULATORS.items():
+        for window, (start, end) in windows.items():
+            yield (f"calc/{name}_materialized_{window}",
+                   (lambda c=calculate, s=start, e=end: c(store, symbol(), s, e)), repeat)
+
+
+def serialization_cases(store, repeat):
+    dates, values = compute_indicator_window(store, store.symbols[0], "MACD", {}, None, None)
+    for fmt in ("records", "columnar", "arrow"):
+        yield f"serialize/{fmt}_long", (lambda fmt=fmt: build_response(store.symbols[0], dates, values, fmt)), repeat
+    # The ndjson response streams; time producing its whole body
+    yield "serialize/ndjson_long", lambda: b"".join(iter_ndjson(store.symbols[0], dates, values)), repeat
+
+
+def endpoint_cases(store, repeat):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services.auth_service import get_current_user
+    from app.services.compute_pool import ComputePool
+    from app.services.indicator_cache import IndicatorCache
+    from app.services.usage_service import InProcessUsageCounter
+
+    # Stubbed state instead of the startup hooks: no parquet, database or rate limits
+    cache = IndicatorCache()
+    app.state.stock_data = store
+    app.state.indicator_cache = cache
+    app.state.compute_pool = ComputePool(store, cache, mode="thread", snapshot_dir=None)
+    app.state.usage_counter = InProcessUsageCounter()
+    user = SimpleNamespace(username="bench", subscription_tier="Premium", requests_today=0, last_request_date=None)
+    app.dependency_overrides[get_current_user] = lambda: user
+    unlimited = dict(TIER_POLICIES, Premium=dict(TIER_POLICIES["Premium"], burst=1e18, refill_per_second=1e18))
+    limiter, tier_access_service.limiter = tier_access_service.limiter, tier_access_service.LimiterEngine(unlimited)
+
+    client = TestClient(app)
+    symbol = _cycle(list(store.symbols))
+    dates = store.get_symbol_columns(store.symbols[0])["date"]
+    first, last, mid = str(dates[0])[:10], str(dates[-1])[:10], str(dates[len(dates) // 2])[:10]
+    batch = {"items": [
+        {"stock_symbol": s, "indicator": "RSI", "start_date": first, "end_date": last} for s in store.symbols[:10]
+    ]}
+
+    def get(path, **params):
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+
+    try:
+        yield "http/sma_long", lambda: get("/api/v1/indicators/sma", stock_symbol=symbol(), start_date=first, end_date=last), repeat
+        yield "http/macd_long_arrow", lambda: get("/api/v1/indicators/macd", stock_symbol=symbol(), start_date=first,
+                                                 end_date=last, format="arrow"), repeat
+        yield "http/screen_rsi", lambda: get("/api/v1/indicators/screen", indicator="RSI", date=mid), repeat
+        yield "http/batch_10_rsi", lambda: client.post("/api/v1/indicators/batch", json=batch).raise_for_status(), repeat
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        tier_access_service.limiter = limiter
+        app.state.compute_pool.shutdown()
+
+
+GROUPS = ("loader", "calc", "serialize", "http")
+
+
+def run(symbols: int = 200, days: int = 756, repeat: int = 30, only=None) -> dict:
+    """Run the selected groups (all by default) on a fresh synthetic dataset."""
+    only = set(only or GROUPS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "stocks.parquet"
+        synthetic_ohlc(symbols, days).to_parquet(source)
+        store = load_stock_store(source, snapshot_dir=None, backend="memory")
+
+        cases = []
+        if "loader" in only:
+            cases.append(loader_cases(source, max(3, repeat // 10)))
+        if "calc" in only:
+            cases.append(calculator_cases(store, repeat))
+        if "serialize" in only:
+            cases.append(serialization_cases(store, repeat))
+        if "http" in only:
+            cases.append(endpoint_cases(store, repeat))
+
+        for group in cases:
+            for name, fn, case_repeat in group:
+                # Endpoints and the loader print progress; keep the report readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results[name] = measure(fn, case_repeat)
+    return {"dataset": {"symbols": symbols, "days": days}, "results": results}
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Regressions of `report` against `baseline`: cases whose p50 latency or peak memory
+    grew by more than `tolerance` (and by more than NOISE_FLOOR). Cases missing from
+    either side are skipped.
+
+    Returns:
+        list: (case, metric, baseline value, current value) tuples
+    """
+    if baseline.get("dataset") != report.get("dataset"):
+        raise ValueError(f"Baseline was recorded on {baseline.get('dataset')}, this run used {report.get('dataset')}")
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "peak_mb"):
+            growth = current[metric] - previous[metric]
+            if growth > previous[metric] * tolerance and growth > NOISE_FLOOR[metric]:
+                regressions.append((name, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def _print_report(report, baseline):
+    print(f"{'case':32s} {'calls/s':>10s} {'p50 ms':>9s} {'p99 ms':>9s} {'peak MB':>8s}  vs baseline p50")
+    for name, result in report["results"].items():
+        previous = (baseline or {}).get("results", {}).get(name)
+        change = f"{result['p50_ms'] / previous['p50_ms'] - 1:+.0%}" if previous and previous["p50_ms"] else "-"
+        print(f"{name:32s} {result['throughput']:10.1f} {result['p50_ms']:9.3f} {result['p99_ms']:9.3f} "
+              f"{result['peak_mb']:8.2f}  {change}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--days", type=int, default=756)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--only", nargs="*", choices=GROUPS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = run(args.symbols, args.days, args.repeat, args.only)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    _print_report(report, baseline)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0
+    regressions = compare(report, baseline, args.tolerance)
+    for name, metric, previous, current in regressions:
+        print(f"REGRESSION {name}: {metric} {previous} -> {current}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
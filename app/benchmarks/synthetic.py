@@ -0,0 +1,44 @@
+"""
+Synthetic OHLCV data for benchmarks: `symbols` x `days` business days of random-walk
+prices shaped like the raw source parquet (unsorted rows, a sprinkling of missing
+prices for clean_stock_data to fill).
+"""
+import numpy as np
+import pandas as pd
+
+from config import SYMBOL_COL, DATE_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL
+
+
+def synthetic_ohlc(symbols=500, days: int = 756, seed: int = 0, start: str = "2021-01-01",
+                   missing_fraction: float = 0.001, shuffle: bool = True) -> pd.DataFrame:
+    """
+    Parameters:
+        symbols (int | list): Number of symbols (named SYM00000, ...), or their names
+        days (int): Business days per symbol
+        seed (int): Random seed; equal arguments always give the same frame
+        start (str): First date
+        missing_fraction (float): Share of OHLC values set to NaN
+        shuffle (bool): Return the rows in random order, as a raw export may be
+
+    Returns:
+        pd.DataFrame: One row per (symbol, date) with the source's columns
+    """
+    names = [f"SYM{i:05d}" for i in range(symbols)] if isinstance(symbols, int) else list(symbols)
+    rng = np.random.default_rng(seed)
+    rows = len(names) * days
+    close = 100 * np.exp(rng.normal(0, 0.01, (len(names), days)).cumsum(axis=1)).ravel()
+    spread = np.abs(rng.normal(0, 0.005, rows)) * close
+    frame = pd.DataFrame({
+        SYMBOL_COL: np.repeat(names, days),
+        DATE_COL: np.tile(pd.bdate_range(start, periods=days).to_numpy(), len(names)),
+        OPEN_COL: close + rng.normal(0, 0.5, rows) * spread,
+        HIGH_COL: close + spread,
+        LOW_COL: close - spread,
+        CLOSE_COL: close,
+        VOLUME_COL: rng.integers(1_000, 5_000_000, rows),
+    })
+    for col in (OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL):
+        frame.loc[rng.random(rows) < missing_fraction, col] = np.nan
+    if shuffle:
+        frame = frame.sample(frac=1, random_state=seed, ignore_index=True)
+    return frame
@@ -1,14 +1,64 @@
 # db/database.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import StaticPool
 
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_ASYNC, ASYNC_DATABASE_URL,
+)
 
-engine = create_engine(DATABASE_URL)
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def engine_options(url) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine.
+
+    Server databases get a QueuePool sized from config. SQLite connections may be used
+    from several threads, and an in-memory SQLite database is kept on one shared
+    connection (StaticPool) so that every session sees the same tables.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if url.database in (None, "", ":memory:"):
+            options["poolclass"] = StaticPool
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def async_url(url) -> str:
+    """Swap a URL's driver for its asyncio counterpart (asyncpg / aiosqlite)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC or ASYNC_DATABASE_URL:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_database_url = ASYNC_DATABASE_URL or async_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_database_url, **engine_options(_async_database_url))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -17,3 +67,10 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Sessions for the auth queries: async when an async engine is configured, else sync
+get_auth_db = get_async_db if AsyncSessionLocal is not None else get_db
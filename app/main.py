@@ -1,15 +1,84 @@
 from fastapi import FastAPI
-from app.api.v1.endpoints import indicators, auth
-from app.services.loader import load_and_clean_data
+from app.api.v1.endpoints import indicators, auth, admin, metrics
+from app.services.loader import load_stock_store
+from app.services.indicator_cache import IndicatorCache
+from app.services.compute_pool import ComputePool
+from app.services.incremental_service import IncrementalIngestor
+from app.services.dataset_service import DatasetManager, DatasetWatcher, SnapshotFollower
+from app.services.usage_service import create_usage_counter, SqlUsageSink, UsageFlusher
+from app.db.database import SessionLocal, engine
+from app.db.models import Base
+from app.services.auth_service import password_pool
+from app.services.metrics_service import MetricsMiddleware, registry as metrics_registry
+from config import STOCK_DATA_MMAP, STOCK_DATA_WATCH_SECONDS, SNAPSHOT_FOLLOW_SECONDS, METRICS_ENABLED
 
 app = FastAPI(debug=True)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+metrics_registry.register_collector("password_pool", password_pool.metric_samples)
 
 @app.on_event("startup")
 def load_parquet_data():
-    app.state.stock_data = load_and_clean_data()
+    app.state.stock_data = load_stock_store(mmap=STOCK_DATA_MMAP)
+    app.state.indicator_cache = IndicatorCache()
+    app.state.indicator_cache.invalidate(app.state.stock_data.version)
+    app.state.compute_pool = ComputePool(app.state.stock_data, app.state.indicator_cache)
+    app.state.ingestor = IncrementalIngestor()
+    app.state.dataset = DatasetManager(app.state, load=lambda: load_stock_store(mmap=STOCK_DATA_MMAP))
+    metrics_registry.register_collector("indicator_cache", app.state.indicator_cache.metric_samples)
+
+@app.on_event("startup")
+def start_dataset_watcher():
+    app.state.dataset_watcher = None
+    if STOCK_DATA_WATCH_SECONDS > 0:
+        app.state.dataset_watcher = DatasetWatcher(app.state.dataset)
+        app.state.dataset_watcher.start()
+
+@app.on_event("startup")
+def start_snapshot_follower():
+    # Other workers' appends and reloads reach this one through the snapshot
+    app.state.snapshot_follower = None
+    if SNAPSHOT_FOLLOW_SECONDS > 0 and app.state.dataset.snapshot_dir is not None:
+        app.state.snapshot_follower = SnapshotFollower(app.state.dataset)
+        app.state.snapshot_follower.start()
+
+@app.on_event("shutdown")
+def stop_dataset_watcher():
+    if app.state.dataset_watcher is not None:
+        app.state.dataset_watcher.stop()
+    if app.state.snapshot_follower is not None:
+        app.state.snapshot_follower.stop()
+
+@app.on_event("shutdown")
+def stop_compute_pool():
+    app.state.compute_pool.shutdown()
+
+@app.on_event("startup")
+def create_sqlite_tables():
+    # The SQLite fallback (DATABASE_URL=sqlite:///...) is created on first start
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(bind=engine)
+
+@app.on_event("startup")
+def start_usage_accounting():
+    app.state.usage_counter = create_usage_counter()
+    app.state.usage_flusher = UsageFlusher(app.state.usage_counter, SqlUsageSink(SessionLocal))
+    app.state.usage_flusher.start()
+
+@app.on_event("shutdown")
+def stop_usage_accounting():
+    app.state.usage_flusher.stop()
+
+@app.on_event("shutdown")
+def stop_password_pool():
+    password_pool.shutdown()
+
 @app.get("/")
 def test():
     return {"msg": "it works"}
 app.include_router(indicators.router, prefix="/api/v1", tags=["Indicators"])
 app.include_router(auth.router, tags=["Auth"])
+app.include_router(admin.router, prefix="/api/v1", tags=["Admin"])
+if METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["Metrics"])
 
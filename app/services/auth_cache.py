@@ -0,0 +1,109 @@
+# services/auth_cache.py
+"""
+Caches that keep authentication off the database on the hot path.
+
+- token_cache: verified JWT claims keyed by the SHA-256 digest of the token. An entry
+  never outlives the token's own `exp`, so an expired token is re-verified (and
+  rejected) by jwt.decode.
+- user_cache: a detached copy of the user's tier and quota state keyed by username,
+  with a short TTL. Updates or deletes of a User through the ORM invalidate it at
+  once; changes made outside this process are picked up when the TTL runs out.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from app.db.models import User
+from config import (
+    TOKEN_CACHE_TTL_SECONDS, TOKEN_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES,
+)
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Expiry is wall-clock time (time.time) so that it can be capped by absolute
+    timestamps such as a JWT's `exp`.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the live value for `key`, or None if it is missing or expired."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, expires_at: float = None):
+        """Store `value` for `ttl` seconds, or until `expires_at` if that is sooner."""
+        deadline = self.clock() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._entries[key] = (value, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TTLCache(TOKEN_CACHE_TTL_SECONDS, TOKEN_CACHE_MAX_ENTRIES)
+user_cache = TTLCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def detached_user(user: User) -> User:
+    """Transient copy of the fields requests read, without the password hash."""
+    return User(
+        username=user.username,
+        subscription_tier=user.subscription_tier,
+        requests_today=user.requests_today,
+        last_request_date=user.last_request_date,
+        created_at=user.created_at,
+    )
+
+
+def invalidate_user(username: str):
+    user_cache.pop(username)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.username)
@@ -1,11 +1,18 @@
 from datetime import datetime, timedelta, date
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from starlette.concurrency import run_in_threadpool
+from app.db.database import get_auth_db
 from app.db.models import User
+from app.services.metrics_service import span
+from app.services.auth_cache import token_cache, user_cache, token_digest, detached_user
+from app.services.password_pool import PasswordHashPool
+from config import ADMIN_USERNAMES
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
@@ -13,6 +20,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+password_pool = PasswordHashPool()
 
 
 def hash_password(password):
@@ -23,6 +31,14 @@ def verify_password(plain, hashed):
     return pwd_context.verify(plain, hashed)
 
 
+async def hash_password_async(password):
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain, hashed):
+    return await password_pool.run(verify_password, plain, hashed)
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -30,25 +46,69 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def find_user(db, username: str):
+    """Look a user up through an AsyncSession, or through a sync Session on the threadpool."""
+    if isinstance(db, AsyncSession):
+        result = await db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
+    return await run_in_threadpool(lambda: db.query(User).filter(User.username == username).first())
+
+
+async def commit(db):
+    if isinstance(db, AsyncSession):
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_auth_db)) -> User:
+    usage = getattr(request.app.state, "usage_counter", None)
+    digest = token_digest(token)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = token_cache.get(digest)
+        if payload is None:
+            with span("jwt_decode"):
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            token_cache.put(digest, payload, expires_at=payload.get("exp"))
         username = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        user = db.query(User).filter(User.username == username).first()
+        # With in-memory usage counters the user row is only read for its tier, so a
+        # recently loaded copy is served without a database query
+        if usage is not None:
+            user = user_cache.get(username)
+            if user is not None:
+                return user
+
+        with span("user_query"):
+            user = await find_user(db, username)
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
 
+        # With in-memory usage counters the day rollover is handled by the counter itself;
+        # the persisted count only seeds it the first time this user is seen
+        if usage is not None:
+            usage.seed(user.username, user.last_request_date, user.requests_today)
+            user = detached_user(user)
+            user_cache.put(username, user)
+            return user
+
         # Reset requests_today if a new day has started
         today = date.today()
         if user.last_request_date != today:
             user.requests_today = 0
             user.last_request_date = today
-            db.commit()
+            with span("db_commit"):
+                await commit(db)
 
         return user
 
     except JWTError:
-        raise HTTPException(status_code=403, detail="Invalid token")
\ No newline at end of file
+        raise HTTPException(status_code=403, detail="Invalid token")
+
+
+async def get_admin_user(user: User = Depends(get_current_user)) -> User:
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
@@ -0,0 +1,253 @@
+# services/batch_indicators_service.py
+"""
+Universe-wide indicator engine.
+
+Computes one indicator for every symbol of a StockStore in a single pass over the
+(symbol, date)-sorted columns, instead of one calculate_* call per symbol. Each symbol
+occupies a contiguous segment of the store, so the rolling and EWM kernels run once
+over the whole close array and are then corrected at the segment boundaries; the
+results come back aligned with the store's rows.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+from app.services.indicators_service import INDICATORS, to_output_frame, compute_indicator_window, resolve_params
+from app.services.partitioned_store import PartitionedStockStore
+from app.services.metrics_service import span
+from config import (
+    DATE_COL, CLOSE_COL, SMA_COL, EMA_COL, RSI_COL, MACD_COL, SIGNAL_COL, HIST_COL,
+    UPPER_BB_COL, LOWER_BB_COL,
+)
+
+
+class SegmentWindowIndexer(BaseIndexer):
+    """
+    Trailing rolling window that never reaches back past the start of its symbol segment.
+
+    Once a window is cut at a segment start, pandas' rolling kernels re-initialise their
+    running sums, so each symbol is aggregated exactly as in a per-symbol rolling pass.
+    """
+
+    def __init__(self, offsets, window_size):
+        super().__init__(window_size=window_size)
+        self.segment_starts = np.repeat(offsets[:-1], np.diff(offsets))
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.segment_starts).astype(np.int64)
+        return start, end
+
+
+def _segmented_rolling(values, offsets, window, stat):
+    """Rolling `stat` (with min_periods=window) restarted at every symbol boundary."""
+    rolling = pd.Series(values).rolling(SegmentWindowIndexer(offsets, window), min_periods=window)
+    return getattr(rolling, stat)().to_numpy()
+
+
+def _segmented_ewm(values, offsets, alpha):
+    """
+    adjust=False EWM restarted at every symbol boundary.
+
+    Each segment is first shifted and scaled to O(1) (the EWM is linear, so this is
+    undone exactly afterwards). An ungrouped pass then leaks the previous segment's
+    state into segment start s as d = y[s] - z[s]; that error decays exactly as
+    (1 - alpha) ** (t - s), so it is subtracted in one vectorised step.
+    Inputs with NaN fall back to a grouped EWM.
+    """
+    counts = np.diff(offsets)
+    if np.isnan(values).any():
+        codes = np.repeat(np.arange(len(counts)), counts)
+        return pd.Series(values).groupby(codes, sort=False).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    if len(values) == 0:
+        return values.copy()
+
+    starts = offsets[:-1]
+    level = np.repeat(values[starts], counts)
+    deviation = values - level
+    scale = np.maximum.reduceat(np.abs(deviation), starts)
+    scale[scale == 0] = 1.0
+    scale = np.repeat(scale, counts)
+    z = deviation / scale
+
+    out = pd.Series(z).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    leaked = np.repeat(out[starts] - z[starts], counts)
+    positions = np.arange(len(values)) - np.repeat(starts, counts)
+    return (out - leaked * (1 - alpha) ** positions) * scale + level
+
+
+def _span_alpha(span):
+    return 2 / (span + 1)
+
+
+def batch_sma(close, offsets, period):
+    return {SMA_COL: _segmented_rolling(close, offsets, period, "mean")}
+
+
+def batch_ema(close, offsets, period):
+    return {EMA_COL: _segmented_ewm(close, offsets, _span_alpha(period))}
+
+
+def batch_rsi(close, offsets, period):
+    # Price change, restarted at every symbol boundary
+    delta = np.diff(close, prepend=np.nan)
+    delta[offsets[:-1]] = np.nan
+
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+
+    # Rolling averages, seeded with the Wilder EWM for each symbol's first rows
+    avg_gain = _segmented_rolling(gain, offsets, period, "mean")
+    avg_loss = _segmented_rolling(loss, offsets, period, "mean")
+    avg_gain = np.where(np.isnan(avg_gain), _segmented_ewm(gain, offsets, 1 / period), avg_gain)
+    avg_loss = np.where(np.isnan(avg_loss), _segmented_ewm(loss, offsets, 1 / period), avg_loss)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        return {RSI_COL: 100 - (100 / (1 + rs))}
+
+
+def batch_macd(close, offsets, fast_period=12, slow_period=26, signal_period=9):
+    macd = _segmented_ewm(close, offsets, _span_alpha(fast_period)) - _segmented_ewm(close, offsets, _span_alpha(slow_period))
+    signal = _segmented_ewm(macd, offsets, _span_alpha(signal_period))
+    return {MACD_COL: macd, SIGNAL_COL: signal, HIST_COL: macd - signal}
+
+
+def batch_bollinger(close, offsets, period=20, num_std_dev=2):
+    sma = _segmented_rolling(close, offsets, period, "mean")
+    rolling_std = _segmented_rolling(close, offsets, period, "std")
+    return {
+        SMA_COL: sma,
+        UPPER_BB_COL: sma + (rolling_std * num_std_dev),
+        LOWER_BB_COL: sma - (rolling_std * num_std_dev),
+    }
+
+
+BATCH_INDICATORS = {
+    "SMA": batch_sma,
+    "EMA": batch_ema,
+    "RSI": batch_rsi,
+    "MACD": batch_macd,
+    "Bollinger": batch_bollinger,
+}
+
+
+def compute_all_symbols(store, indicator: str, params: dict, cache=None) -> dict:
+    """
+    Compute `indicator` for every symbol in one segmented pass.
+
+    Parameters:
+        store (StockStore): Indexed dataset
+        indicator (str): One of BATCH_INDICATORS ("SMA", "EMA", "RSI", "MACD", "Bollinger")
+        params (dict): Keyword parameters of the indicator (e.g. {"period": 14})
+        cache (IndicatorCache): Optional cache; the full arrays are stored under the symbol "*"
+
+    Returns:
+        dict: Indicator column name -> array aligned with the store's rows (with appended
+        rows in the store's tail merged into their symbols' segments, see StockStore.merged_column)
+    """
+    if indicator not in BATCH_INDICATORS:
+        raise ValueError(f"Unknown indicator: {indicator}")
+    key = (indicator, *resolve_params(indicator, params).values())
+    if key in store.materialized:
+        if store.tail is None:
+            return store.materialized[key]
+        return {col: store.merged_column(col, key) for col in store.materialized[key]}
+
+    cache_key = (indicator, "*", tuple(sorted(params.items())))
+    if cache is not None:
+        values = cache.get(store.version, cache_key)
+        if values is not None:
+            return values
+
+    close = np.asarray(store.merged_column(CLOSE_COL), dtype=np.float64)
+    values = BATCH_INDICATORS[indicator](close, store.merged_offsets(), **params)
+
+    if cache is not None:
+        cache.put(store.version, cache_key, values)
+    return values
+
+
+def materialize_defaults(store, indicators, dtype=np.float64) -> dict:
+    """
+    Default-parameter series of `indicators` for every symbol, one segmented pass each.
+
+    The series are computed in float64 and stored as `dtype` (float32 for a compact store).
+
+    Returns:
+        dict: (indicator, *default param values) -> column arrays aligned with the store's
+        rows, as StockStore.materialized
+    """
+    materialized = {}
+    for indicator in indicators:
+        params = resolve_params(indicator)
+        values = compute_all_symbols(store, indicator, params)
+        materialized[(indicator, *params.values())] = {col: arr.astype(dtype, copy=False) for col, arr in values.items()}
+    return materialized
+
+
+def screen_columns(store, indicator: str, params: dict, date: str, cache=None):
+    """
+    Cross-section of `indicator` for every symbol that traded on `date`, as NumPy columns.
+
+    Returns:
+        (symbols, dates, values): per-row symbols and dates, and a dict of indicator arrays
+    """
+    if isinstance(store, PartitionedStockStore):
+        return _screen_partitioned(store, indicator, params, date)
+    key = (indicator, *resolve_params(indicator, params).values()) if indicator in BATCH_INDICATORS else None
+    if key in store.materialized and store.tail is not None:
+        # Base rows and appended rows screened apart, without merging the full series
+        parts = [_screen_rows(part.columns[DATE_COL], part.offsets, part.materialized[key], date)
+                 for part in (store, store.tail)]
+        segment = np.concatenate([part[0] for part in parts])
+        order = np.argsort(segment, kind="stable")
+        return (
+            store.symbols[segment[order]],
+            np.concatenate([part[1] for part in parts])[order],
+            {col: np.concatenate([part[2][col] for part in parts])[order] for col in parts[0][2]},
+        )
+    with span("kernel"):
+        values = compute_all_symbols(store, indicator, params, cache=cache)
+    segment, dates, values = _screen_rows(store.merged_column(DATE_COL), store.merged_offsets(), values, date)
+    return store.symbols[segment], dates, values
+
+
+def _screen_rows(dates, offsets, values, date):
+    """Segment ids, dates and `values` of the rows dated `date`."""
+    rows = np.flatnonzero(dates == pd.Timestamp(date).to_datetime64().astype(dates.dtype))
+    segment = np.searchsorted(offsets, rows, side="right") - 1
+    return segment, dates[rows], {col: arr[rows] for col, arr in values.items()}
+
+
+def _screen_partitioned(store, indicator, params, date):
+    """
+    screen_columns over a PartitionedStockStore: symbol by symbol, each reading only the
+    chunks around `date`, so memory stays within the store's chunk cache.
+    """
+    if indicator not in BATCH_INDICATORS:
+        raise ValueError(f"Unknown indicator: {indicator}")
+    symbols, dates, columns = [], [], []
+    for stock_symbol in store.symbols:
+        symbol_dates, values = compute_indicator_window(store, stock_symbol, indicator, params, date, date)
+        if len(symbol_dates):
+            symbols.append(stock_symbol)
+            dates.append(symbol_dates[0])
+            columns.append(values)
+    params = resolve_params(indicator, params)
+    names = INDICATORS[indicator][0](np.zeros(1), **params).keys()
+    return (
+        np.array(symbols, dtype=object),
+        np.array(dates, dtype="datetime64[ns]"),
+        {col: np.array([values[col][0] for values in columns], dtype=np.float64) for col in names},
+    )
+
+
+def screen_indicator(store, indicator: str, params: dict, date: str, cache=None) -> pd.DataFrame:
+    """
+    Cross-section of `indicator` for every symbol that traded on `date`.
+
+    Returns:
+        pd.DataFrame: One row per symbol with Symbol, Date and the indicator columns
+    """
+    return to_output_frame(*screen_columns(store, indicator, params, date, cache=cache))
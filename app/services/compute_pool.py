@@ -0,0 +1,226 @@
+# services/compute_pool.py
+"""
+Executor for indicator computations, with admission control and per-request timeouts.
+
+In "thread" mode tasks run on a dedicated thread pool against the API process's
+StockStore and IndicatorCache. In "process" mode they run on a ProcessPoolExecutor whose
+workers memory-map the store's snapshot read-only at start-up (or open a
+PartitionedStockStore's directory), so the dataset is shared through the page cache and
+never pickled; only the task arguments and the (small) result arrays cross the process
+boundary, and CPU-bound requests scale past one GIL.
+
+Every task carries a weight (its tier_access_service cost). While computations are
+queued or running, a new one is admitted only if the total weight stays within
+`max_pending_weight`; otherwise the caller gets a 503 with Retry-After. A computation
+that takes longer than `timeout` seconds answers 504. Its weight is released only
+when the underlying work has actually finished, so timed-out work still counts
+against admission until then.
+"""
+import asyncio
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from app.services.batch_indicators_service import screen_columns
+from app.services.indicator_cache import IndicatorCache
+from app.services.indicators_service import compute_indicator_window, compute_indicator_batch
+from app.services.loader import snapshot_lock
+from app.services.metrics_service import span, traced_call, add_spans, is_active
+from app.services.partitioned_store import PartitionedStockStore, read_manifest
+from app.services.profiling_service import profiler, profiled_call
+from app.services.stock_store import StockStore
+from config import (
+    COMPUTE_MODE, COMPUTE_WORKERS, COMPUTE_MAX_PENDING_COST, COMPUTE_TIMEOUT_SECONDS,
+    COMPUTE_WORKER_CACHE_BYTES, SNAPSHOT_DIR,
+)
+
+# Task name -> fn(store, *args, cache=cache)
+TASKS = {
+    "window": compute_indicator_window,
+    "screen": screen_columns,
+    "batch": compute_indicator_batch,
+}
+
+# Per-process state of pool workers, set up by _init_worker
+_worker = {}
+
+
+def _open_store(location):
+    """Open a partitioned dataset directory, or map a StockStore snapshot read-only."""
+    if read_manifest(location) is not None:
+        return PartitionedStockStore(location)
+    # Under the snapshot lock, so an append or reload cannot replace the snapshot mid-load
+    with snapshot_lock(Path(location)):
+        return StockStore.load(location, mmap_mode="r")
+
+
+def _init_worker(location, cache_bytes):
+    store = _open_store(location)
+    _worker["stores"] = {store.version: store}
+    _worker["cache"] = IndicatorCache(cache_bytes)
+
+
+def _call_chain(fn, traced, profiled):
+    """`fn` preceded by the wrappers to apply, outermost first: (traced_call, profiled_call, fn)."""
+    chain = (fn,)
+    if profiled:
+        chain = (profiled_call,) + chain
+    if traced:
+        chain = (traced_call,) + chain
+    return chain
+
+
+def _run_in_worker(location, version, name, args, traced=False, profiled=False):
+    stores = _worker["stores"]
+    store = stores.get(version)
+    if store is None:
+        # The API process has moved to a new dataset; open the current one. The previous
+        # store stays usable for requests still draining on that version.
+        store = _open_store(location)
+        if store.version != version:
+            raise RuntimeError(f"Worker snapshot is at version {store.version}, expected {version}")
+        previous = list(stores.values())[-1]
+        stores.clear()
+        stores.update({previous.version: previous, version: store})
+    fn, *wrapped = _call_chain(TASKS[name], traced, profiled)
+    return fn(*wrapped, store, *args, cache=_worker["cache"])
+
+
+class ComputePool:
+    """
+    Parameters:
+        store (StockStore): Dataset the computations run on
+        cache (IndicatorCache): API-process cache (thread mode only)
+        mode (str): "thread" or "process"
+        workers (int): Pool size
+        max_pending_weight (float): Admission limit on the total weight in flight
+        timeout (float): Seconds before a computation answers 504
+        snapshot_dir (Path): Snapshot the process workers map (process mode with a StockStore only)
+    """
+
+    def __init__(self, store, cache=None, mode: str = COMPUTE_MODE, workers: int = COMPUTE_WORKERS,
+                 max_pending_weight: float = COMPUTE_MAX_PENDING_COST, timeout: float = COMPUTE_TIMEOUT_SECONDS,
+                 snapshot_dir=SNAPSHOT_DIR, worker_cache_bytes: int = COMPUTE_WORKER_CACHE_BYTES):
+        self.store = store
+        self.cache = cache
+        self.mode = mode
+        self.workers = workers
+        self.max_pending_weight = max_pending_weight
+        self.timeout = timeout
+        self.snapshot_dir = snapshot_dir
+        self.pending_weight = 0.0
+        self.rejected = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+        self._inflight = Counter()  # dataset version -> computations queued or running on it
+        self._finished = threading.Condition(self._lock)
+
+        if mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute")
+        elif mode == "process":
+            if snapshot_dir is None and not isinstance(store, PartitionedStockStore):
+                raise ValueError("Process compute mode requires a stock data snapshot directory")
+            # spawn: never fork the API process with its threads and open connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._location(store), worker_cache_bytes),
+            )
+        else:
+            raise ValueError(f"Unknown compute mode: {mode}")
+
+    def _location(self, store):
+        # Partitioned stores are opened from their own directory, StockStores from the snapshot
+        return store.directory if isinstance(store, PartitionedStockStore) else self.snapshot_dir
+
+    def _admit(self, weight: float, version):
+        with self._lock:
+            if self.pending_weight > 0 and self.pending_weight + weight > self.max_pending_weight:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy computing indicators, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending_weight += weight
+            self._inflight[version] += 1
+
+    def _release(self, weight: float, version):
+        with self._lock:
+            self.pending_weight -= weight
+            self._inflight[version] -= 1
+            if not self._inflight[version]:
+                del self._inflight[version]
+                self._finished.notify_all()
+
+    async def run(self, name: str, *args, weight: float = 1):
+        """
+        Run TASKS[name] on the pool and await its result, subject to admission and the timeout.
+
+        Inside a measured request the whole call is the "compute" span, and the spans
+        recorded on the pool thread or worker process are added to the request. While a
+        cprofile profile is running, the computation runs under cProfile and its stats
+        go to the profiler.
+        """
+        traced = is_active()
+        collector = profiler.collector
+        with span("compute"):
+            result = await self._run(name, args, weight, traced, collector is not None)
+        if traced:
+            result, spans = result
+            add_spans(spans)
+        if collector is not None:
+            result, stats = result
+            collector.add(stats)
+        return result
+
+    async def _run(self, name, args, weight, traced, profiled):
+        # Read the store once: a concurrent swap must not split a computation across versions
+        store = self.store
+        self._admit(weight, store.version)
+        try:
+            if self.mode == "thread":
+                future = self._executor.submit(
+                    *_call_chain(TASKS[name], traced, profiled), store, *args, cache=self.cache
+                )
+            else:
+                future = self._executor.submit(
+                    _run_in_worker, self._location(store), store.version, name, args, traced, profiled
+                )
+        except BaseException:
+            self._release(weight, store.version)
+            raise
+        future.add_done_callback(lambda _: self._release(weight, store.version))
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise HTTPException(status_code=504, detail=f"Indicator computation exceeded {self.timeout:g}s")
+
+    def wait_drained(self, version, timeout: float = None) -> bool:
+        """Block until no computation on dataset `version` is queued or running; False on timeout."""
+        with self._finished:
+            return self._finished.wait_for(lambda: not self._inflight[version], timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "pending_weight": self.pending_weight,
+                "max_pending_weight": self.max_pending_weight,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "inflight_by_version": dict(self._inflight),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
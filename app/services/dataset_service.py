@@ -0,0 +1,289 @@
+# services/dataset_service.py
+"""
+Live replacement of the dataset the API serves.
+
+DatasetManager owns every switch of app.state.stock_data, whether the new data comes
+from a reload of the source parquet or from IncrementalIngestor. A new store is always
+built off to the side while requests carry on against the current one. The switch is
+then a single reference swap in ComputePool (each computation reads `pool.store` once).
+The IndicatorCache moves to the new version at the same time. Cache writes from
+requests still running on the old version are ignored.
+
+After a swap the manager waits for the computations still running on the old version
+to drain before another swap can start, so at most two versions are live at once.
+DatasetWatcher polls the source file and triggers a reload when it has changed and
+has stopped changing.
+
+With several uvicorn workers, each one has its own DatasetManager. They meet at the
+snapshot: appended bars are written there under the loader's snapshot lock, and every
+worker's SnapshotFollower switches to a snapshot version another worker wrote. An
+append first moves to the snapshot's version if another worker has advanced it, so
+concurrent appends build on each other instead of overwriting each other.
+"""
+import threading
+import time
+from contextlib import nullcontext
+
+from app.services.loader import STOCK_DATA_PATH, load_stock_store, snapshot_lock
+from app.services.stock_store import StockStore, read_snapshot_meta
+from config import (
+    STOCK_DATA_MMAP, STOCK_DATA_WATCH_SECONDS, RELOAD_DRAIN_TIMEOUT_SECONDS, SNAPSHOT_FOLLOW_SECONDS,
+)
+
+
+class DatasetManager:
+    """
+    Parameters:
+        state: app.state holding stock_data, indicator_cache, compute_pool and ingestor
+        load (callable): Returns a freshly loaded StockStore from the source
+        drain_timeout (float): Seconds to wait for the previous version's requests
+        mmap (bool): Serve snapshot-backed stores as read-only mappings of the snapshot
+    """
+
+    def __init__(self, state, load=None, drain_timeout: float = RELOAD_DRAIN_TIMEOUT_SECONDS,
+                 mmap: bool = STOCK_DATA_MMAP):
+        self.state = state
+        self.load = load or (lambda: load_stock_store(mmap=STOCK_DATA_MMAP))
+        self.drain_timeout = drain_timeout
+        self.mmap = mmap
+        self.reloads = 0
+        self.follows = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.state.stock_data.version
+
+    @property
+    def snapshot_dir(self):
+        return self.state.compute_pool.snapshot_dir
+
+    def reload(self) -> dict:
+        """
+        Load the source again and switch to it if its version differs from the live one.
+
+        A load that fails leaves the live dataset in place and re-raises.
+
+        Returns:
+            dict: Whether a swap happened, the versions involved and the timings
+        """
+        with self._lock:
+            started = time.perf_counter()
+            previous = self.state.stock_data
+            try:
+                store = self.load()
+                if len(store) == 0:
+                    raise ValueError("Reloaded stock data is empty")
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.last_error = None
+            loaded = time.perf_counter() - started
+            if store.version == previous.version:
+                return {"reloaded": False, "version": previous.version, "load_seconds": round(loaded, 3)}
+
+            # Retire the old version in the cache first so late writes from its requests are dropped
+            self.state.indicator_cache.invalidate(store.version)
+            self._swap(store)
+            self.reloads += 1
+            drained = self._drain(previous.version)
+            print(f"Stock data reloaded: version {previous.version} -> {store.version} "
+                  f"({len(store)} rows) in {loaded:.2f}s")
+            return {
+                "reloaded": True,
+                "version": store.version,
+                "previous_version": previous.version,
+                "rows": len(store),
+                "symbols": len(store.symbols),
+                "load_seconds": round(loaded, 3),
+                "drained": drained,
+            }
+
+    def append_bars(self, bars):
+        """
+        Append daily bars to the live dataset through the IncrementalIngestor and switch to it.
+
+        The new store is also written to the snapshot, keeping its source-file keys, so
+        the appended bars survive restarts and reloads until the source file changes; in
+        process compute mode and for the other API workers this is also how they see them.
+        If another worker has written a newer snapshot, the bars are appended to that one.
+        """
+        with self._lock:
+            previous = self.state.stock_data
+            snapshot_dir = self.snapshot_dir if isinstance(previous, StockStore) else None
+            with snapshot_lock(snapshot_dir) if snapshot_dir is not None else nullcontext():
+                base = self._newer_snapshot() if snapshot_dir is not None else None
+                if base is not None:
+                    self.state.indicator_cache.invalidate(base.version)
+                store = self.state.ingestor.append(base or previous, bars, cache=self.state.indicator_cache)
+                store = self._persist(store)
+            self._swap(store)
+            self._drain(previous.version)
+            return store
+
+    def follow_snapshot(self) -> bool:
+        """Switch to the snapshot if another worker has written a different version there."""
+        if self.snapshot_dir is None or not isinstance(self.state.stock_data, StockStore):
+            return False
+        with self._lock:
+            with snapshot_lock(self.snapshot_dir):
+                store = self._newer_snapshot()
+            if store is None:
+                return False
+            previous = self.state.stock_data
+            self.state.indicator_cache.invalidate(store.version)
+            self._swap(store)
+            self.follows += 1
+            self._drain(previous.version)
+            print(f"Stock data switched to snapshot version {store.version} (was {previous.version})")
+            return True
+
+    def status(self) -> dict:
+        store = self.state.stock_data
+        status = {
+            "version": store.version,
+            "rows": len(store),
+            "symbols": len(store.symbols),
+            "reloads": self.reloads,
+            "follows": self.follows,
+            "last_error": self.last_error,
+            "inflight_by_version": self.state.compute_pool.stats()["inflight_by_version"],
+        }
+        if hasattr(store, "memory_report"):
+            status["memory"] = store.memory_report()
+        return status
+
+    def _newer_snapshot(self):
+        """The snapshot's store if its version differs from the live one (snapshot lock held)."""
+        meta = read_snapshot_meta(self.snapshot_dir)
+        if meta is None or meta.get("version") == self.version:
+            return None
+        return StockStore.load(self.snapshot_dir, mmap_mode="r" if self.mmap else None)
+
+    def _persist(self, store):
+        """Write `store` to the snapshot (snapshot lock held); returns the store to serve."""
+        if self.snapshot_dir is None:
+            return store
+        # A store the other workers never see would be undone by this worker's own follower
+        meta = read_snapshot_meta(self.snapshot_dir) or {}
+        store.save(self.snapshot_dir, metadata={k: v for k, v in meta.items() if k.startswith("source_") or k == "compact"})
+        if self.mmap:
+            # Serve the shared mapping of what was just written, not the private tail
+            return StockStore.load(self.snapshot_dir, mmap_mode="r")
+        return store
+
+    def _swap(self, store):
+        self.state.compute_pool.store = store
+        self.state.stock_data = store
+
+    def _drain(self, version) -> bool:
+        drained = self.state.compute_pool.wait_drained(version, self.drain_timeout)
+        if not drained:
+            print(f"Requests on stock data version {version} still running after {self.drain_timeout:g}s")
+        return drained
+
+
+class DatasetWatcher:
+    """
+    Polls the source file every `interval` seconds on a daemon thread and reloads the
+    dataset once a change has been seen on two consecutive polls, so a file that is
+    still being written is not picked up half-way.
+    """
+
+    def __init__(self, manager: DatasetManager, path=STOCK_DATA_PATH, interval: float = STOCK_DATA_WATCH_SECONDS):
+        self.manager = manager
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._seen = self._signature()
+        self._pending = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self) -> bool:
+        """Check the source once; returns True if it triggered a reload."""
+        signature = self._signature()
+        if signature is None or signature == self._seen:
+            self._pending = None
+            return False
+        if signature != self._pending:
+            # Changed since the last poll: wait for it to settle
+            self._pending = signature
+            return False
+        self._seen, self._pending = signature, None
+        try:
+            self.manager.reload()
+        except Exception as e:
+            print(f"Stock data reload failed, still serving version {self.manager.version}: {e}")
+            return False
+        return True
+
+    def _signature(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+
+class SnapshotFollower:
+    """
+    Polls the snapshot's meta.json every `interval` seconds on a daemon thread and
+    switches this worker to a version another worker wrote there.
+    """
+
+    def __init__(self, manager: DatasetManager, interval: float = SNAPSHOT_FOLLOW_SECONDS):
+        self.manager = manager
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._seen = self._signature()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshot-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self) -> bool:
+        """Check the snapshot once; returns True if this worker switched to it."""
+        signature = self._signature()
+        if signature is None or signature == self._seen:
+            return False
+        self._seen = signature
+        try:
+            return self.manager.follow_snapshot()
+        except Exception as e:
+            print(f"Could not switch to the stock data snapshot, still serving version {self.manager.version}: {e}")
+            return False
+
+    def _signature(self):
+        try:
+            stat = (self.manager.snapshot_dir / "meta.json").stat()
+        except (OSError, TypeError):
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
@@ -0,0 +1,88 @@
+# services/http_cache_service.py
+"""
+HTTP validators for indicator responses.
+
+An indicator result is a pure function of the dataset version and the request (symbol,
+indicator, parameters, date range) and its bytes depend only on the response format, so
+a strong ETag over those inputs identifies the representation without computing it.
+GET endpoints compare it with If-None-Match after the access check and answer 304
+before queuing any computation (conditional_response).
+
+Responses carry Cache-Control HTTP_CACHE_CONTROL ("public, no-cache" by default): a
+reverse proxy may store them, but revalidates every hit with the API, so tier access
+checks and daily quotas still apply to cached traffic. Vary: Accept keeps the
+negotiated formats apart.
+"""
+import hashlib
+import json
+
+from fastapi.responses import Response
+
+from config import HTTP_CACHE_CONTROL
+
+
+def indicator_etag(version, stock_symbol, indicator: str, params: dict, start_date, end_date, fmt: str) -> str:
+    """
+    Strong ETag of one indicator response.
+
+    Parameters:
+        version (str): Dataset version the result is computed on
+        stock_symbol (str): Symbol, or None for a screen
+        indicator (str): Indicator name
+        params (dict): Indicator parameters
+        start_date, end_date (str): Requested window, as given
+        fmt (str): Negotiated response format
+
+    Returns:
+        str: Quoted entity tag
+    """
+    key = json.dumps(
+        [version, stock_symbol, indicator, sorted(params.items()), start_date, end_date, fmt],
+        separators=(",", ":"), default=str,
+    )
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": HTTP_CACHE_CONTROL, "Vary": "Accept"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def conditional_response(request, usage, user, etag: str):
+    """
+    The 304 answer to a request whose If-None-Match matches `etag`, or None to compute it.
+
+    A 304 counts against the user's daily quota like the full response it stands for.
+
+    Parameters:
+        request (Request): Incoming request, after the access check
+        usage: Usage counter of the app (app.state.usage_counter)
+        user (User): Authenticated user
+        etag (str): Entity tag of the response, from indicator_etag
+
+    Returns:
+        Response: 304 Not Modified, or None if the client's copy is missing or stale
+    """
+    if not etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    usage.increment(user.username)
+    return not_modified(etag)
+
+
+def with_cache_headers(response: Response, etag: str) -> Response:
+    response.headers.update(cache_headers(etag))
+    return response
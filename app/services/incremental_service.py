@@ -0,0 +1,319 @@
+# services/incremental_service.py
+"""
+Incremental ingestion of daily bars.
+
+New bars are appended to the end of their symbols' segments in a new StockStore (in its
+tail, see StockStore.append_rows). The full-history series already in the IndicatorCache
+are then extended bar by bar instead of recomputed, each through an O(1) state update:
+
+- SMA:       rolling sum of the last `period` closes
+- EMA:       last EMA value
+- RSI:       rolling sums of the last `period` gains and losses (this service's RSI is
+             a rolling mean of gains/losses, Wilder-smoothed only over a symbol's first
+             `period - 1` rows, so the smoothed averages are also kept for those)
+- MACD:      last fast, slow and signal EMA values
+- Bollinger: rolling mean and sum of squared deviations (sliding Welford update)
+
+A state is built once per cached series from the symbol's history (one vectorised pass)
+and then reused for every later append, so end-of-day updates cost O(1) per bar and
+cached series. Series of symbols without new bars are carried over unchanged;
+universe-wide series (batch_indicators_service) are dropped and recomputed on demand.
+The store's materialized default-parameter series are extended the same way, symbol
+by symbol; symbols new to the store get theirs computed from their bars.
+
+Extended cache series are written into buffers with spare capacity, so an append rarely
+copies a series. IndicatorCache.rebind extends them outside its lock and takes it only
+to switch the cache over to them.
+"""
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.services.indicators_service import INDICATORS, _ewm_span
+from app.services.stock_store import StockStore, build_symbol_offsets
+from config import (
+    SYMBOL_COL, DATE_COL, CLOSE_COL, SMA_COL, EMA_COL, RSI_COL, MACD_COL, SIGNAL_COL, HIST_COL,
+    UPPER_BB_COL, LOWER_BB_COL, INCREMENTAL_SERIES_SLACK,
+)
+
+
+def _span_alpha(span):
+    return 2 / (span + 1)
+
+
+def _rsi_value(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.float64(avg_gain) / np.float64(avg_loss)
+        return float(100 - (100 / (1 + rs)))
+
+
+class SMAState:
+    def __init__(self, close, period):
+        self.period = period
+        self.total = float(np.sum(close[-period:]))
+
+    def push(self, close, i):
+        self.total += close[i] - (close[i - self.period] if i >= self.period else 0.0)
+        return {SMA_COL: self.total / self.period if i >= self.period - 1 else math.nan}
+
+
+class EMAState:
+    def __init__(self, close, period):
+        self.alpha = _span_alpha(period)
+        self.value = float(_ewm_span(close, period)[-1]) if len(close) else None
+
+    def push(self, close, i):
+        self.value = close[i] if self.value is None else self.value + self.alpha * (close[i] - self.value)
+        return {EMA_COL: self.value}
+
+
+class RSIState:
+    def __init__(self, close, period):
+        self.period = period
+        self.alpha = 1 / period
+        gain, loss = self._gain_loss(close, np.arange(len(close)))
+        self.gain_total = float(gain[-period:].sum())
+        self.loss_total = float(loss[-period:].sum())
+        # Wilder-smoothed averages, only needed while a symbol has fewer than `period` rows
+        smoothed_gain = pd.Series(gain).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        smoothed_loss = pd.Series(loss).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        self.smoothed_gain = float(smoothed_gain[-1]) if len(close) else 0.0
+        self.smoothed_loss = float(smoothed_loss[-1]) if len(close) else 0.0
+
+    @staticmethod
+    def _gain_loss(close, rows):
+        rows = np.asarray(rows)
+        delta = np.where(rows > 0, close[rows] - close[np.maximum(rows - 1, 0)], 0.0)
+        return np.where(delta > 0, delta, 0.0), np.where(delta < 0, -delta, 0.0)
+
+    def push(self, close, i):
+        gain, loss = (float(v[0]) for v in self._gain_loss(close, [i]))
+        if i >= self.period:
+            out_gain, out_loss = (float(v[0]) for v in self._gain_loss(close, [i - self.period]))
+        else:
+            out_gain = out_loss = 0.0
+        self.gain_total += gain - out_gain
+        self.loss_total += loss - out_loss
+        self.smoothed_gain += self.alpha * (gain - self.smoothed_gain) if i > 0 else gain - self.smoothed_gain
+        self.smoothed_loss += self.alpha * (loss - self.smoothed_loss) if i > 0 else loss - self.smoothed_loss
+        if i >= self.period - 1:
+            return {RSI_COL: _rsi_value(self.gain_total / self.period, self.loss_total / self.period)}
+        return {RSI_COL: _rsi_value(self.smoothed_gain, self.smoothed_loss)}
+
+
+class MACDState:
+    def __init__(self, close, fast_period, slow_period, signal_period):
+        self.alphas = (_span_alpha(fast_period), _span_alpha(slow_period), _span_alpha(signal_period))
+        if len(close):
+            fast = _ewm_span(close, fast_period)
+            slow = _ewm_span(close, slow_period)
+            signal = pd.Series(fast - slow).ewm(span=signal_period, adjust=False).mean().to_numpy()
+            self.fast, self.slow, self.signal = float(fast[-1]), float(slow[-1]), float(signal[-1])
+        else:
+            self.fast = self.slow = self.signal = None
+
+    def push(self, close, i):
+        x = close[i]
+        fast_alpha, slow_alpha, signal_alpha = self.alphas
+        if self.fast is None:
+            self.fast = self.slow = x
+            self.signal = 0.0
+        else:
+            self.fast += fast_alpha * (x - self.fast)
+            self.slow += slow_alpha * (x - self.slow)
+            self.signal += signal_alpha * ((self.fast - self.slow) - self.signal)
+        macd = self.fast - self.slow
+        return {MACD_COL: macd, SIGNAL_COL: self.signal, HIST_COL: macd - self.signal}
+
+
+class BollingerState:
+    def __init__(self, close, period, num_std_dev):
+        self.period = period
+        self.num_std_dev = num_std_dev
+        window = np.asarray(close[-period:], dtype=np.float64)
+        self.count = len(window)
+        self.mean = float(window.mean()) if self.count else 0.0
+        self.m2 = float(((window - self.mean) ** 2).sum())
+
+    def push(self, close, i):
+        x = close[i]
+        if self.count < self.period:
+            # Growing window: plain Welford update
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+        else:
+            # Full window: x replaces the value leaving it
+            old = close[i - self.period]
+            old_mean = self.mean
+            self.mean += (x - old) / self.period
+            self.m2 = max(0.0, self.m2 + (x - old) * (x - self.mean + old - old_mean))
+        if self.count < self.period:
+            return {SMA_COL: math.nan, UPPER_BB_COL: math.nan, LOWER_BB_COL: math.nan}
+        std = math.sqrt(self.m2 / (self.period - 1)) if self.period > 1 else math.nan
+        return {
+            SMA_COL: self.mean,
+            UPPER_BB_COL: self.mean + std * self.num_std_dev,
+            LOWER_BB_COL: self.mean - std * self.num_std_dev,
+        }
+
+
+STATE_CLASSES = {
+    "SMA": SMAState,
+    "EMA": EMAState,
+    "RSI": RSIState,
+    "MACD": MACDState,
+    "Bollinger": BollingerState,
+}
+
+
+def bars_to_columns(bars: pd.DataFrame, store: StockStore):
+    """
+    Validate new bars and shape them like the store's columns.
+
+    Bars are sorted by (symbol, date); a symbol may not repeat a date, every store
+    column must be present and prices must be finite.
+
+    Returns:
+        (symbols, columns): per-row symbols and a dict of column arrays
+    """
+    missing = {SYMBOL_COL, *store.columns} - set(bars.columns)
+    if missing:
+        raise ValueError(f"New bars are missing columns: {', '.join(sorted(missing))}")
+    bars = bars.assign(**{DATE_COL: pd.to_datetime(bars[DATE_COL])})
+    bars = bars.sort_values([SYMBOL_COL, DATE_COL], kind="stable")
+    if bars.duplicated([SYMBOL_COL, DATE_COL]).any():
+        raise ValueError("New bars repeat a (symbol, date) pair")
+    columns = {col: bars[col].to_numpy() for col in store.columns}
+    if not np.isfinite(np.asarray(columns[CLOSE_COL], dtype=np.float64)).all():
+        raise ValueError("New bars must have a finite close")
+    return bars[SYMBOL_COL].to_numpy(dtype=object), columns
+
+
+class IncrementalIngestor:
+    """
+    Appends daily bars to a StockStore and extends the cached indicator series to match.
+
+    Keeps one incremental state per cached (indicator, symbol, params) series, tagged
+    with the store version it is current for. Extended cache series are written into
+    buffers with INCREMENTAL_SERIES_SLACK spare capacity, so most appends fill spare room
+    instead of copying the series. Appends are serialised by a lock.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._buffers = {}  # cache key -> (version, {column: series returned for that version})
+        self._lock = threading.Lock()
+
+    def append(self, store: StockStore, bars: pd.DataFrame, cache=None) -> StockStore:
+        """
+        Append `bars` (one row per symbol and date, with the store's columns) to `store`.
+
+        Returns:
+            StockStore: The new store; `store` is left as it was
+        """
+        if not isinstance(store, StockStore):
+            raise ValueError("Appending bars needs the in-memory stock data backend")
+        with self._lock:
+            symbols, columns = bars_to_columns(bars, store)
+            closes = self._closes(store, symbols, columns)
+            materialized, states = self._materialized_rows(store, closes)
+            new_store = store.append_rows(symbols, columns, materialized=materialized)
+            self._states.update((key, (new_store.version, state)) for key, state in states.items())
+            if cache is not None:
+                cache.rebind(
+                    store.version, new_store.version,
+                    lambda key, values: self._extend(key, values, closes, store.version, new_store.version),
+                )
+            self._states = {
+                key: (version, state) for key, (version, state) in self._states.items()
+                if version == new_store.version
+            }
+            self._buffers = {
+                key: (version, series) for key, (version, series) in self._buffers.items()
+                if version == new_store.version
+            }
+            return new_store
+
+    @staticmethod
+    def _closes(store, symbols, columns):
+        """Each updated symbol's closes before and after the append, as float64 (new closes stored at the store's precision)."""
+        close_dtype = store.columns[CLOSE_COL].dtype
+        new_values = np.asarray(columns[CLOSE_COL]).astype(close_dtype).astype(np.float64)
+        closes = {}
+        unique, offsets = build_symbol_offsets(symbols)  # (symbol, date)-sorted bars: segment order
+        for i, symbol in enumerate(unique):
+            old_close = np.asarray(store.get_symbol_columns(symbol, [CLOSE_COL])[CLOSE_COL], dtype=np.float64)
+            closes[symbol] = (old_close, np.concatenate([old_close, new_values[offsets[i]:offsets[i + 1]]]))
+        return closes
+
+    def _materialized_rows(self, store, closes):
+        """
+        The new rows of every materialized series, in the order of the appended bars.
+
+        Returns:
+            (materialized, states): the rows per series key, and the advanced states to
+            keep once the new store exists
+        """
+        materialized, states = {}, {}
+        for key, series in store.materialized.items():
+            indicator, *param_values = key
+            rows = {col: [] for col in series}
+            for symbol, (old_close, new_close) in closes.items():
+                if symbol in store.symbol_index:
+                    state_key = ("materialized", indicator, symbol, *param_values)
+                    new_rows, states[state_key] = self._new_rows(
+                        state_key, indicator, param_values, old_close, new_close, store.version,
+                    )
+                else:
+                    params = dict(zip(INDICATORS[indicator][2], param_values))
+                    new_rows = INDICATORS[indicator][0](new_close, **params)
+                for col in series:
+                    rows[col].append(np.asarray(new_rows[col], dtype=series[col].dtype))
+            materialized[key] = {col: np.concatenate(parts) for col, parts in rows.items()}
+        return materialized, states
+
+    def _new_rows(self, state_key, indicator, param_values, old_close, new_close, old_version):
+        """
+        Values of the bars after `old_close`, pushed through the series' state (rebuilt
+        from `old_close` unless it is current for `old_version`).
+
+        Returns:
+            (rows, state): column -> new values, and the advanced state
+        """
+        version, state = self._states.get(state_key, (None, None))
+        if version != old_version:
+            params = dict(zip(INDICATORS[indicator][2], param_values))
+            state = STATE_CLASSES[indicator](old_close, **params)
+        rows = [state.push(new_close, i) for i in range(len(old_close), len(new_close))]
+        return {col: np.array([row[col] for row in rows]) for col in rows[0]}, state
+
+    def _extend(self, key, values, closes, old_version, new_version):
+        indicator, stock_symbol, *param_values = key
+        if stock_symbol == "*" or indicator not in STATE_CLASSES:
+            return None
+        if stock_symbol not in closes:
+            return values
+
+        old_close, new_close = closes[stock_symbol]
+        if len(old_close) != len(next(iter(values.values()))):
+            return None
+        rows, state = self._new_rows(key, indicator, param_values, old_close, new_close, old_version)
+        self._states[key] = (new_version, state)
+
+        version, previous = self._buffers.get(key, (None, {}))
+        extended = {}
+        for col, arr in values.items():
+            buffer = arr.base if version == old_version and previous.get(col) is arr else None
+            if buffer is None or len(buffer) < len(new_close):
+                # The previous series is left as it was: requests may still be reading it
+                buffer = np.empty(math.ceil(len(new_close) * (1 + INCREMENTAL_SERIES_SLACK)), dtype=arr.dtype)
+                buffer[:len(arr)] = arr
+            # Rows past len(arr) are outside every view handed out so far
+            buffer[len(arr):len(new_close)] = rows[col]
+            extended[col] = buffer[:len(new_close)]
+        self._buffers[key] = (new_version, extended)
+        return extended
@@ -0,0 +1,146 @@
+# services/indicator_cache.py
+import threading
+from collections import OrderedDict
+
+from config import INDICATOR_CACHE_MAX_BYTES
+
+
+class IndicatorCache:
+    """
+    Bounded, thread-safe LRU cache of full-history indicator series.
+
+    Keys are (indicator, symbol, params) tuples and values are dicts of NumPy arrays
+    aligned to the symbol's rows in the StockStore. Every entry belongs to one dataset
+    version: storing or looking up under a new version drops all entries, so a data
+    reload can never serve series computed from the previous dataset. Versions the cache
+    has moved past are retired: a late request still running on an old store misses and
+    its results are not stored, instead of flushing the current entries.
+    """
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._retired = set()
+        self._lock = threading.Lock()
+
+    def get(self, version, key):
+        """Return the cached series for `key` under `version`, or None on a miss."""
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            values = self._entries.get(key)
+            if values is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values[0]
+
+    def put(self, version, key, values: dict):
+        """Store `values` under `key`, evicting least recently used entries to stay within max_bytes."""
+        size = sum(arr.nbytes for arr in values.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (values, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, version=None):
+        """Drop every entry and bind the cache to `version`."""
+        with self._lock:
+            self._bind(version)
+
+    def rebind(self, old_version, new_version, transform):
+        """
+        Carry entries over from `old_version` to `new_version` instead of dropping them.
+
+        `transform(key, values)` returns the entry's values for the new version (the same
+        dict if unchanged), or None to drop it. The transforms run outside the lock, so
+        lookups are not held up by them; only the switch to the carried entries happens
+        under it. Entries stored under `new_version` meanwhile win over carried ones. If
+        the cache is not at `old_version` it is simply bound to `new_version` empty.
+        """
+        with self._lock:
+            if self.version != old_version:
+                self._bind(new_version)
+                return
+            entries = list(self._entries.items())
+
+        carried = OrderedDict()
+        for key, (values, _) in entries:
+            values = transform(key, values)
+            if values is not None:
+                carried[key] = (values, sum(arr.nbytes for arr in values.values()))
+
+        with self._lock:
+            if self.version == old_version:
+                self._bind(new_version)
+            elif self.version != new_version:
+                return
+            for key, entry in self._entries.items():
+                carried.pop(key, None)
+                carried[key] = entry
+            self._entries = carried
+            self.current_bytes = sum(size for _, size in carried.values())
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def metric_samples(self) -> list:
+        """Counters and gauges for GET /metrics (metrics_service.render_samples)."""
+        stats = self.stats()
+        return [
+            ("indicator_cache_hits_total", "counter", "Indicator cache lookups that found a series", stats["hits"]),
+            ("indicator_cache_misses_total", "counter", "Indicator cache lookups that did not", stats["misses"]),
+            ("indicator_cache_evictions_total", "counter", "Series evicted to stay within the byte budget",
+             stats["evictions"]),
+            ("indicator_cache_entries", "gauge", "Series held for the current dataset version", stats["entries"]),
+            ("indicator_cache_bytes", "gauge", "Bytes of the series held", stats["bytes"]),
+        ]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_version(self, version) -> bool:
+        """Bind to `version` if it is new; False if it is a retired version."""
+        if version == self.version:
+            return True
+        if version in self._retired:
+            return False
+        self._bind(version)
+        return True
+
+    def _bind(self, version):
+        if self.version is not None and version != self.version:
+            self._retired.add(self.version)
+        self._retired.discard(version)
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.version = version
@@ -1,200 +1,442 @@
 # services/indicators_service.py
+"""
+Indicator calculators.
+
+Each calculator resolves the requested date window on the symbol's sorted date array
+with a binary search and only computes the indicator over that window plus a bounded
+warm-up lookback before `start_date`:
+
+- SMA / Bollinger: exactly `period - 1` rows, so the window is exact.
+- RSI: `period` rows (one extra for the price diff). The rolling averages are exact;
+  the Wilder EWM only seeds the first `period - 1` rows of a symbol's history, which a
+  warm-up never overlaps.
+- EMA / MACD: enough rows for an adjust=False EWM started mid-series to converge. An EWM
+  started `k` rows early carries an initial error of at most (1 - alpha) ** k times the
+  symbol's price range; `k` is chosen so that factor drops below EWM_CONVERGENCE_TOL
+  (1e-10 by default), i.e. results match the full-history computation to ~1e-10 of the
+  price range. MACD adds the signal EWM's horizon on top of the slower line's.
+
+Rolling sums are re-started at the warm-up boundary, so SMA/Bollinger values can differ
+from a full-history run in the last few ulps (relative error well below 1e-12).
+"""
+import math
+
 import numpy as np
 import pandas as pd
-from config import DATA_DIR
+from config import DATA_DIR, EWM_CONVERGENCE_TOL
 from app.utils.data_related_utils import clean_stock_data
 from config import DATE_COL,SYMBOL_COL,CLOSE_COL,SMA_COL,EMA_COL,RSI_COL,MACD_COL,SIGNAL_COL,HIST_COL,UPPER_BB_COL,LOWER_BB_COL
+from app.services.stock_store import StockStore
+from app.services.partitioned_store import PartitionedStockStore
+from app.services.metrics_service import span
 
 
-def calculate_simple_moving_average(df, stock_symbol, ma_period, start_date, end_date):
-    """
-    Calculate moving average for a specific stock symbol over a date range.
+def ewm_warmup_rows(span, tol=EWM_CONVERGENCE_TOL):
+    """Rows of lookback after which an adjust=False EWM of `span` forgets its seed to within `tol`."""
+    alpha = 2 / (span + 1)
+    if alpha >= 1:
+        return 0
+    return int(math.ceil(math.log(tol) / math.log1p(-alpha)))
 
-    Parameters:
-        df (pd.DataFrame): DataFrame with columns ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
-        stock_symbol (str): Stock ticker/symbol to filter
-        ma_period (int): Moving average window (e.g. 20 for 20-day MA)
-        start_date (str): Start date in 'YYYY-MM-DD' format
-        end_date (str): End date in 'YYYY-MM-DD' format
 
-    Returns:
-        pd.DataFrame: DataFrame with Date, Close, and Moving Average
+def _symbol_arrays(df, stock_symbol, start_date=None, end_date=None, warmup_rows=0):
     """
-    # Filter and sort
-    stock_df = df[df[SYMBOL_COL] == stock_symbol].sort_values(DATE_COL).copy()
+    Return the date-sorted (dates, close) arrays of one symbol.
 
-    # Calculate moving average
-    stock_df[SMA_COL] = stock_df[CLOSE_COL].rolling(window=ma_period).mean()
+    A StockStore is sliced through its symbol index (O(1), no copy of the price data);
+    a PartitionedStockStore reads only the chunks covering [start_date, end_date] and
+    `warmup_rows` earlier rows; a plain DataFrame falls back to a boolean filter and sort.
+    """
+    if isinstance(df, StockStore):
+        cols = df.get_symbol_columns(stock_symbol, [DATE_COL, CLOSE_COL])
+        return cols[DATE_COL], cols[CLOSE_COL]
+    if isinstance(df, PartitionedStockStore):
+        cols = df.get_symbol_columns(stock_symbol, [DATE_COL, CLOSE_COL], start_date, end_date, warmup_rows)
+        return cols[DATE_COL], cols[CLOSE_COL]
+    stock_df = df[df[SYMBOL_COL] == stock_symbol].sort_values(DATE_COL)
+    return stock_df[DATE_COL].to_numpy(), stock_df[CLOSE_COL].to_numpy()
 
-    # Filter by date range
-    filtered_df = stock_df[(stock_df[DATE_COL] >= start_date) & (stock_df[DATE_COL] <= end_date)]
 
-    # Reset index for clean output
-    filtered_df = filtered_df.reset_index(drop=True)
+def _to_datetime64(value, dtype):
+    return pd.Timestamp(value).to_datetime64().astype(dtype)
 
-    filtered_df[DATE_COL] = filtered_df[DATE_COL].astype(str)
-    filtered_df = filtered_df.where(pd.notnull(filtered_df), None)
-    filtered_df = filtered_df.replace({np.nan: None})
 
-    return filtered_df[[SYMBOL_COL,DATE_COL, SMA_COL]]
+def window_bounds(dates, start_date=None, end_date=None):
+    """
+    Binary-search the [start_date, end_date] window in a sorted date array.
 
-def calculate_exponential_moving_average(df, stock_symbol, ema_period, start_date, end_date):
+    Returns:
+        (start, stop): row offsets such that dates[start:stop] lies inside the window.
     """
-    Calculate Exponential Moving Average (EMA) for a stock symbol over a date range.
+    start = 0
+    stop = len(dates)
+    if start_date is not None:
+        start = int(np.searchsorted(dates, _to_datetime64(start_date, dates.dtype), side="left"))
+    if end_date is not None:
+        stop = int(np.searchsorted(dates, _to_datetime64(end_date, dates.dtype), side="right"))
+    return start, max(start, stop)
 
-    Parameters:
-        df (pd.DataFrame): DataFrame with columns ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
-        stock_symbol (str): Stock ticker/symbol to filter
-        ema_period (int): EMA window (e.g., 20 for 20-day EMA)
-        start_date (str): Start date in 'YYYY-MM-DD' format
-        end_date (str): End date in 'YYYY-MM-DD' format
 
-    Returns:
-        pd.DataFrame: DataFrame with Date, Close, and EMA
+def to_output_frame(stock_symbol, dates, values):
     """
-    # Filter and sort by date
-    stock_df = df[df[SYMBOL_COL] == stock_symbol].sort_values(DATE_COL).copy()
+    Build the JSON-ready frame: string dates and None in place of NaN.
 
-    # Calculate EMA using pandas ewm
-    stock_df[EMA_COL] = stock_df[CLOSE_COL].ewm(span=ema_period, adjust=False).mean()
+    `stock_symbol` is either one symbol for every row or an array with a symbol per row.
+    """
+    if isinstance(stock_symbol, str):
+        symbols = np.full(len(dates), stock_symbol, dtype=object)
+    else:
+        symbols = np.asarray(stock_symbol, dtype=object)
+    data = {
+        SYMBOL_COL: symbols,
+        DATE_COL: pd.Series(dates, dtype="datetime64[ns]").astype(str).to_numpy(),
+    }
+    for col, arr in values.items():
+        out = arr.astype(object)
+        out[np.isnan(arr)] = None
+        data[col] = out
+    return pd.DataFrame(data)
 
-    # Filter by date range
-    filtered_df = stock_df[(stock_df[DATE_COL] >= start_date) & (stock_df[DATE_COL] <= end_date)]
 
-    # Reset index for clean output
-    filtered_df = filtered_df.reset_index(drop=True)
-    filtered_df[DATE_COL] = filtered_df[DATE_COL].astype(str)
-    filtered_df = filtered_df.where(pd.notnull(filtered_df), None)
-    filtered_df = filtered_df.replace({np.nan: None})
+def _memoized(memo, key, compute):
+    """Return memo[key], computing it on first use; no memo means always compute."""
+    if memo is None:
+        return compute()
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
 
-    return filtered_df[[SYMBOL_COL,DATE_COL, EMA_COL]]
 
+def _rolling(close, period, stat, memo=None):
+    return _memoized(memo, ("rolling", stat, period),
+                     lambda: getattr(pd.Series(close).rolling(window=period), stat)().to_numpy())
 
-def calculate_rsi(df, stock_symbol, rsi_period, start_date, end_date):
-    """
-    Calculate Relative Strength Index (RSI) for a stock over a date range.
 
-    Parameters:
-        df (pd.DataFrame): DataFrame with columns ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
-        stock_symbol (str): Stock ticker/symbol to filter
-        rsi_period (int): Period for RSI (e.g., 14 for 14-day RSI)
-        start_date (str): Start date in 'YYYY-MM-DD' format
-        end_date (str): End date in 'YYYY-MM-DD' format
+def _ewm_span(close, span, memo=None):
+    return _memoized(memo, ("ewm", span),
+                     lambda: pd.Series(close).ewm(span=span, adjust=False).mean().to_numpy())
 
-    Returns:
-        pd.DataFrame: DataFrame with Date, Close, and RSI
-    """
-    # Filter and sort
-    stock_df = df[df[SYMBOL_COL] == stock_symbol].sort_values(DATE_COL).copy()
 
+def _sma_kernel(close, period, memo=None):
+    return {SMA_COL: _rolling(close, period, "mean", memo)}
+
+
+def _ema_kernel(close, period, memo=None):
+    return {EMA_COL: _ewm_span(close, period, memo)}
+
+
+def _rsi_kernel(close, period, memo=None):
     # Calculate price change
-    delta = stock_df[CLOSE_COL].diff()
+    delta = pd.Series(close).diff()
 
     # Separate gains and losses
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
 
     # Calculate average gain/loss using exponential moving average
-    avg_gain = gain.rolling(window=rsi_period, min_periods=rsi_period).mean()
-    avg_loss = loss.rolling(window=rsi_period, min_periods=rsi_period).mean()
+    avg_gain = gain.rolling(window=period, min_periods=period).mean()
+    avg_loss = loss.rolling(window=period, min_periods=period).mean()
 
     # Use the Wilder smoothing (EMA after the first period)
-    avg_gain = avg_gain.combine_first(gain.ewm(alpha=1/rsi_period, adjust=False).mean())
-    avg_loss = avg_loss.combine_first(loss.ewm(alpha=1/rsi_period, adjust=False).mean())
+    avg_gain = avg_gain.combine_first(gain.ewm(alpha=1/period, adjust=False).mean())
+    avg_loss = avg_loss.combine_first(loss.ewm(alpha=1/period, adjust=False).mean())
 
     # Calculate RS and RSI
     rs = avg_gain / avg_loss
-    stock_df[RSI_COL] = 100 - (100 / (1 + rs))
+    return {RSI_COL: (100 - (100 / (1 + rs))).to_numpy()}
+
 
-    # Filter by date range
-    stock_df = stock_df[(stock_df[DATE_COL] >= start_date) & (stock_df[DATE_COL] <= end_date)]
+def _macd_kernel(close, fast_period, slow_period, signal_period, memo=None):
+    # Calculate EMAs (shared with EMA requests on the same slice)
+    ema_fast = _ewm_span(close, fast_period, memo)
+    ema_slow = _ewm_span(close, slow_period, memo)
 
-    stock_df[DATE_COL] = stock_df[DATE_COL].astype(str)
-    stock_df = stock_df.where(pd.notnull(stock_df), None)
-    stock_df = stock_df.replace({np.nan: None})
+    # MACD line
+    macd = ema_fast - ema_slow
+
+    # Signal line (9-period EMA of MACD)
+    signal = pd.Series(macd).ewm(span=signal_period, adjust=False).mean().to_numpy()
 
-    # Clean output
-    return stock_df[[SYMBOL_COL,DATE_COL, RSI_COL]].reset_index(drop=True)
+    # Histogram = MACD - Signal
+    return {MACD_COL: macd, SIGNAL_COL: signal, HIST_COL: macd - signal}
 
 
-def calculate_macd(df, stock_symbol, fast_period=12, slow_period=26, signal_period=9, start_date=None, end_date=None):
+def _bollinger_kernel(close, period, num_std_dev, memo=None):
+    # Calculate SMA (shared with SMA requests on the same slice) and standard deviation
+    sma = _rolling(close, period, "mean", memo)
+    rolling_std = _rolling(close, period, "std", memo)
+
+    # Calculate upper and lower bands
+    return {
+        SMA_COL: sma,
+        UPPER_BB_COL: sma + (rolling_std * num_std_dev),
+        LOWER_BB_COL: sma - (rolling_std * num_std_dev),
+    }
+
+
+# indicator -> (kernel, warm-up rows, parameter defaults in cache-key order)
+INDICATORS = {
+    "SMA": (_sma_kernel, lambda period: period - 1, {"period": 20}),
+    "EMA": (_ema_kernel, lambda period: ewm_warmup_rows(period), {"period": 20}),
+    "RSI": (_rsi_kernel, lambda period: period, {"period": 14}),
+    "MACD": (
+        _macd_kernel,
+        lambda fast_period, slow_period, signal_period: (
+            max(ewm_warmup_rows(fast_period), ewm_warmup_rows(slow_period)) + ewm_warmup_rows(signal_period)
+        ),
+        {"fast_period": 12, "slow_period": 26, "signal_period": 9},
+    ),
+    "Bollinger": (_bollinger_kernel, lambda period, num_std_dev: period - 1, {"period": 20, "num_std_dev": 2}),
+}
+
+
+def resolve_params(indicator, params=None):
+    """Fill in an indicator's default parameters; unknown indicators or parameters raise ValueError."""
+    if indicator not in INDICATORS:
+        raise ValueError(f"Unknown indicator: {indicator}")
+    defaults = INDICATORS[indicator][2]
+    params = params or {}
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {indicator}: {', '.join(sorted(unknown))}")
+    return {name: params.get(name, default) for name, default in defaults.items()}
+
+
+def compute_indicator_windows(df, stock_symbol, requests, cache=None):
     """
-    Calculate MACD, Signal line, and Histogram for a stock over a date range.
+    Compute several indicators for one symbol from a single slice of its data.
+
+    The symbol is looked up once and every request runs over the union of the requested
+    windows (plus the largest warm-up), sharing intermediates between them: the rolling
+    mean behind SMA and Bollinger, and the EWMs behind EMA and MACD.
+
+    With an IndicatorCache and a StockStore, kernels instead run over the symbol's full
+    history, each series is cached under (indicator, symbol, params) for the store's
+    version and requests are served by slicing it. Series the StockStore materialized
+    at load time (default parameters) are sliced the same way, with no computation.
 
     Parameters:
-        df (pd.DataFrame): DataFrame with ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+        df (pd.DataFrame | StockStore | PartitionedStockStore): Dataset to read from
+        stock_symbol (str): Stock ticker/symbol
+        requests (list): (indicator, params, start_date, end_date) tuples; params as from resolve_params
+        cache (IndicatorCache): Optional cache of full-history series
+
+    Returns:
+        list: (dates, values) per request, values being a dict of indicator arrays
+    """
+    with span("symbol_slice"):
+        if isinstance(df, PartitionedStockStore):
+            # Read just enough of the symbol's partition for every window and its warm-up
+            starts = [start_date for _, _, start_date, _ in requests]
+            ends = [end_date for _, _, _, end_date in requests]
+            dates, close = _symbol_arrays(
+                df, stock_symbol,
+                start_date=None if None in starts else min(starts, key=pd.Timestamp),
+                end_date=None if None in ends else max(ends, key=pd.Timestamp),
+                warmup_rows=max(INDICATORS[indicator][1](**params) for indicator, params, _, _ in requests),
+            )
+        else:
+            dates, close = _symbol_arrays(df, stock_symbol)
+        bounds = [window_bounds(dates, start_date, end_date) for _, _, start_date, end_date in requests]
+    use_cache = cache is not None and isinstance(df, StockStore) and stock_symbol in df
+    # Series materialized with the store (default parameters) are only sliced
+    materialized = [
+        df.materialized_columns(indicator, params, stock_symbol) if isinstance(df, StockStore) else None
+        for indicator, params, _, _ in requests
+    ]
+
+    if use_cache or all(values is not None for values in materialized):
+        lo, hi = 0, len(dates)
+    else:
+        lo = min(
+            (max(0, start - INDICATORS[indicator][1](**params))
+             for (indicator, params, _, _), (start, _) in zip(requests, bounds)),
+            default=0,
+        )
+        hi = max((stop for _, stop in bounds), default=0)
+        hi = max(lo, hi)
+
+    window_close = None
+    memo = {}
+    results = []
+    for (indicator, params, _, _), (start, stop), values in zip(requests, bounds, materialized):
+        kernel = INDICATORS[indicator][0]
+        # Materialized and cached series cover the symbol's full history, computed ones rows lo:hi
+        offset = 0
+        if values is None and use_cache:
+            cache_key = (indicator, stock_symbol, *params.values())
+            values = cache.get(df.version, cache_key)
+        if values is None:
+            if window_close is None:
+                window_close = np.asarray(close[lo:hi], dtype=np.float64)
+            with span("kernel"):
+                values = kernel(window_close, **params, memo=memo)
+            offset = lo
+            if use_cache:
+                cache.put(df.version, cache_key, values)
+        results.append((dates[start:stop], {col: arr[start - offset:stop - offset] for col, arr in values.items()}))
+    return results
+
+
+def compute_indicator_window(df, stock_symbol, indicator, params, start_date, end_date, cache=None):
+    """Compute one indicator over [start_date, end_date]; see compute_indicator_windows."""
+    params = resolve_params(indicator, params)
+    return compute_indicator_windows(df, stock_symbol, [(indicator, params, start_date, end_date)], cache=cache)[0]
+
+
+def compute_indicator_batch(df, specs, cache=None):
+    """
+    Compute many (symbol, indicator) requests, slicing each symbol's data only once.
+
+    Parameters:
+        df (pd.DataFrame | StockStore): Dataset to read from
+        specs (list): (stock_symbol, indicator, params, start_date, end_date) tuples
+        cache (IndicatorCache): Optional cache of full-history series
+
+    Returns:
+        list: (dates, values) per spec, in input order, as compute_indicator_window returns them
+    """
+    by_symbol = {}
+    for i, (stock_symbol, indicator, params, start_date, end_date) in enumerate(specs):
+        by_symbol.setdefault(stock_symbol, []).append(
+            (i, (indicator, resolve_params(indicator, params), start_date, end_date))
+        )
+
+    results = [None] * len(specs)
+    for stock_symbol, items in by_symbol.items():
+        windows = compute_indicator_windows(df, stock_symbol, [request for _, request in items], cache=cache)
+        for (i, _), window in zip(items, windows):
+            results[i] = window
+    return results
+
+
+def calculate_indicator_batch(df, specs, cache=None):
+    """
+    Compute many (symbol, indicator) requests as compute_indicator_batch does.
+
+    Returns:
+        list: JSON-ready DataFrame per spec, in input order
+    """
+    windows = compute_indicator_batch(df, specs, cache=cache)
+    return [to_output_frame(spec[0], dates, values) for spec, (dates, values) in zip(specs, windows)]
+
+
+def calculate_simple_moving_average(df, stock_symbol, ma_period, start_date, end_date, cache=None):
+    """
+    Calculate moving average for a specific stock symbol over a date range.
+
+    Parameters:
+        df (pd.DataFrame | StockStore): StockStore or DataFrame with columns ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
         stock_symbol (str): Stock ticker/symbol to filter
-        fast_period (int): Fast EMA period (default = 12)
-        slow_period (int): Slow EMA period (default = 26)
-        signal_period (int): Signal line EMA period (default = 9)
-        start_date (str): Start date in 'YYYY-MM-DD' (optional)
-        end_date (str): End date in 'YYYY-MM-DD' (optional)
+        ma_period (int): Moving average window (e.g. 20 for 20-day MA)
+        start_date (str): Start date in 'YYYY-MM-DD' format
+        end_date (str): End date in 'YYYY-MM-DD' format
+        cache (IndicatorCache): Optional cache of full-history series
 
     Returns:
-        pd.DataFrame: DataFrame with Date, Close, MACD, Signal Line, and Histogram
+        pd.DataFrame: DataFrame with Symbol, Date and Moving Average
     """
-    # Filter for selected stock and sort by date
-    stock_df = df[df[SYMBOL_COL] == stock_symbol].sort_values(DATE_COL).copy()
+    dates, values = compute_indicator_window(
+        df, stock_symbol, "SMA", {"period": ma_period}, start_date, end_date, cache=cache
+    )
+    return to_output_frame(stock_symbol, dates, values)
 
-    # Calculate EMAs
-    ema_fast = stock_df[CLOSE_COL].ewm(span=fast_period, adjust=False).mean()
-    ema_slow = stock_df[CLOSE_COL].ewm(span=slow_period, adjust=False).mean()
+def calculate_exponential_moving_average(df, stock_symbol, ema_period, start_date, end_date, cache=None):
+    """
+    Calculate Exponential Moving Average (EMA) for a stock symbol over a date range.
 
-    # MACD line
-    stock_df[MACD_COL] = ema_fast - ema_slow
+    Parameters:
+        df (pd.DataFrame | StockStore): StockStore or DataFrame with columns ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+        stock_symbol (str): Stock ticker/symbol to filter
+        ema_period (int): EMA window (e.g., 20 for 20-day EMA)
+        start_date (str): Start date in 'YYYY-MM-DD' format
+        end_date (str): End date in 'YYYY-MM-DD' format
+        cache (IndicatorCache): Optional cache of full-history series
 
-    # Signal line (9-period EMA of MACD)
-    stock_df[SIGNAL_COL] = stock_df[MACD_COL].ewm(span=signal_period, adjust=False).mean()
+    Returns:
+        pd.DataFrame: DataFrame with Symbol, Date and EMA
+    """
+    dates, values = compute_indicator_window(
+        df, stock_symbol, "EMA", {"period": ema_period}, start_date, end_date, cache=cache
+    )
+    return to_output_frame(stock_symbol, dates, values)
 
-    # Histogram = MACD - Signal
-    stock_df[HIST_COL] = stock_df[MACD_COL] - stock_df[SIGNAL_COL]
 
-    # Filter by date range if provided
-    if start_date and end_date:
-        stock_df = stock_df[(stock_df[DATE_COL] >= start_date) & (stock_df[DATE_COL] <= end_date)]
+def calculate_rsi(df, stock_symbol, rsi_period, start_date, end_date, cache=None):
+    """
+    Calculate Relative Strength Index (RSI) for a stock over a date range.
 
-    stock_df[DATE_COL] = stock_df[DATE_COL].astype(str)
-    stock_df = stock_df.where(pd.notnull(stock_df), None)
-    stock_df = stock_df.replace({np.nan: None})
+    Parameters:
+        df (pd.DataFrame | StockStore): StockStore or DataFrame with columns ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+        stock_symbol (str): Stock ticker/symbol to filter
+        rsi_period (int): Period for RSI (e.g., 14 for 14-day RSI)
+        start_date (str): Start date in 'YYYY-MM-DD' format
+        end_date (str): End date in 'YYYY-MM-DD' format
+        cache (IndicatorCache): Optional cache of full-history series
 
-    return stock_df[[SYMBOL_COL, DATE_COL, MACD_COL, SIGNAL_COL, HIST_COL]].reset_index(drop=True)
+    Returns:
+        pd.DataFrame: DataFrame with Symbol, Date and RSI
+    """
+    dates, values = compute_indicator_window(
+        df, stock_symbol, "RSI", {"period": rsi_period}, start_date, end_date, cache=cache
+    )
+    return to_output_frame(stock_symbol, dates, values)
 
 
-def calculate_bollinger_bands(df, stock_symbol, period=20, num_std_dev=2, start_date=None, end_date=None):
+def calculate_macd(df, stock_symbol, fast_period=12, slow_period=26, signal_period=9, start_date=None, end_date=None, cache=None):
     """
-    Calculate Bollinger Bands (SMA, Upper Band, Lower Band) for a stock.
+    Calculate MACD, Signal line, and Histogram for a stock over a date range.
 
     Parameters:
-        df (pd.DataFrame): DataFrame with ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+        df (pd.DataFrame | StockStore): StockStore or DataFrame with ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
         stock_symbol (str): Stock ticker/symbol to filter
-        period (int): Moving average period (default = 20)
-        num_std_dev (int): Standard deviation multiplier (default = 2)
+        fast_period (int): Fast EMA period (default = 12)
+        slow_period (int): Slow EMA period (default = 26)
+        signal_period (int): Signal line EMA period (default = 9)
         start_date (str): Start date in 'YYYY-MM-DD' (optional)
         end_date (str): End date in 'YYYY-MM-DD' (optional)
+        cache (IndicatorCache): Optional cache of full-history series
 
     Returns:
-        pd.DataFrame: DataFrame with Date, Close, SMA, Upper Band, and Lower Band
+        pd.DataFrame: DataFrame with Symbol, Date, MACD, Signal Line, and Histogram
     """
-    # Filter and sort by date
-    stock_df = df[df[SYMBOL_COL] == stock_symbol].sort_values(DATE_COL).copy()
+    # Filter by date range only if both bounds are provided
+    if not (start_date and end_date):
+        start_date = end_date = None
+
+    dates, values = compute_indicator_window(
+        df, stock_symbol, "MACD",
+        {"fast_period": fast_period, "slow_period": slow_period, "signal_period": signal_period},
+        start_date, end_date, cache=cache
+    )
+    return to_output_frame(stock_symbol, dates, values)
 
-    # Calculate SMA and standard deviation
-    stock_df[SMA_COL] = stock_df[CLOSE_COL].rolling(window=period).mean()
-    rolling_std = stock_df[CLOSE_COL].rolling(window=period).std()
 
-    # Calculate upper and lower bands
-    stock_df[UPPER_BB_COL] = stock_df[SMA_COL] + (rolling_std * num_std_dev)
-    stock_df[LOWER_BB_COL] = stock_df[SMA_COL] - (rolling_std * num_std_dev)
+def calculate_bollinger_bands(df, stock_symbol, period=20, num_std_dev=2, start_date=None, end_date=None, cache=None):
+    """
+    Calculate Bollinger Bands (SMA, Upper Band, Lower Band) for a stock.
 
-    # Filter by date range if provided
-    if start_date and end_date:
-        stock_df = stock_df[(stock_df[DATE_COL] >= start_date) & (stock_df[DATE_COL] <= end_date)]
+    Parameters:
+        df (pd.DataFrame | StockStore): StockStore or DataFrame with ['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+        stock_symbol (str): Stock ticker/symbol to filter
+        period (int): Moving average period (default = 20)
+        num_std_dev (int): Standard deviation multiplier (default = 2)
+        start_date (str): Start date in 'YYYY-MM-DD' (optional)
+        end_date (str): End date in 'YYYY-MM-DD' (optional)
+        cache (IndicatorCache): Optional cache of full-history series
 
-    stock_df[DATE_COL] = stock_df[DATE_COL].astype(str)
-    stock_df = stock_df.where(pd.notnull(stock_df), None)
-    stock_df = stock_df.replace({np.nan: None})
+    Returns:
+        pd.DataFrame: DataFrame with Symbol, Date, SMA, Upper Band, and Lower Band
+    """
+    # Filter by date range only if both bounds are provided
+    if not (start_date and end_date):
+        start_date = end_date = None
 
-    return stock_df[[SYMBOL_COL, DATE_COL, SMA_COL, UPPER_BB_COL, LOWER_BB_COL]].reset_index(drop=True)
+    dates, values = compute_indicator_window(
+        df, stock_symbol, "Bollinger", {"period": period, "num_std_dev": num_std_dev},
+        start_date, end_date, cache=cache
+    )
+    return to_output_frame(stock_symbol, dates, values)
 #
 # def simple_moving_average(input_path,MA,DATE_RANGE):
 #     try:
@@ -1,9 +1,215 @@
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import numpy as np
 import pandas as pd
 
 from app.utils import clean_stock_data
-from config import DATA_DIR
+from app.services.stock_store import StockStore, COMPACT_SERIES_DTYPE, read_snapshot_meta, write_snapshot_meta
+from app.services.partitioned_store import PartitionedStockStore, read_manifest, write_partitioned
+from app.services.batch_indicators_service import materialize_defaults
+from app.services.indicators_service import resolve_params
+from config import (
+    DATA_DIR, SNAPSHOT_DIR, STOCK_DATA_COMPACT, STOCK_DATA_BACKEND, PARTITIONED_DATA_DIR, PARTITION_BY_YEAR,
+    MATERIALIZED_INDICATORS,
+)
+
+STOCK_DATA_PATH = DATA_DIR / "stocks_ohlc_data.parquet"
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_and_clean_data(path=STOCK_DATA_PATH):
+    df = pd.read_parquet(path)
+    return clean_stock_data(df)
+
+
+@contextmanager
+def _exclusive_lock(lock_path):
+    """Inter-process lock around snapshot builds; a no-op where fcntl is unavailable."""
+    if fcntl is None:
+        yield
+        return
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def snapshot_lock(snapshot_dir):
+    """Inter-process lock held while a snapshot is built, rewritten or read as a whole."""
+    return _exclusive_lock(snapshot_dir.with_name(snapshot_dir.name + ".lock"))
+
+
+def store_version(sha256: str, compact: bool) -> str:
+    """Dataset version of a source file's content, distinct per storage layout."""
+    if not compact:
+        return sha256[:16]
+    return hashlib.sha256(f"{sha256}:compact".encode()).hexdigest()[:16]
+
+
+def materialized_keys(indicators) -> list:
+    """StockStore.materialized keys (as JSON lists) of the default-parameter series of `indicators`."""
+    return [[indicator, *resolve_params(indicator).values()] for indicator in indicators]
+
+
+def materialized_dtype(compact: bool):
+    """Storage type of the materialized series of a store of either layout."""
+    return np.dtype(COMPACT_SERIES_DTYPE if compact else np.float64)
+
+
+def load_stock_store(path=STOCK_DATA_PATH, snapshot_dir=SNAPSHOT_DIR, mmap=False, backend=STOCK_DATA_BACKEND,
+                     compact=STOCK_DATA_COMPACT, materialize=MATERIALIZED_INDICATORS):
+    """
+    Load the cleaned dataset indexed by symbol for O(1) per-request slicing.
+
+    With `backend="partitioned"` this opens a PartitionedStockStore instead (see
+    load_partitioned_store); `snapshot_dir` and `mmap` then do not apply.
+
+    The cleaned, sorted store is persisted as a snapshot keyed on the source file. A warm
+    start loads that snapshot directly: it is trusted when the source's mtime and size are
+    unchanged, and otherwise only if the source's SHA-256 still matches. Any other case
+    re-cleans the source (cold start) and rewrites the snapshot.
+
+    With `compact=True` the store uses the compact column types (stock_store.compact_columns)
+    and gets its own version; a snapshot of the other layout is rebuilt.
+
+    The default-parameter series of the `materialize` indicators are computed for every
+    symbol on a cold start and saved with the snapshot, as float32 in a compact store; a
+    snapshot materializing other indicators, or storing them as another type, is rebuilt.
+
+    With `mmap=True` the snapshot columns and symbol offsets are memory-mapped read-only
+    instead of read into private memory, so every worker on the host shares one copy
+    through the page cache.
+
+    The snapshot is read and rebuilt under the snapshot lock either way: the first worker
+    to start (or to reload a changed source) builds it and the others wait and then load
+    it warm, and a build never overwrites bars another worker is appending.
+    """
+    if backend == "partitioned":
+        return load_partitioned_store(path)
+    if backend != "memory":
+        raise ValueError(f"Unknown stock data backend: {backend}")
+    if snapshot_dir is None:
+        if mmap:
+            raise ValueError("Memory-mapped stock data requires a snapshot directory")
+        return _load_stock_store(path, None, mmap_mode=None, compact=compact, materialize=materialize)
+    with snapshot_lock(snapshot_dir):
+        return _load_stock_store(path, snapshot_dir, mmap_mode="r" if mmap else None, compact=compact,
+                                 materialize=materialize)
+
+
+def _load_stock_store(path, snapshot_dir, mmap_mode, compact, materialize):
+    started = time.perf_counter()
+    stat = path.stat()
+    meta = read_snapshot_meta(snapshot_dir) if snapshot_dir is not None else None
+    if meta is not None and meta.get("compact", False) != compact:
+        meta = None
+    if meta is not None and [entry["key"] for entry in meta.get("materialized", [])] != materialized_keys(materialize):
+        meta = None
+    if meta is not None and any(entry.get("dtype") != materialized_dtype(compact).name for entry in meta["materialized"]):
+        meta = None
+
+    sha256 = None
+    if meta is not None and (meta.get("source_mtime_ns"), meta.get("source_size")) != (stat.st_mtime_ns, stat.st_size):
+        sha256 = file_sha256(path)
+        if meta.get("source_sha256") != sha256:
+            meta = None
+
+    if meta is not None:
+        try:
+            store = StockStore.load(snapshot_dir, mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Stock data snapshot unreadable, rebuilding: {e}")
+        else:
+            if sha256 is not None:
+                # Source was touched but not changed: re-key the snapshot on the new mtime
+                try:
+                    write_snapshot_meta(snapshot_dir, dict(meta, source_mtime_ns=stat.st_mtime_ns, source_size=stat.st_size))
+                except OSError:
+                    pass
+            print(f"Stock data loaded from snapshot (warm start) in {time.perf_counter() - started:.2f}s")
+            return store
+
+    sha256 = sha256 or file_sha256(path)
+    store = StockStore.from_frame(load_and_clean_data(path), version=store_version(sha256, compact), compact=compact)
+    if materialize:
+        materialize_started = time.perf_counter()
+        store.materialized = materialize_defaults(store, materialize, dtype=materialized_dtype(compact))
+        print(f"Default indicator series materialized for {len(store.symbols)} symbols "
+              f"in {time.perf_counter() - materialize_started:.2f}s")
+    if snapshot_dir is not None:
+        try:
+            store.save(snapshot_dir, metadata={
+                "compact": compact,
+                "source_sha256": sha256,
+                "source_mtime_ns": stat.st_mtime_ns,
+                "source_size": stat.st_size,
+            })
+        except OSError as e:
+            print(f"Could not write stock data snapshot: {e}")
+        else:
+            if mmap_mode is not None:
+                # Swap the private copy for the shared mapping of what was just written
+                store = StockStore.load(snapshot_dir, mmap_mode=mmap_mode)
+    print(f"Stock data cleaned from source (cold start) in {time.perf_counter() - started:.2f}s")
+    return store
+
+
+def load_partitioned_store(path=STOCK_DATA_PATH, directory=PARTITIONED_DATA_DIR, by_year=PARTITION_BY_YEAR):
+    """
+    Open the symbol-partitioned dataset built from `path`, building it first if needed.
+
+    Each build goes to its own <directory>/<version> so that a store still serving
+    requests keeps its files through a reload; older builds than the newest two are
+    removed. As with snapshots, a build is reused when the source's mtime and size are
+    unchanged, or failing that its SHA-256.
+    """
+    started = time.perf_counter()
+    stat = path.stat()
+    with _exclusive_lock(directory.with_name(directory.name + ".lock")):
+        builds = {
+            build: read_manifest(build)
+            for build in (directory.iterdir() if directory.exists() else [])
+            if build.is_dir()
+        }
+        builds = {build: meta for build, meta in builds.items() if meta is not None and meta.get("by_year") == by_year}
+        for build, meta in builds.items():
+            if (meta.get("source_mtime_ns"), meta.get("source_size")) == (stat.st_mtime_ns, stat.st_size):
+                print(f"Partitioned stock data opened (warm start) in {time.perf_counter() - started:.2f}s")
+                return PartitionedStockStore(build)
 
+        sha256 = file_sha256(path)
+        build = directory / (sha256[:16] + ("-by-year" if by_year else ""))
+        if builds.get(build, {}).get("source_sha256") != sha256:
+            write_partitioned(path, build, by_year=by_year, metadata={
+                "version": sha256[:16],
+                "source_sha256": sha256,
+                "source_mtime_ns": stat.st_mtime_ns,
+                "source_size": stat.st_size,
+            })
+            print(f"Stock data partitioned from source (cold start) in {time.perf_counter() - started:.2f}s")
+        os.utime(build)
 
-def load_and_clean_data():
-    df = pd.read_parquet(DATA_DIR / "stocks_ohlc_data.parquet")
-    return clean_stock_data(df)
\ No newline at end of file
+        # Keep the new build and the one the previous dataset version may still be reading
+        complete = [p for p in directory.iterdir() if p.is_dir() and read_manifest(p) is not None]
+        for stale in sorted(complete, key=lambda p: p.stat().st_mtime, reverse=True)[2:]:
+            shutil.rmtree(stale, ignore_errors=True)
+    return PartitionedStockStore(build)
@@ -0,0 +1,238 @@
+# services/metrics_service.py
+"""
+Per-request timing spans exported as Prometheus histograms.
+
+MetricsMiddleware gives every HTTP request a RequestMetrics in a context variable.
+Code on the hot path wraps its stages in `with span("kernel"):`; each span adds its
+duration to the current request. When the request ends, the middleware records one
+observation per stage in `indicator_stage_seconds`, labelled by the indicator, tier and
+window the endpoint set with label_request(). It also records the whole request in
+`http_request_duration_seconds`. GET /metrics renders the registry in the Prometheus
+text format.
+
+Components with counters of their own (the indicator cache, the password hash pool)
+are registered as collectors: callables returning (name, type, help, value) samples,
+read on every render.
+
+Computations on the ComputePool run outside the request's context: traced_call() runs
+them under a fresh RequestMetrics (in a pool thread or worker process) and hands their
+spans back with the result.
+
+Outside a request, and when METRICS_ENABLED=0 (no middleware), span() returns a shared
+no-op context manager, so instrumented code costs one context-variable lookup.
+"""
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import date
+
+from config import METRICS_BUCKETS, METRICS_WINDOW_LABELS
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+_current = ContextVar("request_metrics", default=None)
+_NOOP = nullcontext()
+
+
+class RequestMetrics:
+    """Stage timings and labels collected over one request (or one pool computation)."""
+
+    __slots__ = ("spans", "labels")
+
+    def __init__(self):
+        self.spans = []
+        self.labels = None
+
+
+class _Span:
+    __slots__ = ("stage", "spans", "started")
+
+    def __init__(self, stage, spans):
+        self.stage = stage
+        self.spans = spans
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.spans.append((self.stage, time.perf_counter() - self.started))
+
+
+def span(stage: str):
+    """Time the enclosed block as `stage` of the current request; a no-op outside one."""
+    request = _current.get()
+    if request is None:
+        return _NOOP
+    return _Span(stage, request.spans)
+
+
+def window_label(start_date: str, end_date: str) -> str:
+    """Bucket a requested date range into one of METRICS_WINDOW_LABELS (keeps label cardinality fixed)."""
+    try:
+        days = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days
+    except (TypeError, ValueError):
+        return "invalid"
+    for max_days, label in METRICS_WINDOW_LABELS:
+        if days <= max_days:
+            return label
+    return "max"
+
+
+def label_request(indicator: str, user, start_date: str = None, end_date: str = None, window: str = None):
+    """Attach the indicator, the user's tier and the window label to the current request."""
+    request = _current.get()
+    if request is not None:
+        request.labels = (indicator, user.subscription_tier, window or window_label(start_date, end_date))
+
+
+def traced_call(fn, *args, **kwargs):
+    """
+    Run `fn` under its own RequestMetrics.
+
+    Returns:
+        tuple: fn's result and its spans, including a "worker" span for the whole call
+    """
+    request = RequestMetrics()
+    token = _current.set(request)
+    try:
+        with _Span("worker", request.spans):
+            result = fn(*args, **kwargs)
+    finally:
+        _current.reset(token)
+    return result, request.spans
+
+
+def add_spans(spans):
+    """Merge spans returned by traced_call into the current request."""
+    request = _current.get()
+    if request is not None:
+        request.spans.extend(spans)
+
+
+def is_active() -> bool:
+    """Whether the caller runs inside a measured request."""
+    return _current.get() is not None
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a fixed tuple of label names."""
+
+    def __init__(self, name: str, documentation: str, label_names, buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, seconds: float):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-1]!r}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """The histograms and collectors GET /metrics exports."""
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.requests = Histogram(
+            "http_request_duration_seconds", "Time to answer an HTTP request",
+            ("handler", "method", "status"), buckets,
+        )
+        self.stages = Histogram(
+            "indicator_stage_seconds", "Time per request spent in each stage of an indicator request",
+            ("stage", "indicator", "tier", "window"), buckets,
+        )
+        self._collectors = {}
+
+    def record(self, handler: str, method: str, status: int, seconds: float, request: RequestMetrics):
+        self.requests.observe((handler, method, str(status)), seconds)
+        if request.labels is None:
+            return
+        # One observation per stage and request: stages that ran several times are summed
+        totals = {"total": seconds}
+        for stage, elapsed in request.spans:
+            totals[stage] = totals.get(stage, 0.0) + elapsed
+        for stage, elapsed in totals.items():
+            self.stages.observe((stage, *request.labels), elapsed)
+
+    def register_collector(self, name: str, collect):
+        """Export the samples `collect()` returns on every render; a later call under `name` replaces it."""
+        self._collectors[name] = collect
+
+    def render(self) -> str:
+        lines = self.requests.render() + self.stages.render()
+        for collect in list(self._collectors.values()):
+            lines += render_samples(collect())
+        return "\n".join(lines) + "\n"
+
+
+def render_samples(samples) -> list:
+    """Prometheus text lines of unlabelled (name, type, help, value) counter and gauge samples."""
+    lines = []
+    for name, kind, documentation, value in samples:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value!r}"]
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request and collecting its spans into `registry`."""
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(request)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            # The matched endpoint's name, not the raw path, keeps unknown URLs to one series
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            self.registry.record(handler, scope["method"], status, elapsed, request)
@@ -0,0 +1,221 @@
+# services/partitioned_store.py
+"""
+On-disk stock store for datasets larger than a worker's memory.
+
+write_partitioned() cleans the source parquet one symbol at a time into
+
+    <directory>/symbol=<SYMBOL>/data.parquet       one row group per calendar year
+    <directory>/symbol=<SYMBOL>/year=<YYYY>.parquet  with by_year=True
+
+plus a manifest.json listing every symbol's chunks (row groups or year files) with
+their row counts and date ranges. The source is first streamed into raw per-symbol
+partitions in batches, so building never holds more than one symbol in memory.
+
+PartitionedStockStore answers the same per-symbol reads as StockStore. A date-bounded
+read opens only the symbol's partition and only the chunks that overlap the window,
+plus enough earlier rows for the indicator warm-up. Chunks are kept in a bytes-bounded
+LRU, so hot symbols are served from memory and resident memory stays bounded however
+large the dataset grows.
+"""
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from app.services.indicator_cache import IndicatorCache
+from app.utils import clean_stock_data
+from config import SYMBOL_COL, DATE_COL, PARTITION_CACHE_BYTES, PARTITION_SCAN_BATCH_ROWS
+
+MANIFEST = "manifest.json"
+
+
+def write_partitioned(source_path, directory, by_year: bool = False, metadata: dict = None,
+                      batch_rows: int = PARTITION_SCAN_BATCH_ROWS):
+    """
+    Clean `source_path` into a symbol-partitioned dataset at `directory`.
+
+    The dataset is written to a temporary sibling directory and renamed into place, so
+    readers never observe a half-written one.
+
+    Parameters:
+        source_path (Path): Raw OHLC parquet file
+        directory (Path): Destination; replaced if it exists
+        by_year (bool): One file per symbol and year instead of one row group per year
+        metadata (dict): Extra manifest entries (must include "version")
+        batch_rows (int): Rows per batch when streaming the source
+    """
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=directory.name + ".", dir=directory.parent))
+    try:
+        raw_dir = tmp_dir / "_raw"
+        source = ds.dataset(source_path, format="parquet")
+        symbol_field = next(name for name in source.schema.names if name.strip().lower() == SYMBOL_COL)
+        # Pass 1: stream the source into raw per-symbol partitions
+        ds.write_dataset(
+            source.scanner(batch_size=batch_rows), raw_dir, format="parquet",
+            partitioning=ds.partitioning(pa.schema([(symbol_field, source.schema.field(symbol_field).type)]), flavor="hive"),
+        )
+
+        # Pass 2: clean each symbol on its own and write it date-sorted in yearly chunks
+        symbols = {}
+        columns = None
+        for raw_partition in sorted(raw_dir.iterdir()):
+            stock_symbol = unquote(raw_partition.name.split("=", 1)[1])
+            if stock_symbol == "__HIVE_DEFAULT_PARTITION__":
+                continue
+            df = pq.read_table(raw_partition).to_pandas()
+            df[symbol_field] = stock_symbol
+            df = clean_stock_data(df)
+            if df.empty:
+                continue
+            df = df.drop(columns=[SYMBOL_COL])
+            columns = columns or {col: str(df[col].dtype) for col in df.columns}
+            symbols[stock_symbol] = _write_symbol(df, tmp_dir / f"{SYMBOL_COL}={quote(stock_symbol, safe='')}", by_year)
+        shutil.rmtree(raw_dir)
+
+        manifest = dict(metadata or {}, by_year=by_year, columns=columns or {}, symbols=symbols)
+        (tmp_dir / MANIFEST).write_text(json.dumps(manifest))
+
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _write_symbol(df, symbol_dir, by_year):
+    """Write one symbol's cleaned rows; returns its chunks as [file, row_group, rows, first_date, last_date]."""
+    symbol_dir.mkdir()
+    days = df[DATE_COL].to_numpy().astype("datetime64[D]")
+    years = days.astype("datetime64[Y]")
+    bounds = np.flatnonzero(years[1:] != years[:-1]) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.append(bounds, len(df))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    chunks = []
+    writer = None
+    try:
+        for group, (start, stop) in enumerate(zip(starts, stops)):
+            part = table.slice(start, stop - start)
+            if by_year:
+                name = f"year={years[start]}.parquet"
+                pq.write_table(part, symbol_dir / name)
+                row_group = 0
+            else:
+                name = "data.parquet"
+                writer = writer or pq.ParquetWriter(symbol_dir / name, table.schema)
+                writer.write_table(part)
+                row_group = group
+            chunks.append([f"{symbol_dir.name}/{name}", row_group, int(stop - start), str(days[start]), str(days[stop - 1])])
+    finally:
+        if writer is not None:
+            writer.close()
+    return chunks
+
+
+def read_manifest(directory):
+    """Return a partitioned dataset's manifest, or None if there is no complete dataset."""
+    try:
+        return json.loads((Path(directory) / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+class PartitionedStockStore:
+    """
+    Symbol-partitioned parquet dataset read on demand.
+
+    Parameters:
+        directory (Path): Dataset written by write_partitioned
+        cache_bytes (int): Budget of the LRU of loaded chunks
+    """
+
+    def __init__(self, directory, cache_bytes: int = PARTITION_CACHE_BYTES):
+        self.directory = Path(directory)
+        manifest = read_manifest(self.directory)
+        if manifest is None:
+            raise ValueError(f"No partitioned stock data at {self.directory}")
+        self.version = manifest["version"]
+        self.column_names = list(manifest["columns"])
+        self._dtypes = {col: np.dtype(dtype) for col, dtype in manifest["columns"].items()}
+        self._chunks = {
+            stock_symbol: [
+                (file, row_group, rows, np.datetime64(first, "D"), np.datetime64(last, "D"))
+                for file, row_group, rows, first, last in chunks
+            ]
+            for stock_symbol, chunks in manifest["symbols"].items()
+        }
+        self.symbols = np.array(sorted(self._chunks), dtype=object)
+        self._rows = sum(rows for chunks in self._chunks.values() for _, _, rows, _, _ in chunks)
+        # IndicatorCache doubles as the bytes-bounded LRU of loaded chunks
+        self._cache = IndicatorCache(cache_bytes)
+        self._cache.invalidate(self.version)
+        self.chunk_reads = 0
+
+    def __len__(self):
+        return self._rows
+
+    def __contains__(self, stock_symbol):
+        return stock_symbol in self._chunks
+
+    def get_symbol_columns(self, stock_symbol: str, columns=None, start_date=None, end_date=None,
+                           warmup_rows: int = 0) -> dict:
+        """
+        Return the requested columns of one symbol, date-sorted.
+
+        With `start_date`/`end_date`, only chunks overlapping the window are read, plus
+        earlier ones until at least `warmup_rows` rows precede `start_date`. The result
+        may extend beyond the window to chunk boundaries; callers slice it with
+        window_bounds. Unknown symbols yield empty arrays.
+        """
+        names = list(columns) if columns is not None else self.column_names
+        selected = self._select_chunks(self._chunks.get(stock_symbol, []), start_date, end_date, warmup_rows)
+        if not selected:
+            return {col: np.array([], dtype=self._dtypes[col]) for col in names}
+        loaded = [self._load_chunk(stock_symbol, chunk) for chunk in selected]
+        if len(loaded) == 1:
+            return {col: loaded[0][col] for col in names}
+        return {col: np.concatenate([chunk[col] for chunk in loaded]) for col in names}
+
+    def cache_stats(self) -> dict:
+        return dict(self._cache.stats(), chunk_reads=self.chunk_reads)
+
+    @staticmethod
+    def _select_chunks(chunks, start_date, end_date, warmup_rows):
+        first, stop = 0, len(chunks)
+        if end_date is not None:
+            end = np.datetime64(pd.Timestamp(end_date).date(), "D")
+            while stop > 0 and chunks[stop - 1][3] > end:
+                stop -= 1
+        if start_date is not None:
+            start = np.datetime64(pd.Timestamp(start_date).date(), "D")
+            while first < stop and chunks[first][4] < start:
+                first += 1
+            # Step back far enough to cover the warm-up rows before the window
+            before = 0
+            while first > 0 and before < warmup_rows:
+                first -= 1
+                before += chunks[first][2]
+        return chunks[first:stop]
+
+    def _load_chunk(self, stock_symbol, chunk):
+        file, row_group, _, _, _ = chunk
+        key = (stock_symbol, file, row_group)
+        values = self._cache.get(self.version, key)
+        if values is None:
+            table = pq.ParquetFile(self.directory / file).read_row_group(row_group, columns=self.column_names)
+            values = {col: table.column(col).to_numpy() for col in self.column_names}
+            self.chunk_reads += 1
+            self._cache.put(self.version, key, values)
+        return values
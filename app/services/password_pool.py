@@ -0,0 +1,125 @@
+# services/password_pool.py
+"""
+Dedicated, size-capped pool for bcrypt hashing and verification.
+
+bcrypt is deliberately slow (tens of milliseconds per call) and releases the GIL, so
+a few dedicated threads run it in parallel without touching the event loop, the AnyIO
+threadpool that sync endpoints run on or the ComputePool behind /api/v1/indicators/*. At most
+`max_pending` calls may be queued or running; beyond that the caller gets a 503 with
+Retry-After instead of an ever-growing queue. A call counts against that limit until it
+has finished on the pool, even if its caller was cancelled. The saturation and
+backpressure counters are exported on GET /metrics (metric_samples).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+
+class PasswordHashPool:
+    """
+    Bounded executor for password hashing with queueing and backpressure metrics.
+
+    Parameters:
+        workers (int): Threads running hash/verify calls concurrently
+        max_pending (int): Calls allowed to be queued or running before new ones are rejected
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    async def run(self, fn, *args):
+        """Run `fn(*args)` on the pool and await its result; raises 503 when the pool is saturated."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Authentication is busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        submitted = time.perf_counter()
+        timings = {}
+
+        def timed_call():
+            started = time.perf_counter()
+            timings["queue"] = started - submitted
+            try:
+                return fn(*args)
+            finally:
+                timings["run"] = time.perf_counter() - started
+
+        def release(_):
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.queue_seconds += timings.get("queue", 0.0)
+                self.run_seconds += timings.get("run", 0.0)
+
+        try:
+            future = self._get_executor().submit(timed_call)
+        except BaseException:
+            release(None)
+            raise
+        # The slot is freed when the call has actually finished, not when the caller stops
+        # waiting: a request cancelled by a client disconnect leaves its bcrypt call running
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_queue_seconds": self.queue_seconds / self.completed if self.completed else 0.0,
+                "avg_run_seconds": self.run_seconds / self.completed if self.completed else 0.0,
+            }
+
+    def metric_samples(self) -> list:
+        """Counters and gauges for GET /metrics (metrics_service.render_samples)."""
+        with self._lock:
+            return [
+                ("password_hash_pending", "gauge", "Password hash calls queued or running", self.pending),
+                ("password_hash_peak_pending", "gauge", "Most password hash calls ever queued or running at once",
+                 self.peak_pending),
+                ("password_hash_max_pending", "gauge", "Password hash calls allowed before rejecting with 503",
+                 self.max_pending),
+                ("password_hash_workers", "gauge", "Threads running password hash calls", self.workers),
+                ("password_hash_completed_total", "counter", "Password hash calls finished", self.completed),
+                ("password_hash_rejected_total", "counter", "Password hash calls rejected with 503", self.rejected),
+                ("password_hash_queue_seconds_total", "counter", "Time finished calls waited for a thread",
+                 self.queue_seconds),
+                ("password_hash_run_seconds_total", "counter", "Time finished calls spent hashing", self.run_seconds),
+            ]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,155 @@
+# services/profiling_service.py
+"""
+On-demand, time-bounded profiling of a live API worker.
+
+Two modes, both started by an admin request and both idle otherwise (no thread, no
+profiler hook; ComputePool checks a single attribute per computation):
+
+- "sample": a stack sampler reads every thread's stack of this process through
+  sys._current_frames() every PROFILE_SAMPLE_INTERVAL_SECONDS and returns collapsed
+  stacks ("thread;module.func;module.func count" per line), the input format of
+  flamegraph.pl and speedscope. It shows where the API process spends its time: the
+  event loop, auth, serialisation and, in thread compute mode, the computations.
+- "cprofile": every computation ComputePool starts during the window runs under
+  cProfile, in the pool thread or in the worker process, and the stats come back with
+  its result. They are merged into one pstats dump (load it with pstats.Stats or
+  snakeviz). This covers process compute mode, which the sampler cannot see.
+
+Only one profile runs at a time per process.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import PROFILE_SAMPLE_INTERVAL_SECONDS
+
+MODES = {
+    "sample": ("text/plain", "profile.collapsed"),
+    "cprofile": ("application/octet-stream", "profile.pstats"),
+}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def sample_stacks(seconds: float, interval: float = PROFILE_SAMPLE_INTERVAL_SECONDS) -> Counter:
+    """
+    Sample the stacks of all other threads of this process for `seconds`.
+
+    Returns:
+        Counter: Collapsed stack (root first, thread name at the root) -> samples
+    """
+    own = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Counter) -> bytes:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode()
+
+
+def profiled_call(fn, *args, **kwargs):
+    """
+    Run `fn` under cProfile.
+
+    Returns:
+        tuple: fn's result and its raw pstats dict (picklable, so it can leave a worker process)
+    """
+    profile = cProfile.Profile()
+    result = profile.runcall(fn, *args, **kwargs)
+    profile.create_stats()
+    return result, profile.stats
+
+
+class _RawStats:
+    """Adapter letting pstats.Stats take a raw stats dict."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class StatsCollector:
+    """Merges the pstats of the computations profiled during one cprofile window."""
+
+    def __init__(self):
+        self.calls = 0
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def add(self, stats: dict):
+        with self._lock:
+            self.calls += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(_RawStats(stats))
+            else:
+                self._stats.add(_RawStats(stats))
+
+    def dump(self) -> bytes:
+        """The merged stats in the format pstats.Stats(path) reads; b"" if nothing ran."""
+        with self._lock:
+            return marshal.dumps(self._stats.stats) if self._stats is not None else b""
+
+
+class Profiler:
+    """
+    Runs one profile at a time for this process.
+
+    ComputePool reads `collector`: None when idle, else the StatsCollector computations
+    report to.
+    """
+
+    def __init__(self):
+        self.collector = None
+        self._busy = threading.Lock()
+
+    def profile(self, seconds: float, mode: str = "sample") -> bytes:
+        """
+        Profile this process for `seconds` (blocking) and return the artifact; b"" when no
+        computation ran during a cprofile window.
+
+        Raises:
+            ValueError: Unknown mode
+            RuntimeError: Another profile is running
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode} (expected one of {', '.join(MODES)})")
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            print(f"Profiling process {os.getpid()} for {seconds:g}s ({mode})")
+            if mode == "sample":
+                return collapsed(sample_stacks(seconds))
+            collector = self.collector = StatsCollector()
+            try:
+                time.sleep(seconds)
+            finally:
+                self.collector = None
+            return collector.dump()
+        finally:
+            self._busy.release()
+
+
+profiler = Profiler()
@@ -0,0 +1,264 @@
+# services/serialization_service.py
+"""
+Response encoders for indicator results.
+
+Results arrive as NumPy columns (symbol, dates, indicator arrays) and each format is
+produced from those columns directly, without building a dict per row:
+
+- records:  JSON list of row objects (the original response shape), encoded straight to
+            bytes: dates are formatted in bulk from datetime64 and NaN becomes null in
+            the float encoder, so no DataFrame, per-row dict or jsonable_encoder pass
+            is involved
+- columnar: JSON object with one array per field
+- ndjson:   newline-delimited JSON rows, streamed in chunks
+- arrow:    Apache Arrow IPC stream
+- parquet:  Parquet file bytes
+
+A batch response is one JSON document (or one NDJSON line per item) in which every
+item's data is encoded by the records or columnar encoder above.
+"""
+import io
+import json
+
+import numpy as np
+import pyarrow as pa
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from app.services.metrics_service import span
+from config import SYMBOL_COL, DATE_COL, NDJSON_CHUNK_ROWS
+
+MEDIA_TYPES = {
+    "records": "application/json",
+    "columnar": "application/vnd.columnar+json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+_FORMATS_BY_MEDIA_TYPE = {media_type: fmt for fmt, media_type in MEDIA_TYPES.items()}
+# Formats a batch of differently shaped results can be encoded in
+BATCH_FORMATS = ("records", "columnar", "ndjson")
+
+
+def negotiate_format(accept: str = None, requested: str = None, formats=tuple(MEDIA_TYPES)) -> str:
+    """
+    Pick a response format from an explicit `format` parameter or the Accept header.
+
+    An explicit format wins; otherwise the first media type in Accept that is one of
+    `formats` is used (quality values are ignored), falling back to JSON records.
+    """
+    if requested:
+        if requested not in formats:
+            raise HTTPException(
+                status_code=406,
+                detail=f"Unsupported format '{requested}'; choose one of {', '.join(formats)}",
+            )
+        return requested
+    for part in (accept or "").split(","):
+        fmt = _FORMATS_BY_MEDIA_TYPE.get(part.split(";")[0].strip().lower())
+        if fmt in formats:
+            return fmt
+    return "records"
+
+
+def _symbol_column(stock_symbol, n):
+    if isinstance(stock_symbol, str):
+        return np.full(n, stock_symbol, dtype=object)
+    return np.asarray(stock_symbol, dtype=object)
+
+
+def _date_strings(dates):
+    return np.datetime_as_string(np.asarray(dates, dtype="datetime64[D]"), unit="D")
+
+
+def iso_date_bytes(dates) -> np.ndarray:
+    """
+    Format datetime64 dates as 'YYYY-MM-DD' byte strings in one vectorised pass.
+
+    The digits are written into an (n, 10) uint8 matrix that is viewed as S10, which is
+    several times faster than np.datetime_as_string followed by a bytes conversion.
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    years = days.astype("datetime64[Y]")
+    months = days.astype("datetime64[M]")
+    year = years.astype(np.int64) + 1970
+    month = (months - years.astype("datetime64[M]")).astype(np.int64) + 1
+    day = (days - months.astype("datetime64[D]")).astype(np.int64) + 1
+
+    out = np.empty((len(days), 10), dtype=np.uint8)
+    for i, divisor in enumerate((1000, 100, 10, 1)):
+        out[:, i] = year // divisor % 10
+    out[:, 5], out[:, 6] = month // 10, month % 10
+    out[:, 8], out[:, 9] = day // 10, day % 10
+    out += ord("0")
+    out[:, [4, 7]] = ord("-")
+    return out.view("S10").ravel()
+
+
+def _nullable(arr):
+    """Object array of floats with None wherever the value is NaN."""
+    out = arr.astype(object)
+    out[~np.isfinite(arr)] = None
+    return out
+
+
+def columnar_json(stock_symbol, dates, values) -> bytes:
+    """Encode the columnar body: one JSON array per field, floats written by float_tokens."""
+    payload = {
+        SYMBOL_COL: stock_symbol if isinstance(stock_symbol, str) else _symbol_column(stock_symbol, len(dates)).tolist(),
+        DATE_COL: _date_strings(dates).tolist(),
+    }
+    body = _json_bytes(payload)[:-1]
+    for col, arr in values.items():
+        body += b",%s:[%s]" % (_json_bytes(col), b",".join(float_tokens(arr)))
+    return body + b"}"
+
+
+def _json_bytes(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def float_tokens(arr) -> list:
+    """
+    JSON number tokens of a float array, with null wherever the value is NaN or infinite.
+
+    float32 arrays (a compact store's materialized series) are written with the shortest
+    digits that read back as the same float32, e.g. 94.03573, not widened to float64
+    first, which would print 94.03572845458984.
+    """
+    arr = np.asarray(arr)
+    arr = np.ascontiguousarray(arr, dtype=np.float32 if arr.dtype == np.float32 else np.float64)
+    if orjson is not None:
+        body = orjson.dumps(arr, option=orjson.OPT_SERIALIZE_NUMPY)[1:-1]
+    elif arr.dtype == np.float32:
+        tokens = arr.astype("S32").astype(object)
+        tokens[~np.isfinite(arr)] = b"null"
+        return tokens.tolist()
+    else:
+        body = _json_bytes(_nullable(arr).tolist())[1:-1]
+    return body.split(b",") if body else []
+
+
+def _symbol_tokens(stock_symbol, n):
+    if isinstance(stock_symbol, str):
+        return [_json_bytes(stock_symbol)] * n
+    uniques, inverse = np.unique(np.asarray(stock_symbol, dtype=str), return_inverse=True)
+    return np.array([_json_bytes(s) for s in uniques.tolist()], dtype=object)[inverse].tolist()
+
+
+def _json_rows(stock_symbol, dates, values) -> list:
+    """One JSON object per row as bytes, keyed like the records response."""
+    n = len(dates)
+    template = b'{"%s":%%s,"%s":"%%s"' % (SYMBOL_COL.encode(), DATE_COL.encode())
+    template += b"".join(b",%s:%%s" % _json_bytes(col).replace(b"%", b"%%") for col in values) + b"}"
+    columns = [_symbol_tokens(stock_symbol, n), iso_date_bytes(dates).tolist()]
+    columns += [float_tokens(arr) for arr in values.values()]
+    return [template % row for row in zip(*columns)]
+
+
+def records_json(stock_symbol, dates, values) -> bytes:
+    """Encode rows as the JSON records body, without materialising a dict per row."""
+    return b"[" + b",".join(_json_rows(stock_symbol, dates, values)) + b"]"
+
+
+def iter_ndjson(stock_symbol, dates, values, chunk_rows=NDJSON_CHUNK_ROWS):
+    """Yield newline-delimited JSON rows, `chunk_rows` rows per chunk."""
+    for start in range(0, len(dates), chunk_rows):
+        stop = start + chunk_rows
+        chunk = {col: arr[start:stop] for col, arr in values.items()}
+        symbols = stock_symbol if isinstance(stock_symbol, str) else stock_symbol[start:stop]
+        yield b"\n".join(_json_rows(symbols, dates[start:stop], chunk)) + b"\n"
+
+
+def arrow_table(stock_symbol, dates, values) -> pa.Table:
+    columns = {
+        SYMBOL_COL: pa.array(_symbol_column(stock_symbol, len(dates)), type=pa.string()).dictionary_encode(),
+        DATE_COL: pa.array(np.asarray(dates, dtype="datetime64[D]"), type=pa.date32()),
+    }
+    for col, arr in values.items():
+        # float32 series stay float32 (see float_tokens)
+        float_type = pa.float32() if np.asarray(arr).dtype == np.float32 else pa.float64()
+        columns[col] = pa.array(arr, type=float_type, mask=~np.isfinite(arr))
+    return pa.table(columns)
+
+
+def arrow_ipc_bytes(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def parquet_bytes(table: pa.Table) -> bytes:
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
+
+
+def build_response(stock_symbol, dates, values, fmt: str = "records"):
+    """
+    Encode an indicator result in the negotiated format.
+
+    Parameters:
+        stock_symbol (str | np.ndarray): One symbol for all rows or a symbol per row
+        dates (np.ndarray): datetime64 dates of the rows
+        values (dict): Indicator column name -> float array aligned with dates
+        fmt (str): One of MEDIA_TYPES
+
+    Returns:
+        Response: Starlette response with the matching media type
+    """
+    with span("serialize"):
+        return _build_response(stock_symbol, dates, values, fmt)
+
+
+def _build_response(stock_symbol, dates, values, fmt):
+    media_type = MEDIA_TYPES[fmt]
+    if fmt == "records":
+        return Response(records_json(stock_symbol, dates, values), media_type=media_type)
+    if fmt == "columnar":
+        return Response(columnar_json(stock_symbol, dates, values), media_type=media_type)
+    if fmt == "ndjson":
+        return StreamingResponse(iter_ndjson(stock_symbol, dates, values), media_type=media_type)
+    table = arrow_table(stock_symbol, dates, values)
+    if fmt == "arrow":
+        return Response(arrow_ipc_bytes(table), media_type=media_type)
+    return Response(parquet_bytes(table), media_type=media_type)
+
+
+def _batch_item(envelope: dict, result, fmt) -> bytes:
+    head = _json_bytes(envelope)
+    if result is None:
+        return head
+    if fmt == "columnar":
+        data = columnar_json(*result)
+    else:
+        data = records_json(*result)
+    return head[:-1] + b',"data":' + data + b"}"
+
+
+def build_batch_response(items, fmt: str = "records"):
+    """
+    Encode the items of a batch in the negotiated format.
+
+    Parameters:
+        items (list): (envelope, result) pairs. The envelope holds the item's JSON fields
+            (its request, status_code and, on errors, detail); result is its
+            (stock_symbol, dates, values), or None for an error
+        fmt (str): One of BATCH_FORMATS. Item data is records or columnar JSON; ndjson
+            puts one item (with records data) per line
+
+    Returns:
+        Response: Starlette response with the matching media type
+    """
+    with span("serialize"):
+        encoded = [_batch_item(envelope, result, fmt) for envelope, result in items]
+    if fmt == "ndjson":
+        return Response(b"".join(item + b"\n" for item in encoded), media_type=MEDIA_TYPES[fmt])
+    return Response(b"[" + b",".join(encoded) + b"]", media_type=MEDIA_TYPES[fmt])
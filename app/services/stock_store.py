@@ -0,0 +1,500 @@
+# services/stock_store.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import SYMBOL_COL, DATE_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL, APPEND_TAIL_MAX_FRACTION
+
+# Storage type of OHLC prices in a compact store; indicator kernels still compute in float64
+COMPACT_PRICE_DTYPE = np.float32
+# Storage type of the materialized indicator series of a compact store (float64 otherwise)
+COMPACT_SERIES_DTYPE = np.float32
+
+
+class StockStore:
+    """
+    In-memory OHLC store laid out contiguously by (symbol, date).
+
+    Every non-symbol column is held as a NumPy array over the sorted frame, and
+    `symbol_index` maps each symbol to its (start, stop) row offsets, so a
+    symbol lookup is an O(1) dict hit followed by zero-copy array slices
+    instead of a boolean scan over the whole frame.
+
+    `materialized` holds precomputed full-history indicator series aligned with the
+    rows, keyed like IndicatorCache entries without the symbol: (indicator, *param values).
+
+    Rows appended since the store was built are kept in `tail`, a StockStore over the
+    same symbols holding each symbol's rows that follow its base rows (see append_rows).
+    `columns`, `offsets` and `materialized` cover the base rows only. Per-symbol reads
+    (get_symbol_columns, materialized_columns), merged_column() and compacted() cover
+    all rows.
+    """
+
+    def __init__(self, columns: dict, symbols: np.ndarray, offsets: np.ndarray, version: str = None,
+                 materialized: dict = None, tail: "StockStore" = None, source: Path = None):
+        self.columns = columns
+        self.symbols = symbols
+        self.offsets = offsets
+        self.version = version
+        self.materialized = materialized or {}
+        self.tail = tail
+        # Snapshot build whose files hold exactly these base arrays; save() links them from there
+        self.source = source
+        self.symbol_index = {
+            symbol: (int(offsets[i]), int(offsets[i + 1]))
+            for i, symbol in enumerate(symbols)
+        }
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, version: str = None, compact: bool = False) -> "StockStore":
+        """
+        Build a store from a cleaned DataFrame.
+
+        The frame is re-sorted by (symbol, date) only when it is not sorted already. With
+        `compact`, columns are narrowed to their compact storage types (compact_columns).
+        """
+        symbol_values = df[SYMBOL_COL].to_numpy()
+        date_values = df[DATE_COL].to_numpy()
+        if not _is_sorted_by_symbol_and_date(symbol_values, date_values):
+            df = df.sort_values([SYMBOL_COL, DATE_COL], kind="stable")
+            symbol_values = df[SYMBOL_COL].to_numpy()
+
+        symbols, offsets = build_symbol_offsets(symbol_values)
+        columns = {
+            col: df[col].to_numpy()
+            for col in df.columns
+            if col != SYMBOL_COL
+        }
+        if compact:
+            columns = compact_columns(columns)
+        return cls(columns, symbols, offsets, version=version)
+
+    def __len__(self):
+        rows = int(self.offsets[-1]) if len(self.offsets) else 0
+        return rows + (len(self.tail) if self.tail is not None else 0)
+
+    def __contains__(self, stock_symbol):
+        return stock_symbol in self.symbol_index
+
+    def get_symbol_columns(self, stock_symbol: str, columns=None) -> dict:
+        """
+        Return the requested columns for one symbol.
+
+        They are zero-copy slices, except for a symbol with rows in the tail, whose base
+        and tail rows are joined into one copy. Unknown symbols yield empty arrays,
+        mirroring an empty boolean filter.
+        """
+        start, stop = self.symbol_index.get(stock_symbol, (0, 0))
+        names = columns if columns is not None else self.columns.keys()
+        tail_start, tail_stop = self._tail_rows(stock_symbol)
+        if tail_stop > tail_start:
+            return {
+                col: np.concatenate([self.columns[col][start:stop], self.tail.columns[col][tail_start:tail_stop]])
+                for col in names
+            }
+        return {col: self.columns[col][start:stop] for col in names}
+
+    def materialized_columns(self, indicator: str, params: dict, stock_symbol: str):
+        """One symbol's materialized series (sliced like get_symbol_columns), or None if not materialized."""
+        key = (indicator, *params.values())
+        series = self.materialized.get(key)
+        if series is None or stock_symbol not in self.symbol_index:
+            return None
+        start, stop = self.symbol_index[stock_symbol]
+        tail_start, tail_stop = self._tail_rows(stock_symbol)
+        if tail_stop > tail_start:
+            tail_series = self.tail.materialized[key]
+            return {
+                col: np.concatenate([values[start:stop], tail_series[col][tail_start:tail_stop]])
+                for col, values in series.items()
+            }
+        return {col: values[start:stop] for col, values in series.items()}
+
+    def _tail_rows(self, stock_symbol):
+        if self.tail is None:
+            return 0, 0
+        return self.tail.symbol_index.get(stock_symbol, (0, 0))
+
+    def merged_offsets(self) -> np.ndarray:
+        """Symbol offsets over all rows, base and tail (`offsets` itself without a tail)."""
+        if self.tail is None:
+            return self.offsets
+        return self.offsets + self.tail.offsets
+
+    def merged_column(self, col: str, materialized_key=None) -> np.ndarray:
+        """
+        Column `col` over all rows in (symbol, date) order, or of the materialized series
+        `materialized_key`. Without a tail this is the base array itself; with one, a copy.
+        """
+        values = self.columns[col] if materialized_key is None else self.materialized[materialized_key][col]
+        if self.tail is None:
+            return values
+        tail = self.tail.columns[col] if materialized_key is None else self.tail.materialized[materialized_key][col]
+        return np.insert(np.asarray(values), np.repeat(self.offsets[1:], np.diff(self.tail.offsets)), tail)
+
+    def compacted(self) -> "StockStore":
+        """This store with its tail merged into contiguous columns (the store itself if it has no tail)."""
+        if self.tail is None:
+            return self
+        base = StockStore(self.columns, self.symbols, self.offsets, materialized=self.materialized)
+        return base._inserted(self.tail, self.version)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns, the materialized series and the symbol index (symbol strings excluded)."""
+        materialized = sum(values.nbytes for series in self.materialized.values() for values in series.values())
+        tail = self.tail.nbytes - self.tail.symbols.nbytes if self.tail is not None else 0
+        return sum(values.nbytes for values in self.columns.values()) + materialized + self.offsets.nbytes + self.symbols.nbytes + tail
+
+    def memory_report(self) -> dict:
+        """Per-column storage types and sizes, and the store's bytes per row."""
+        rows = max(len(self), 1)
+        tail = self.tail
+
+        def column_bytes(col):
+            return self.columns[col].nbytes + (tail.columns[col].nbytes if tail is not None else 0)
+
+        def series_bytes(key):
+            series = [self.materialized[key]] + ([tail.materialized[key]] if tail is not None else [])
+            return sum(values.nbytes for part in series for values in part.values())
+
+        return {
+            "rows": len(self),
+            "tail_rows": len(tail) if tail is not None else 0,
+            "bytes": self.nbytes,
+            "bytes_per_row": round(self.nbytes / rows, 2),
+            "columns": {
+                col: {"dtype": str(values.dtype), "bytes_per_row": round(column_bytes(col) / rows, 2)}
+                for col, values in self.columns.items()
+            },
+            "materialized": {
+                _materialized_name(key): round(series_bytes(key) / rows, 2)
+                for key in self.materialized
+            },
+        }
+
+    def append_rows(self, symbols: np.ndarray, columns: dict, materialized: dict = None) -> "StockStore":
+        """
+        Return a new store with rows appended to the end of their symbols' segments.
+
+        The new rows must be sorted by (symbol, date) and each must be dated after the
+        last existing row of its symbol; symbols the store does not know yet get new
+        segments after the existing ones. The store itself is left untouched, and the
+        new store's version is derived from this version and the appended data.
+
+        The rows go into the new store's tail, which shares this store's base arrays, so
+        an append copies the tail but not the base. Once the tail would exceed
+        APPEND_TAIL_MAX_FRACTION of the rows, or the rows bring a symbol the store does
+        not know, base and tail are merged into one contiguous store instead.
+
+        Parameters:
+            symbols (np.ndarray): Symbol of each new row
+            columns (dict): Column name -> array of the new rows, one entry per store column
+            materialized (dict): (indicator, *param values) -> {column: values of the new
+                rows} for the store's materialized series; series left out are dropped
+
+        Returns:
+            StockStore: The extended store
+        """
+        if set(columns) != set(self.columns):
+            raise ValueError(f"Appended rows must have exactly the columns {sorted(self.columns)}")
+        new_symbols, new_offsets = build_symbol_offsets(np.asarray(symbols, dtype=object))
+
+        for symbol, first in zip(new_symbols, new_offsets[:-1]):
+            last = self._last_date(symbol)
+            if last is not None and columns[DATE_COL][first] <= last:
+                raise ValueError(f"New {symbol} rows must be dated after {pd.Timestamp(last).date()}")
+
+        for col, values in self.columns.items():
+            if values.dtype.kind in "iu" and not np.isfinite(np.asarray(columns[col], dtype=np.float64)).all():
+                raise ValueError(f"New rows need a value for {col}")
+
+        digest = hashlib.sha256(str(self.version).encode())
+        digest.update(np.asarray(symbols, dtype=str).tobytes())
+        for col in sorted(columns):
+            digest.update(np.ascontiguousarray(columns[col], dtype=self.columns[col].dtype).tobytes())
+        version = digest.hexdigest()[:16]
+
+        series = {
+            key: {col: np.asarray(rows[col], dtype=self.materialized[key][col].dtype) for col in self.materialized[key]}
+            for key, rows in (materialized or {}).items()
+            if key in self.materialized
+        }
+        added = StockStore(
+            {col: np.asarray(columns[col]).astype(values.dtype) for col, values in self.columns.items()},
+            new_symbols, new_offsets, materialized=series,
+        )
+
+        tail = self.tail if self.tail is not None else self._empty_tail()
+        known = all(symbol in self.symbol_index for symbol in new_symbols)
+        if not known or len(tail) + len(added) > APPEND_TAIL_MAX_FRACTION * (len(self) + len(added)):
+            return self.compacted()._inserted(added, version)
+        return StockStore(
+            self.columns, self.symbols, self.offsets, version=version,
+            materialized={key: values for key, values in self.materialized.items() if key in series},
+            tail=tail._inserted(added, None), source=self.source,
+        )
+
+    def _last_date(self, stock_symbol):
+        """Date of the symbol's last row, or None for a symbol without rows."""
+        tail_start, tail_stop = self._tail_rows(stock_symbol)
+        if tail_stop > tail_start:
+            return self.tail.columns[DATE_COL][tail_stop - 1]
+        start, stop = self.symbol_index.get(stock_symbol, (0, 0))
+        return self.columns[DATE_COL][stop - 1] if stop > start else None
+
+    def _empty_tail(self) -> "StockStore":
+        return StockStore(
+            {col: values[:0] for col, values in self.columns.items()},
+            self.symbols, np.zeros(len(self.symbols) + 1, dtype=np.int64),
+            materialized={key: {col: arr[:0] for col, arr in series.items()} for key, series in self.materialized.items()},
+        )
+
+    def _inserted(self, added: "StockStore", version) -> "StockStore":
+        """
+        A contiguous store with the rows of `added` after the rows of their symbols in this
+        (tail-less) store; symbols it does not know get new segments at the end. Materialized
+        series missing from `added` are dropped.
+        """
+        counts = np.diff(added.offsets)
+        rows = int(self.offsets[-1]) if len(self.offsets) else 0
+        segment_ends = np.array([self.symbol_index.get(s, (rows, rows))[1] for s in added.symbols], dtype=np.int64)
+        positions = np.repeat(segment_ends, counts)
+        merged = {
+            col: np.insert(np.asarray(values), positions, added.columns[col])
+            for col, values in self.columns.items()
+        }
+        materialized = {
+            key: {col: np.insert(np.asarray(arr), positions, added.materialized[key][col]) for col, arr in series.items()}
+            for key, series in self.materialized.items()
+            if key in added.materialized
+        }
+
+        existing_counts = np.diff(self.offsets)
+        added_counts = {symbol: int(count) for symbol, count in zip(added.symbols, counts)}
+        appended_symbols = [s for s in added.symbols if s not in self.symbol_index]
+        all_symbols = np.concatenate([self.symbols, np.array(appended_symbols, dtype=object)])
+        all_counts = np.concatenate([
+            existing_counts + np.array([added_counts.get(s, 0) for s in self.symbols], dtype=np.int64),
+            np.array([added_counts[s] for s in appended_symbols], dtype=np.int64),
+        ])
+        offsets = np.concatenate(([0], np.cumsum(all_counts))).astype(np.int64)
+        return StockStore(merged, all_symbols, offsets, version=version, materialized=materialized)
+
+    def save(self, directory, metadata: dict = None):
+        """
+        Persist the store as one .npy file per column and materialized series plus a meta.json.
+
+        The snapshot is written to a new sibling directory and `directory` is then
+        switched to it (see _swap_in), so readers see the old or the new snapshot, never
+        a half-written one or none. Object (string) columns other than the symbol are not
+        persisted. The tail is saved in files of its own; base files that are unchanged
+        since the snapshot the store was loaded from (`source`) are hard-linked from it
+        instead of rewritten, so saving after an append writes about the size of the tail.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=directory.name + ".", dir=directory.parent))
+        try:
+            saved = [col for col, values in self.columns.items() if values.dtype != object]
+            materialized = [
+                {"key": list(key), "columns": list(series), "dtype": str(next(iter(series.values())).dtype)}
+                for key, series in self.materialized.items()
+            ]
+            source_meta = read_snapshot_meta(self.source) if self.source is not None else None
+            unchanged = source_meta is not None and (source_meta["columns"], source_meta.get("materialized")) == (saved, materialized)
+            source = self.source if unchanged else None
+
+            _save_arrays(tmp_dir, "", {col: self.columns[col] for col in saved}, self.materialized, source)
+            _save_array(tmp_dir / "_symbols.npy", self.symbols.astype(str), source)
+            _save_array(tmp_dir / "_offsets.npy", self.offsets, source)
+            if self.tail is not None:
+                _save_arrays(tmp_dir, "_tail", {col: self.tail.columns[col] for col in saved}, self.tail.materialized)
+                _save_array(tmp_dir / "_tail_offsets.npy", self.tail.offsets)
+            write_snapshot_meta(tmp_dir, dict(
+                metadata or {}, version=self.version, columns=saved, materialized=materialized,
+                tail=self.tail is not None,
+            ))
+
+            _swap_in(tmp_dir, directory)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.source = directory.resolve()
+
+    @classmethod
+    def load(cls, directory, mmap_mode: str = None) -> "StockStore":
+        """
+        Load a snapshot written by save(); `mmap_mode="r"` maps the columns read-only instead of reading them.
+
+        Raises:
+            FileNotFoundError: if `directory` holds no complete snapshot
+        """
+        # Read every file from the build `directory` points at now, even if a save switches it meanwhile
+        directory = Path(directory).resolve()
+        meta = read_snapshot_meta(directory)
+        if meta is None:
+            raise FileNotFoundError(f"No stock data snapshot in {directory}")
+        symbols = np.load(directory / "_symbols.npy", allow_pickle=False).astype(object)
+        tail = None
+        if meta.get("tail"):
+            tail_columns, tail_materialized = _load_arrays(directory, "_tail", meta, mmap_mode)
+            tail_offsets = np.load(directory / "_tail_offsets.npy", mmap_mode=mmap_mode, allow_pickle=False)
+            tail = cls(tail_columns, symbols, tail_offsets, materialized=tail_materialized)
+        columns, materialized = _load_arrays(directory, "", meta, mmap_mode)
+        offsets = np.load(directory / "_offsets.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        return cls(columns, symbols, offsets, version=meta["version"], materialized=materialized, tail=tail,
+                   source=directory)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Rebuild the (symbol, date)-sorted DataFrame view of the store."""
+        store = self.compacted()
+        counts = np.diff(store.offsets)
+        data = {SYMBOL_COL: np.repeat(store.symbols, counts)}
+        data.update(store.columns)
+        return pd.DataFrame(data)
+
+
+def _save_array(path: Path, values, source: Path = None):
+    """np.save `values` to `path`, or hard-link the same file name from the `source` build."""
+    if source is not None:
+        try:
+            os.link(source / path.name, path)
+            return
+        except OSError:
+            pass
+    np.save(path, values, allow_pickle=False)
+
+
+def _save_arrays(directory: Path, prefix: str, columns: dict, materialized: dict, source: Path = None):
+    for col, values in columns.items():
+        _save_array(directory / f"{prefix}{'_' if prefix else ''}{col}.npy", values, source)
+    for i, series in enumerate(materialized.values()):
+        for col, values in series.items():
+            _save_array(directory / f"{prefix}_materialized{i}_{col}.npy", values, source)
+
+
+def _load_arrays(directory: Path, prefix: str, meta: dict, mmap_mode):
+    """The (columns, materialized) arrays _save_arrays wrote under `prefix`."""
+    columns = {
+        col: np.load(directory / f"{prefix}{'_' if prefix else ''}{col}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        for col in meta["columns"]
+    }
+    materialized = {
+        tuple(entry["key"]): {
+            col: np.load(directory / f"{prefix}_materialized{i}_{col}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+            for col in entry["columns"]
+        }
+        for i, entry in enumerate(meta.get("materialized", []))
+    }
+    return columns, materialized
+
+
+def _swap_in(build: Path, directory: Path):
+    """
+    Make `directory` the complete snapshot `build`, then delete the snapshot it replaces.
+
+    `directory` is a symlink to its current build, replaced atomically by a link to the
+    new one. A real directory (a snapshot saved before, or a filesystem without symlinks)
+    is renamed aside first and removed only once the new snapshot is in place.
+    """
+    previous = None
+    if directory.is_symlink():
+        previous = directory.parent / os.readlink(directory)
+    elif directory.exists():
+        previous = directory.with_name(build.name + ".old")
+        os.replace(directory, previous)
+
+    link = build.with_name(build.name + ".link")
+    try:
+        os.symlink(build.name, link, target_is_directory=True)
+    except OSError:
+        os.replace(build, directory)
+    else:
+        os.replace(link, directory)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def _materialized_name(key) -> str:
+    indicator, *param_values = key
+    return f"{indicator}({','.join(map(str, param_values))})"
+
+
+def read_snapshot_meta(directory):
+    """Return a snapshot's meta.json contents, or None if there is no complete snapshot."""
+    try:
+        return json.loads((Path(directory) / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot_meta(directory, meta: dict):
+    """Atomically replace a snapshot's meta.json."""
+    path = Path(directory) / "meta.json"
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(meta))
+    os.replace(tmp_path, path)
+
+
+def compact_columns(columns: dict) -> dict:
+    """
+    Narrow store columns to their compact storage types.
+
+    OHLC prices become float32, daily dates datetime64[D] and a volume without gaps or
+    fractions int64. Columns that would lose information (intraday timestamps, volume
+    with missing values) and any other columns are kept as they are.
+    """
+    compacted = dict(columns)
+    for col in (OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL):
+        if col in compacted:
+            compacted[col] = np.asarray(compacted[col], dtype=COMPACT_PRICE_DTYPE)
+
+    dates = compacted.get(DATE_COL)
+    if dates is not None and np.issubdtype(dates.dtype, np.datetime64):
+        days = dates.astype("datetime64[D]")
+        if np.array_equal(days, dates):
+            compacted[DATE_COL] = days
+
+    volume = compacted.get(VOLUME_COL)
+    if volume is not None and volume.dtype.kind == "f":
+        if np.isfinite(volume).all() and np.array_equal(volume, np.round(volume)):
+            compacted[VOLUME_COL] = volume.astype(np.int64)
+    elif volume is not None and volume.dtype.kind in "iu":
+        compacted[VOLUME_COL] = volume.astype(np.int64)
+    return compacted
+
+
+def build_symbol_offsets(symbol_values: np.ndarray):
+    """
+    Compute the distinct symbols and their row offsets in a symbol-sorted array.
+
+    Returns:
+        (symbols, offsets): symbols[i] occupies rows offsets[i]:offsets[i + 1].
+    """
+    n = len(symbol_values)
+    if n == 0:
+        return np.array([], dtype=object), np.zeros(1, dtype=np.int64)
+
+    change = np.flatnonzero(symbol_values[1:] != symbol_values[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    offsets = np.append(starts, n).astype(np.int64)
+    symbols = symbol_values[starts]
+    if len(pd.unique(symbols)) != len(symbols):
+        raise ValueError("Symbol column is not contiguous; sort by symbol before indexing")
+    return symbols, offsets
+
+
+def _is_sorted_by_symbol_and_date(symbol_values, date_values):
+    if len(symbol_values) < 2:
+        return True
+    same_symbol = symbol_values[1:] == symbol_values[:-1]
+    symbol_increasing = symbol_values[1:] > symbol_values[:-1]
+    date_non_decreasing = date_values[1:] >= date_values[:-1]
+    return bool(np.all(symbol_increasing | (same_symbol & date_non_decreasing)))
@@ -1,35 +1,167 @@
+"""
+Table-driven access and rate limiting for indicator requests.
+
+TIER_POLICIES (config.py) is compiled once into TierPolicy objects, so a decision is a
+handful of dict and set lookups plus one token-bucket update:
+
+1. the indicator must be in the tier's set                         -> 403
+2. the start..end window must fit the tier's max_days               -> 403
+3. today's request count must be under the tier's daily_quota       -> 403
+4. the request's cost must fit the user's token bucket (burst
+   capacity refilled at refill_per_second)                          -> 429 + Retry-After
+
+A request's cost is its indicator weight times the number of started years in its
+window, so a heavy user is throttled by the compute they consume rather than only by
+their request count. Buckets are per process.
+
+A screen (check_screen) computes the indicator for every symbol, so it needs a tier
+with `screen` enabled and costs the indicator weight per SCREEN_COST_SYMBOLS symbols
+of the universe instead; steps 1, 3 and 4 apply as above.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+
 from fastapi import HTTPException
-from datetime import datetime, date
 
-def check_access(user, indicator: str, start_date: str, end_date: str):
-    allowed_indicators = {
-        "Free": ["SMA", "EMA"],
-        "Pro": ["SMA", "EMA", "RSI", "MACD"],
-        "Premium": ["SMA", "EMA", "RSI", "MACD", "Bollinger"]
-    }
+from app.services.metrics_service import span
+from config import TIER_POLICIES, INDICATOR_COST_WEIGHTS, COST_WINDOW_DAYS, SCREEN_COST_SYMBOLS
+
+
+@dataclass(frozen=True)
+class TierPolicy:
+    name: str
+    indicators: frozenset
+    max_days: int
+    daily_quota: int
+    burst: float
+    refill_per_second: float
+    screen: bool
+    indicator_detail: str
+    window_detail: str
+    quota_detail: str
+    screen_detail: str
+
+    @classmethod
+    def from_table(cls, name: str, table: dict) -> "TierPolicy":
+        return cls(
+            name=name,
+            indicators=frozenset(table["indicators"]),
+            max_days=table.get("max_days"),
+            daily_quota=table.get("daily_quota"),
+            burst=float(table["burst"]),
+            refill_per_second=float(table["refill_per_second"]),
+            screen=bool(table.get("screen", False)),
+            indicator_detail=f"{name} tier: indicator not allowed",
+            window_detail=f"{name} tier: max {table.get('window_label') or str(table.get('max_days')) + ' days'} allowed",
+            quota_detail=f"{name} tier: daily request limit exceeded",
+            screen_detail=f"{name} tier: screening not allowed",
+        )
+
+
+class LimiterEngine:
+    """
+    Access checks and per-user token buckets for every subscription tier.
+
+    Parameters:
+        policies (dict): Tier name -> policy table (see TIER_POLICIES)
+        cost_weights (dict): Indicator -> cost weight per COST_WINDOW_DAYS of window
+        clock (callable): Monotonic time source in seconds, injectable for tests
+    """
+
+    def __init__(self, policies: dict = TIER_POLICIES, cost_weights: dict = INDICATOR_COST_WEIGHTS,
+                 clock=time.monotonic):
+        self.policies = {name: TierPolicy.from_table(name, table) for name, table in policies.items()}
+        self.cost_weights = dict(cost_weights)
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def request_cost(self, indicator: str, days_requested: int) -> float:
+        years = max(1, -(-days_requested // COST_WINDOW_DAYS))
+        return self.cost_weights.get(indicator, 1) * years
+
+    def screen_cost(self, indicator: str, universe_size: int) -> float:
+        blocks = max(1, -(-universe_size // SCREEN_COST_SYMBOLS))
+        return self.cost_weights.get(indicator, 1) * blocks
+
+    def check(self, user, indicator: str, start_date: str, end_date: str, usage=None) -> float:
+        """
+        Raise HTTPException if `user` may not make this request now; otherwise consume
+        its cost from the user's bucket and return that cost.
+        """
+        policy = self._policy(user, indicator)
 
+        days_requested = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days
+        if policy.max_days is not None and days_requested > policy.max_days:
+            raise HTTPException(status_code=403, detail=policy.window_detail)
+
+        return self._admit(user, policy, self.request_cost(indicator, days_requested), usage)
+
+    def check_screen(self, user, indicator: str, universe_size: int, usage=None) -> float:
+        """Like check(), for screening `indicator` across a universe of `universe_size` symbols."""
+        policy = self._policy(user, indicator)
+        if not policy.screen:
+            raise HTTPException(status_code=403, detail=policy.screen_detail)
+        return self._admit(user, policy, self.screen_cost(indicator, universe_size), usage)
+
+    def _policy(self, user, indicator: str) -> TierPolicy:
+        policy = self.policies.get(user.subscription_tier)
+        if policy is None:
+            raise HTTPException(status_code=403, detail=f"Unknown subscription tier: {user.subscription_tier}")
+
+        if indicator not in policy.indicators:
+            raise HTTPException(status_code=403, detail=policy.indicator_detail)
+        return policy
+
+    def _admit(self, user, policy: TierPolicy, cost: float, usage) -> float:
+        if policy.daily_quota is not None and requests_today(user, usage) >= policy.daily_quota:
+            raise HTTPException(status_code=403, detail=policy.quota_detail)
+
+        wait = self._consume(user.username, policy, cost)
+        if wait > 0:
+            raise HTTPException(
+                status_code=429,
+                detail=f"{policy.name} tier: rate limit exceeded, retry in {wait:.1f}s",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        return cost
+
+    def _consume(self, username: str, policy: TierPolicy, cost: float) -> float:
+        """Take `cost` tokens from the user's bucket; returns 0, or the seconds until they are available."""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(username, (policy.burst, now))
+            tokens = min(policy.burst, tokens + (now - updated) * policy.refill_per_second)
+            # A request costing more than the whole bucket is admitted once the bucket is full
+            needed = min(cost, policy.burst)
+            if tokens < needed:
+                self._buckets[username] = (tokens, now)
+                return (needed - tokens) / policy.refill_per_second
+            self._buckets[username] = (tokens - cost, now)
+            return 0.0
+
+
+def requests_today(user, usage=None) -> int:
+    """Today's request count from the usage counters when given, else from the user row."""
+    if usage is not None:
+        return usage.get(user.username)
     if user.last_request_date != date.today():
         user.requests_today = 0
         user.last_request_date = date.today()
+    return user.requests_today
+
+
+limiter = LimiterEngine()
+
+
+def check_access(user, indicator: str, start_date: str, end_date: str, usage=None):
+    with span("check_access"):
+        return limiter.check(user, indicator, start_date, end_date, usage)
+
 
-    days_requested = (datetime.strptime(end_date, "%Y-%m-%d") - datetime.strptime(start_date, "%Y-%m-%d")).days
-
-    if user.subscription_tier == "Free":
-        if indicator not in allowed_indicators["Free"]:
-            raise HTTPException(status_code=403, detail="Free tier: indicator not allowed")
-        if days_requested > 90:
-            raise HTTPException(status_code=403, detail="Free tier: max 90 days allowed")
-        if user.requests_today >= 50:
-            raise HTTPException(status_code=403, detail="Free tier: daily request limit exceeded")
-
-    elif user.subscription_tier == "Pro":
-        if indicator not in allowed_indicators["Pro"]:
-            raise HTTPException(status_code=403, detail="Pro tier: indicator not allowed")
-        if days_requested > 365:
-            raise HTTPException(status_code=403, detail="Pro tier: max 1 year of data allowed")
-        if user.requests_today >= 500:
-            raise HTTPException(status_code=403, detail="Pro tier: daily request limit exceeded")
-
-    elif user.subscription_tier == "Premium":
-        if indicator not in allowed_indicators["Premium"]:
-            raise HTTPException(status_code=403, detail="Premium tier: indicator not allowed")
+def check_screen_access(user, indicator: str, universe_size: int, usage=None):
+    with span("check_access"):
+        return limiter.check_screen(user, indicator, universe_size, usage)
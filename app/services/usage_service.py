@@ -0,0 +1,406 @@
+# services/usage_service.py
+"""
+Per-user daily request accounting.
+
+Counters live in memory and are read by check_access and bumped after each served
+request, so a request never waits on a database write and concurrent requests from
+one user cannot lose increments. A background UsageFlusher periodically drains the
+counters that changed and writes them to the users table in one batched UPDATE.
+
+Two counter backends share one interface:
+
+- InProcessUsageCounter: a dict behind a lock, for a single worker process
+- SharedMemoryUsageCounter: a fixed-size hash table in a memory-mapped file (by
+  default under /dev/shm), guarded by an fcntl lock, shared by every worker on a host
+
+Counters are seeded from the users row the first time a user is seen, so a restart
+resumes from the last flushed value. Each counter also remembers how much of its count
+the database already holds, and flushes add only the difference (requests_today =
+requests_today + delta). Several workers with their own counters therefore never
+overwrite each other's counts, and every flush reads the resulting totals back into
+the counter, so each worker's quota check sees the others' requests within one flush
+interval. A failed write gives its deltas back to the counters for the next flush.
+"""
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from datetime import date
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import numpy as np
+
+from config import (
+    USAGE_COUNTER_BACKEND, USAGE_COUNTER_SHM_PATH, USAGE_COUNTER_SLOTS, USAGE_FLUSH_INTERVAL_SECONDS,
+)
+
+
+class InProcessUsageCounter:
+    """Thread-safe per-user (day, count) counters for a single process."""
+
+    def __init__(self):
+        self._counts = {}
+        self._flushed = {}  # username -> part of today's count the database already holds
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def seed(self, username: str, day: date, count: int):
+        """Adopt a persisted (day, count) unless the counter already tracks the same or a later day."""
+        if day is None:
+            return
+        with self._lock:
+            current = self._counts.get(username)
+            if current is None or current[0] < day:
+                self._counts[username] = (day, count or 0)
+                self._flushed[username] = count or 0
+
+    def get(self, username: str, day: date = None) -> int:
+        day = day or date.today()
+        with self._lock:
+            current = self._counts.get(username)
+            return current[1] if current is not None and current[0] == day else 0
+
+    def increment(self, username: str, amount: int = 1, day: date = None) -> int:
+        """Atomically add `amount` to today's count (restarting it on a new day) and return the total."""
+        day = day or date.today()
+        with self._lock:
+            current = self._counts.get(username)
+            if current is None or current[0] != day:
+                current = (day, 0)
+                self._flushed[username] = 0
+            count = current[1] + amount
+            self._counts[username] = (day, count)
+            self._dirty.add(username)
+            return count
+
+    def drain_dirty(self) -> dict:
+        """Return {username: (day, delta)}: what each counter changed since it was last drained."""
+        with self._lock:
+            dirty = {}
+            for username in self._dirty:
+                day, count = self._counts[username]
+                dirty[username] = (day, count - self._flushed[username])
+                self._flushed[username] = count
+            self._dirty.clear()
+            return dirty
+
+    def requeue(self, usage: dict):
+        """Give back deltas whose flush failed (those of a past day are dropped)."""
+        with self._lock:
+            for username, (day, delta) in usage.items():
+                if self._counts.get(username, (None,))[0] == day:
+                    self._flushed[username] -= delta
+                    self._dirty.add(username)
+
+    def sync(self, totals: dict):
+        """Adopt the {username: (day, count)} totals the database holds after a flush."""
+        with self._lock:
+            for username, (day, total) in totals.items():
+                current = self._counts.get(username)
+                if current is None or day is None or current[0] > day:
+                    continue
+                unflushed = current[1] - self._flushed[username] if current[0] == day else 0
+                self._counts[username] = (day, total + unflushed)
+                self._flushed[username] = total
+
+
+class SharedMemoryUsageCounter:
+    """
+    Per-user (day, count) counters in a memory-mapped file shared across processes.
+
+    The file holds `slots` fixed-size records in an open-addressing hash table keyed by
+    username (at most USERNAME_BYTES of UTF-8). Every operation holds an exclusive fcntl
+    lock on the file, plus a thread lock since fcntl locks do not exclude threads of one
+    process. Days are stored as ordinals; `flushed` is the part of the count the database
+    already holds.
+    """
+
+    USERNAME_BYTES = 128
+    SLOT_DTYPE = np.dtype([
+        ("username", f"S{USERNAME_BYTES}"),
+        ("day", "<i8"),
+        ("count", "<i8"),
+        ("flushed", "<i8"),
+        ("dirty", "u1"),
+    ])
+
+    def __init__(self, path=None, slots: int = USAGE_COUNTER_SLOTS):
+        if fcntl is None:
+            raise RuntimeError("The shared-memory usage counter requires fcntl (POSIX)")
+        self.path = Path(path or default_shm_path())
+        self.slots = slots
+        self._lock = threading.Lock()
+
+        size = slots * self.SLOT_DTYPE.itemsize
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            existing = os.fstat(self._fd).st_size
+            if existing == 0:
+                os.ftruncate(self._fd, size)
+            elif existing != size:
+                raise ValueError(f"{self.path} holds {existing} bytes, expected {size} for {slots} slots")
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mmap = mmap.mmap(self._fd, size)
+        self._table = np.ndarray((slots,), dtype=self.SLOT_DTYPE, buffer=self._mmap)
+
+    def close(self):
+        self._table = None
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _locked(self):
+        return _FileLock(self._lock, self._fd)
+
+    def _find(self, key: bytes, create: bool):
+        """Slot index of `key`, claiming an empty slot if `create`; None if absent."""
+        start = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") % self.slots
+        usernames = self._table["username"]
+        for probe in range(self.slots):
+            i = (start + probe) % self.slots
+            if usernames[i] == key:
+                return i
+            if usernames[i] == b"":
+                if not create:
+                    return None
+                self._table[i] = (key, 0, 0, 0, 0)
+                return i
+        if create:
+            raise RuntimeError(f"Usage counter table {self.path} is full ({self.slots} slots)")
+        return None
+
+    def _key(self, username: str) -> bytes:
+        key = username.encode()
+        if not key or len(key) > self.USERNAME_BYTES or b"\0" in key:
+            raise ValueError(f"Username cannot be tracked in the shared usage counter: {username!r}")
+        return key
+
+    def seed(self, username: str, day: date, count: int):
+        if day is None:
+            return
+        key = self._key(username)
+        with self._locked():
+            i = self._find(key, create=True)
+            if self._table["day"][i] < day.toordinal():
+                self._table["day"][i] = day.toordinal()
+                self._table["count"][i] = count or 0
+                self._table["flushed"][i] = count or 0
+
+    def get(self, username: str, day: date = None) -> int:
+        day = day or date.today()
+        key = self._key(username)
+        with self._locked():
+            i = self._find(key, create=False)
+            if i is None or self._table["day"][i] != day.toordinal():
+                return 0
+            return int(self._table["count"][i])
+
+    def increment(self, username: str, amount: int = 1, day: date = None) -> int:
+        day = day or date.today()
+        key = self._key(username)
+        with self._locked():
+            i = self._find(key, create=True)
+            slot = self._table[i:i + 1]
+            if slot["day"][0] != day.toordinal():
+                slot["day"] = day.toordinal()
+                slot["count"] = 0
+                slot["flushed"] = 0
+            slot["count"] += amount
+            slot["dirty"] = 1
+            return int(slot["count"][0])
+
+    def drain_dirty(self) -> dict:
+        with self._locked():
+            rows = np.flatnonzero(self._table["dirty"])
+            table = self._table
+            dirty = {
+                username.decode(): (date.fromordinal(int(day)), int(delta))
+                for username, day, delta in zip(
+                    table["username"][rows], table["day"][rows], table["count"][rows] - table["flushed"][rows]
+                )
+            }
+            table["flushed"][rows] = table["count"][rows]
+            table["dirty"][rows] = 0
+            return dirty
+
+    def requeue(self, usage: dict):
+        with self._locked():
+            for username, (day, delta) in usage.items():
+                i = self._find(self._key(username), create=False)
+                if i is not None and self._table["day"][i] == day.toordinal():
+                    self._table["flushed"][i] -= delta
+                    self._table["dirty"][i] = 1
+
+    def sync(self, totals: dict):
+        with self._locked():
+            for username, (day, total) in totals.items():
+                i = self._find(self._key(username), create=False)
+                if i is None or day is None or self._table["day"][i] > day.toordinal():
+                    continue
+                slot = self._table[i:i + 1]
+                unflushed = int(slot["count"][0] - slot["flushed"][0]) if slot["day"][0] == day.toordinal() else 0
+                slot["day"] = day.toordinal()
+                slot["count"] = total + unflushed
+                slot["flushed"] = total
+
+
+class _FileLock:
+    """Hold a thread lock and an exclusive fcntl lock on `fd` together."""
+
+    def __init__(self, thread_lock, fd):
+        self.thread_lock = thread_lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+def default_shm_path() -> Path:
+    base = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+    return base / "quant_usage_counters"
+
+
+def create_usage_counter(backend: str = USAGE_COUNTER_BACKEND):
+    """Build the configured counter: "memory" (one worker) or "shm" (all workers on a host)."""
+    if backend == "memory":
+        return InProcessUsageCounter()
+    if backend == "shm":
+        return SharedMemoryUsageCounter(USAGE_COUNTER_SHM_PATH)
+    raise ValueError(f"Unknown usage counter backend: {backend}")
+
+
+class SqlUsageSink:
+    """
+    Adds drained deltas to the users table with one executemany UPDATE per flush and
+    reads the resulting totals back.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def write(self, usage: dict) -> dict:
+        """
+        Add {username: (day, delta)} to requests_today (restarting it on a new day).
+
+        Returns:
+            dict: {username: (day, requests_today)} after the update
+        """
+        from sqlalchemy import bindparam, case, or_, select, update
+        from app.db.models import User
+
+        users = User.__table__
+        statement = (
+            update(users)
+            # A delta of a day the row has already moved past is dropped
+            .where(users.c.username == bindparam("b_username"))
+            .where(or_(users.c.last_request_date.is_(None), users.c.last_request_date <= bindparam("b_day")))
+            .values(
+                requests_today=case(
+                    (users.c.last_request_date == bindparam("b_day"), users.c.requests_today + bindparam("b_delta")),
+                    else_=bindparam("b_delta"),
+                ),
+                last_request_date=bindparam("b_day"),
+            )
+        )
+        rows = [
+            {"b_username": username, "b_day": day, "b_delta": delta}
+            for username, (day, delta) in usage.items()
+        ]
+        session = self.session_factory()
+        try:
+            connection = session.connection()
+            connection.execute(statement, rows)
+            totals = connection.execute(
+                select(users.c.username, users.c.last_request_date, users.c.requests_today)
+                .where(users.c.username.in_(list(usage)))
+            )
+            session.commit()
+            return {username: (day, count) for username, day, count in totals}
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+class InMemoryUsageSink:
+    """Local stand-in for SqlUsageSink: keeps a (day, count) row per user."""
+
+    def __init__(self):
+        self.rows = {}
+        self.batches = 0
+
+    def write(self, usage: dict) -> dict:
+        for username, (day, delta) in usage.items():
+            current = self.rows.get(username)
+            if current is None or current[0] < day:
+                self.rows[username] = (day, delta)
+            elif current[0] == day:
+                self.rows[username] = (day, current[1] + delta)
+        self.batches += 1
+        return {username: self.rows[username] for username in usage}
+
+
+class UsageFlusher:
+    """
+    Write-behind of usage counters: drains the changed counters every `interval`
+    seconds on a daemon thread and hands them to `sink` as one batch.
+
+    The totals the sink returns are synced back into the counter. A failed write
+    re-queues its deltas so the next flush retries them; stop() performs a final flush so
+    counts are persisted on shutdown.
+    """
+
+    def __init__(self, counter, sink, interval: float = USAGE_FLUSH_INTERVAL_SECONDS):
+        self.counter = counter
+        self.sink = sink
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def flush(self) -> int:
+        """Write all pending counters now; returns how many users were written."""
+        usage = self.counter.drain_dirty()
+        if not usage:
+            return 0
+        try:
+            totals = self.sink.write(usage)
+        except Exception:
+            self.counter.requeue(usage)
+            raise
+        self.counter.sync(totals)
+        return len(usage)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._flush_and_report()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._flush_and_report()
+
+    def _flush_and_report(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Usage flush failed, will retry: {e}")
@@ -0,0 +1,34 @@
+"""
+Shared test data: random-walk OHLCV histories from app/benchmarks/synthetic.py.
+
+Each fixture is a factory, so a test picks its own symbols, history length and seed.
+"""
+import pytest
+
+from app.benchmarks.synthetic import synthetic_ohlc
+from app.services.stock_store import StockStore
+
+
+@pytest.fixture
+def make_frame():
+    """Cleaned frame: one row per symbol and business day, sorted by (symbol, date), no missing prices."""
+    def make(symbols=("AAA", "BBB"), days=300, seed=0, start="2022-01-03"):
+        return synthetic_ohlc(symbols, days, seed=seed, start=start, missing_fraction=0, shuffle=False)
+    return make
+
+
+@pytest.fixture
+def make_store(make_frame):
+    """StockStore over make_frame's data."""
+    def make(symbols=("AAA", "BBB"), days=300, seed=0, start="2022-01-03", version="v1", compact=False):
+        return StockStore.from_frame(make_frame(symbols, days, seed, start), version=version, compact=compact)
+    return make
+
+
+@pytest.fixture
+def write_source():
+    """Writes a raw source parquet (shuffled rows, a few missing prices) to `path` and returns it."""
+    def write(path, symbols=("AAA", "BBB"), days=50, seed=0, start="2022-01-03"):
+        synthetic_ohlc(symbols, days, seed=seed, start=start, missing_fraction=0.01).to_parquet(path)
+        return path
+    return write
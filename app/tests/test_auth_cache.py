@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.models import Base, User
+from app.services.auth_cache import TTLCache, token_cache, user_cache
+from app.services.auth_service import ALGORITHM, SECRET_KEY, create_access_token, get_current_user
+from app.services.usage_service import InProcessUsageCounter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_and_bound():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, max_entries=2, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2, expires_at=clock.now + 3)
+    assert cache.get("a") == 1 and cache.get("b") == 2
+
+    clock.now += 5
+    assert cache.get("b") is None
+    cache.put("c", 3)
+    cache.put("d", 4)
+    assert cache.get("a") is None  # least recently used entry evicted
+    clock.now += 10
+    assert cache.get("c") is None
+
+
+class NoQuerySession:
+    def query(self, *args):
+        raise AssertionError("unexpected database query")
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(User(username="alice", hashed_password="x", subscription_tier="Free", requests_today=3))
+        session.commit()
+    token_cache.clear()
+    user_cache.clear()
+    yield Session
+    token_cache.clear()
+    user_cache.clear()
+
+
+def make_request():
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(usage_counter=InProcessUsageCounter())))
+
+
+def test_cached_authentication_skips_database(session_factory):
+    request = make_request()
+    token = create_access_token({"sub": "alice"})
+    with session_factory() as db:
+        user = asyncio.run(get_current_user(request, token, db))
+    assert user.subscription_tier == "Free" and user.hashed_password is None
+
+    cached = asyncio.run(get_current_user(request, token, NoQuerySession()))
+    assert cached.username == "alice"
+
+
+def test_tier_change_invalidates_user_cache(session_factory):
+    request = make_request()
+    token = create_access_token({"sub": "alice"})
+    with session_factory() as db:
+        asyncio.run(get_current_user(request, token, db))
+        db.query(User).filter(User.username == "alice").first().subscription_tier = "Pro"
+        db.commit()
+        assert asyncio.run(get_current_user(request, token, db)).subscription_tier == "Pro"
+
+
+def test_cached_claims_never_outlive_token(session_factory):
+    expired = jwt.encode({"sub": "alice", "exp": datetime.utcnow() - timedelta(seconds=1)}, SECRET_KEY, algorithm=ALGORITHM)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_current_user(make_request(), expired, NoQuerySession()))
+    assert exc.value.status_code == 403
+    assert len(token_cache) == 0
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.batch_indicators_service import compute_all_symbols, materialize_defaults, screen_indicator
+from app.services.indicator_cache import IndicatorCache
+from app.services.indicators_service import (
+    calculate_simple_moving_average,
+    calculate_exponential_moving_average,
+    calculate_rsi,
+    calculate_macd,
+    calculate_bollinger_bands,
+)
+from app.services.stock_store import StockStore
+from config import SYMBOL_COL, DATE_COL, CLOSE_COL, RSI_COL
+
+
+@pytest.fixture
+def store(make_frame):
+    frame = make_frame(("AAA", "BBB", "CCC", "DDD"), days=200, seed=11)
+    segments = []
+    # Uneven histories and very different price scales per symbol
+    for i, (symbol, scale) in enumerate([("AAA", 1.0), ("BBB", 1e5), ("CCC", 0.01), ("DDD", 50.0)]):
+        segment = frame[frame[SYMBOL_COL] == symbol].iloc[:200 - 30 * i].copy()
+        segment[CLOSE_COL] *= scale
+        segments.append(segment)
+    return StockStore.from_frame(pd.concat(segments, ignore_index=True), version="v1")
+
+
+PER_SYMBOL = {
+    "SMA": ({"period": 20}, lambda s, sym: calculate_simple_moving_average(s, sym, 20, None, None)),
+    "EMA": ({"period": 20}, lambda s, sym: calculate_exponential_moving_average(s, sym, 20, None, None)),
+    "RSI": ({"period": 14}, lambda s, sym: calculate_rsi(s, sym, 14, None, None)),
+    "MACD": ({}, lambda s, sym: calculate_macd(s, sym)),
+    "Bollinger": ({"period": 20, "num_std_dev": 2}, lambda s, sym: calculate_bollinger_bands(s, sym)),
+}
+
+
+def test_batch_matches_per_symbol_calculators(store):
+    for indicator, (params, per_symbol) in PER_SYMBOL.items():
+        values = compute_all_symbols(store, indicator, params)
+        for symbol, (start, stop) in store.symbol_index.items():
+            expected = per_symbol(store, symbol)
+            for col, arr in values.items():
+                np.testing.assert_allclose(
+                    arr[start:stop], expected[col].to_numpy(dtype=float),
+                    rtol=1e-9, atol=1e-12 * np.abs(store.columns[CLOSE_COL][start:stop]).max(),
+                    err_msg=f"{indicator}/{col}/{symbol}",
+                )
+
+
+def test_screen_returns_cross_section_for_date(store):
+    cache = IndicatorCache()
+    date = "2022-05-02"
+
+    result = screen_indicator(store, "RSI", {"period": 14}, date, cache=cache)
+
+    assert list(result[SYMBOL_COL]) == ["AAA", "BBB", "CCC", "DDD"]
+    assert set(result[DATE_COL]) == {date}
+    expected = calculate_rsi(store, "CCC", 14, date, date)[RSI_COL].iloc[0]
+    assert result[RSI_COL].iloc[2] == expected
+
+    screen_indicator(store, "RSI", {"period": 14}, "2022-05-03", cache=cache)
+    assert cache.stats()["hits"] == 1
+
+
+def test_screen_skips_symbols_without_a_bar_on_date(store):
+    result = screen_indicator(store, "SMA", {"period": 20}, "2022-08-15")
+    assert list(result[SYMBOL_COL]) == ["AAA", "BBB"]
+
+
+def test_default_parameter_screen_reads_the_materialized_series(store):
+    store.materialized = materialize_defaults(store, ["RSI"])
+    cache = IndicatorCache()
+
+    assert compute_all_symbols(store, "RSI", {"period": 14}, cache=cache) is store.materialized[("RSI", 14)]
+    assert compute_all_symbols(store, "RSI", {}, cache=cache) is store.materialized[("RSI", 14)]
+    assert len(cache) == 0
+    result = screen_indicator(store, "RSI", {"period": 14}, "2022-05-02")
+    assert result[RSI_COL].iloc[2] == calculate_rsi(store, "CCC", 14, "2022-05-02", "2022-05-02")[RSI_COL].iloc[0]
+
+
+def test_screen_endpoint_rejects_a_non_positive_period(store):
+    from types import SimpleNamespace
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.v1.endpoints import indicators
+    from app.services.auth_service import get_current_user
+    from app.services.compute_pool import ComputePool
+    from app.services.usage_service import InProcessUsageCounter
+
+    app = FastAPI()
+    app.include_router(indicators.router)
+    app.state.compute_pool = ComputePool(store, mode="thread", workers=1)
+    app.state.usage_counter = InProcessUsageCounter()
+    user = SimpleNamespace(username="screen-period", subscription_tier="Premium", requests_today=0,
+                           last_request_date=None)
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+
+    assert client.get("/indicators/screen", params={"indicator": "SMA", "date": "2022-05-02", "period": 0}).status_code == 422
+    default = client.get("/indicators/screen", params={"indicator": "SMA", "date": "2022-05-02"}).json()
+    explicit = client.get("/indicators/screen", params={"indicator": "SMA", "date": "2022-05-02", "period": 20}).json()
+    assert default == explicit
+    app.state.compute_pool.shutdown()
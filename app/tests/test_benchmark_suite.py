@@ -0,0 +1,36 @@
+import pytest
+
+from app.benchmarks.suite import measure, compare
+from app.benchmarks.synthetic import synthetic_ohlc
+from app.utils import clean_stock_data
+
+
+def _report(p50, peak, symbols=10):
+    return {"dataset": {"symbols": symbols, "days": 100}, "results": {"calc/sma_long": {"p50_ms": p50, "peak_mb": peak}}}
+
+
+def test_synthetic_ohlc_is_reproducible_and_cleanable():
+    first, second = synthetic_ohlc(5, 30, seed=1), synthetic_ohlc(5, 30, seed=1)
+    assert first.equals(second)
+    cleaned = clean_stock_data(first)
+    assert len(cleaned) == 150
+    assert cleaned["close"].notna().all()
+
+
+def test_measure_reports_latency_and_memory():
+    result = measure(lambda: bytearray(1 << 20), repeat=5, warmup=1)
+    assert result["p99_ms"] >= result["p50_ms"] > 0
+    assert result["throughput"] > 0
+    assert result["peak_mb"] >= 1
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = _report(10.0, 5.0)
+    assert compare(_report(12.0, 5.5), baseline, tolerance=0.25) == []
+    assert compare(_report(13.0, 7.0), baseline, tolerance=0.25) == [
+        ("calc/sma_long", "p50_ms", 10.0, 13.0), ("calc/sma_long", "peak_mb", 5.0, 7.0),
+    ]
+    # Tiny absolute changes are noise, however large relative to the baseline
+    assert compare(_report(0.2, 0.1), _report(0.1, 0.01), tolerance=0.25) == []
+    with pytest.raises(ValueError):
+        compare(_report(10.0, 5.0, symbols=20), baseline)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.services import compute_pool
+from app.services.compute_pool import ComputePool
+from app.services.indicator_cache import IndicatorCache
+from app.services.indicators_service import compute_indicator_window
+from app.services.loader import snapshot_lock
+from config import RSI_COL
+
+WINDOW = ("AAA", "RSI", {"period": 14}, "2022-01-01", "2022-06-30")
+
+
+def test_thread_mode_matches_direct_computation(make_store):
+    store = make_store(days=600, seed=5, start="2021-01-04")
+    pool = ComputePool(store, IndicatorCache(), mode="thread", workers=2)
+    dates, values = asyncio.run(pool.run("window", *WINDOW))
+    expected_dates, expected_values = compute_indicator_window(store, *WINDOW)
+    np.testing.assert_array_equal(dates, expected_dates)
+    np.testing.assert_allclose(values[RSI_COL], expected_values[RSI_COL])
+    assert pool.stats()["pending_weight"] == 0
+    pool.shutdown()
+
+
+@pytest.fixture
+def blocking_task(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(compute_pool.TASKS, "block", lambda store, cache=None: release.wait(5))
+    yield release
+    release.set()
+
+
+def test_admission_control_rejects_when_saturated(blocking_task, make_store):
+    pool = ComputePool(make_store(), mode="thread", workers=2, max_pending_weight=4)
+
+    async def main():
+        running = asyncio.ensure_future(pool.run("block", weight=3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc:
+            await pool.run("block", weight=2)
+        assert exc.value.status_code == 503
+        assert await pool.run("window", *WINDOW, weight=1)  # still fits
+        blocking_task.set()
+        await running
+
+    asyncio.run(main())
+    assert pool.stats()["rejected"] == 1
+    pool.shutdown()
+
+
+def test_timeout_answers_504_and_keeps_weight_until_work_ends(blocking_task, make_store):
+    pool = ComputePool(make_store(), mode="thread", workers=1, timeout=0.05)
+
+    async def main():
+        with pytest.raises(HTTPException) as exc:
+            await pool.run("block", weight=5)
+        assert exc.value.status_code == 504
+        assert pool.stats()["pending_weight"] == 5
+        blocking_task.set()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert pool.stats() == dict(pool.stats(), pending_weight=0, timed_out=1)
+    pool.shutdown()
+
+
+def test_process_mode_maps_snapshot(tmp_path, make_store):
+    store = make_store(days=600, seed=5, start="2021-01-04")
+    store.save(tmp_path / "snapshot")
+    pool = ComputePool(store, mode="process", workers=1, snapshot_dir=tmp_path / "snapshot", timeout=60)
+
+    async def main():
+        return await asyncio.gather(pool.run("window", *WINDOW), pool.run("screen", "SMA", {"period": 20}, "2022-03-01"))
+
+    (dates, values), (symbols, _, screen_values) = asyncio.run(main())
+    expected_dates, expected_values = compute_indicator_window(store, *WINDOW)
+    np.testing.assert_array_equal(dates, expected_dates)
+    np.testing.assert_allclose(values[RSI_COL], expected_values[RSI_COL])
+    assert list(symbols) == ["AAA", "BBB"]
+
+    # Workers refuse to compute against a dataset version they cannot map
+    store.version = "v2"
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.run("window", *WINDOW))
+    pool._executor.shutdown(wait=True)
+
+
+def test_workers_open_the_snapshot_under_its_lock(tmp_path, make_store):
+    snapshot = tmp_path / "snapshot"
+    with pytest.raises(FileNotFoundError, match="No stock data snapshot"):
+        compute_pool._open_store(snapshot)
+    make_store(version="v1").save(snapshot)
+
+    opened = []
+    with snapshot_lock(snapshot):
+        opener = threading.Thread(target=lambda: opened.append(compute_pool._open_store(snapshot)))
+        opener.start()
+        opener.join(0.2)
+        # Blocked while an append or reload holds the lock
+        assert not opened
+    opener.join(5)
+    assert opened[0].version == "v1"
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.data_related_utils import clean_stock_data, segmented_fill, validate_stock_data
+
+
+def _raw_frame():
+    nan = np.nan
+    return pd.DataFrame({
+        "Symbol": ["BBB", "AAA", "AAA", "BBB", "AAA", "BBB", "AAA", None],
+        "Date": ["2022-01-04", "2022-01-05", "2022-01-03", "2022-01-03", "2022-01-04", "2022-01-05", "2022-01-06", "2022-01-03"],
+        "Open": [2.0, nan, 1.0, nan, nan, 3.0, 4.0, 9.0],
+        "High": [2.0, 1.5, 1.0, 2.0, 1.2, 3.0, 4.0, 9.0],
+        "Low": [2.0, 1.5, 1.0, 2.0, 1.2, 3.0, 4.0, 9.0],
+        "Close": [nan, nan, nan, 2.0, 1.2, nan, 4.0, 9.0],
+        "Volume": [10, 20, 30, 40, 50, 60, 70, 80],
+    }, index=[7, 3, 5, 1, 0, 6, 2, 4])
+
+
+def test_fill_stays_within_symbol_on_unsorted_input():
+    df = clean_stock_data(_raw_frame())
+
+    assert list(df["symbol"]) == ["AAA"] * 4 + ["BBB"] * 3
+    # AAA close: leading gap is back-filled, inner gap forward-filled
+    assert list(df["close"]) == [1.2, 1.2, 1.2, 4.0, 2.0, 2.0, 2.0]
+    assert list(df["open"]) == [1.0, 1.0, 1.0, 4.0, 2.0, 2.0, 3.0]
+    # Volume travels with its row through the sort
+    assert list(df["volume"]) == [30, 50, 20, 70, 40, 10, 60]
+
+
+def test_segmented_fill_matches_groupby_ffill_bfill():
+    rng = np.random.default_rng(4)
+    values = rng.standard_normal((400, 3))
+    values[rng.random((400, 3)) < 0.3] = np.nan
+    values[:25, 0] = np.nan
+    values[100:200, 1] = np.nan
+    symbols = np.repeat(np.array(["A", "B", "C", "D"], dtype=object), 100)
+
+    frame = pd.DataFrame(values)
+    frame["symbol"] = symbols
+    expected = frame.groupby("symbol")[[0, 1, 2]].apply(lambda g: g.ffill().bfill()).to_numpy()
+
+    np.testing.assert_array_equal(segmented_fill(values, symbols), expected)
+
+
+def test_validate_reports_gap_statistics():
+    df = _raw_frame()
+    df.columns = [col.lower() for col in df.columns]
+
+    stats = validate_stock_data(df)
+
+    assert stats["rows"] == 8
+    assert stats["missing"] == {"open": 3, "high": 0, "low": 0, "close": 4}
+    assert stats["missing_symbol_or_date"] == 1
+    assert stats["gap_runs"] == 3
+    assert stats["longest_gap"] == 2
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import async_url, engine_options
+from app.db.models import Base, User
+from app.services.auth_service import commit, find_user
+
+
+def test_engine_options():
+    options = engine_options("postgresql://user:pw@localhost/userdb")
+    assert set(options) == {"pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping"}
+    assert engine_options("sqlite://")["poolclass"] is StaticPool
+    assert "poolclass" not in engine_options("sqlite:///./users.db")
+
+
+def test_async_url():
+    assert async_url("postgresql://user:pw@localhost/userdb") == "postgresql+asyncpg://user:pw@localhost/userdb"
+    assert async_url("postgresql+psycopg2://user:pw@localhost/userdb") == "postgresql+asyncpg://user:pw@localhost/userdb"
+    assert async_url("sqlite:///./users.db") == "sqlite+aiosqlite:///./users.db"
+    with pytest.raises(ValueError):
+        async_url("mysql://user@localhost/db")
+
+
+def test_find_user_and_commit_with_sync_session():
+    engine = create_engine("sqlite://", **engine_options("sqlite://"))
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(username="alice", subscription_tier="Free"))
+        asyncio.run(commit(db))
+        assert asyncio.run(find_user(db, "alice")).subscription_tier == "Free"
+        assert asyncio.run(find_user(db, "bob")) is None
+
+
+def test_find_user_and_commit_with_async_session():
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://", **engine_options("sqlite+aiosqlite://"))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            db.add(User(username="alice", subscription_tier="Pro"))
+            await commit(db)
+            found = await find_user(db, "alice")
+        await engine.dispose()
+        return found
+
+    assert asyncio.run(main()).subscription_tier == "Pro"
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services import compute_pool
+from app.services.compute_pool import ComputePool
+from app.services.dataset_service import DatasetManager, DatasetWatcher, SnapshotFollower
+from app.services.incremental_service import IncrementalIngestor
+from app.services.indicator_cache import IndicatorCache
+from app.services.loader import load_stock_store
+from app.services.stock_store import StockStore
+from config import DATE_COL, CLOSE_COL
+
+
+def _state(store, snapshot_dir=None):
+    cache = IndicatorCache()
+    cache.invalidate(store.version)
+    return SimpleNamespace(
+        stock_data=store,
+        indicator_cache=cache,
+        compute_pool=ComputePool(store, cache, mode="thread", workers=2, snapshot_dir=snapshot_dir),
+        ingestor=IncrementalIngestor(),
+    )
+
+
+@pytest.fixture
+def store(make_store):
+    """One symbol, 60 days: version v1, or the version given."""
+    return lambda version="v1", days=60: make_store(("AAA",), days=days, version=version)
+
+
+@pytest.fixture
+def bars(make_frame):
+    """One new bar for AAA on `day`."""
+    return lambda day: make_frame(("AAA",), days=1, start=day)
+
+
+@pytest.fixture
+def blocking_task(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(compute_pool.TASKS, "block", lambda store, cache=None: (release.wait(5), store.version)[1])
+    yield release
+    release.set()
+
+
+def test_reload_swaps_store_and_invalidates_cache(store):
+    state = _state(store())
+    state.indicator_cache.put("v1", ("SMA", "AAA", 20), {"sma": np.zeros(3)})
+    new_store = store("v2", days=70)
+    manager = DatasetManager(state, load=lambda: new_store)
+
+    result = manager.reload()
+    assert result["reloaded"] and result["previous_version"] == "v1" and result["version"] == "v2"
+    assert result["rows"] == 70 and result["drained"]
+    assert state.stock_data is new_store and state.compute_pool.store is new_store
+    assert state.indicator_cache.stats()["version"] == "v2" and len(state.indicator_cache) == 0
+
+    # Same version again: nothing to swap
+    assert manager.reload()["reloaded"] is False
+    assert manager.reloads == 1
+    state.compute_pool.shutdown()
+
+
+def test_failed_reload_keeps_serving_the_old_store(store):
+    old_store = store()
+    state = _state(old_store)
+
+    def broken_load():
+        raise ValueError("corrupt parquet")
+
+    manager = DatasetManager(state, load=broken_load)
+    with pytest.raises(ValueError):
+        manager.reload()
+    assert state.stock_data is old_store and state.compute_pool.store is old_store
+    assert manager.status()["last_error"] == "corrupt parquet"
+    state.compute_pool.shutdown()
+
+
+def test_reload_drains_requests_on_the_old_version(blocking_task, store):
+    state = _state(store())
+    manager = DatasetManager(state, load=lambda: store("v2"))
+    pool = state.compute_pool
+
+    async def main():
+        old_request = asyncio.ensure_future(pool.run("block"))
+        await asyncio.sleep(0.05)
+        reload = asyncio.get_running_loop().run_in_executor(None, manager.reload)
+        await asyncio.sleep(0.1)
+        # Swapped, but still draining the request that started on v1
+        assert state.stock_data.version == "v2" and not reload.done()
+        assert pool.stats()["inflight_by_version"] == {"v1": 1}
+        blocking_task.set()
+        assert await pool.run("block") == "v2"
+        return await old_request, await reload
+
+    old_version, result = asyncio.run(main())
+    assert old_version == "v1" and result["drained"]
+    assert pool.stats()["inflight_by_version"] == {}
+    pool.shutdown()
+
+
+def test_append_bars_persists_snapshot(tmp_path, store, bars):
+    live = store()
+    live.save(tmp_path / "snapshot", metadata={"source_sha256": "abc"})
+    state = _state(live, snapshot_dir=tmp_path / "snapshot")
+    manager = DatasetManager(state, load=None)
+
+    new_store = manager.append_bars(bars("2023-01-02"))
+    assert state.stock_data is new_store and len(new_store) == 61
+    saved = StockStore.load(tmp_path / "snapshot")
+    assert saved.version == new_store.version
+    state.compute_pool.shutdown()
+
+
+def test_workers_share_appended_bars_through_the_snapshot(tmp_path, store, bars):
+    snapshot = tmp_path / "snapshot"
+    store().save(snapshot, metadata={"source_sha256": "abc"})
+    # Two API workers, each with its own state, mapping the same snapshot
+    states = [_state(StockStore.load(snapshot, mmap_mode="r"), snapshot_dir=snapshot) for _ in range(2)]
+    first, second = (DatasetManager(state, load=None, mmap=True) for state in states)
+    follower = SnapshotFollower(second, interval=1)
+
+    appended = first.append_bars(bars("2023-01-02"))
+    assert isinstance(appended.columns[CLOSE_COL], np.memmap)
+    assert follower.poll() is True
+    assert second.version == appended.version and len(states[1].stock_data) == 61
+    assert follower.poll() is False
+
+    # The second worker appends before following the first worker's next append:
+    # its bars go on top of the snapshot, so neither append is lost
+    first.append_bars(bars("2023-01-03"))
+    latest = second.append_bars(bars("2023-01-04"))
+    dates = latest.get_symbol_columns("AAA")[DATE_COL]
+    assert len(latest) == 63 and str(dates[-2])[:10] == "2023-01-03"
+    assert StockStore.load(snapshot).version == latest.version
+    assert first.follow_snapshot() is True and first.version == latest.version
+    for state in states:
+        state.compute_pool.shutdown()
+
+
+def test_other_workers_follow_a_reload(tmp_path, write_source):
+    source = write_source(tmp_path / "stocks.parquet")
+    snapshot = tmp_path / "snapshot"
+    load = lambda: load_stock_store(source, snapshot, materialize=())
+    states = [_state(load(), snapshot_dir=snapshot) for _ in range(2)]
+    first, second = (DatasetManager(state, load=load, mmap=False) for state in states)
+    follower = SnapshotFollower(second, interval=1)
+
+    # Only the first worker receives POST /admin/reload; it rebuilds the snapshot from the new source
+    write_source(source, seed=1)
+    result = first.reload()
+    assert result["reloaded"]
+    assert follower.poll() is True
+    assert second.version == result["version"] and second.follows == 1
+    np.testing.assert_array_equal(states[1].stock_data.columns[CLOSE_COL], states[0].stock_data.columns[CLOSE_COL])
+    # A second worker reloading the same source loads the snapshot warm instead of rebuilding it
+    assert second.reload()["reloaded"] is False
+    for state in states:
+        state.compute_pool.shutdown()
+
+
+def test_watcher_reloads_once_the_file_settles(tmp_path):
+    source = tmp_path / "stocks.parquet"
+    source.write_bytes(b"v1")
+    reloads = []
+    watcher = DatasetWatcher(SimpleNamespace(reload=lambda: reloads.append(1), version="v1"), path=source, interval=1)
+
+    assert watcher.poll() is False
+    source.write_bytes(b"v2 is longer")
+    assert watcher.poll() is False  # changed: wait one more poll
+    assert watcher.poll() is True
+    assert watcher.poll() is False
+    assert reloads == [1]
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import indicators
+from app.services.auth_service import get_current_user
+from app.services.compute_pool import ComputePool
+from app.services.http_cache_service import indicator_etag, etag_matches, conditional_response
+from app.services.usage_service import InProcessUsageCounter
+
+
+def test_etag_depends_on_every_input():
+    base = ("v1", "AAA", "RSI", {"period": 14}, "2022-01-01", "2022-06-30", "records")
+    etag = indicator_etag(*base)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert indicator_etag("v1", "AAA", "RSI", {"period": 14}, "2022-01-01", "2022-06-30", "records") == etag
+    for i, other in enumerate(("v2", "BBB", "SMA", {"period": 15}, "2022-01-02", "2022-06-29", "arrow")):
+        changed = list(base)
+        changed[i] = other
+        assert indicator_etag(*changed) != etag
+
+
+def test_if_none_match_comparison():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"x", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abcd"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_conditional_response_counts_only_matching_requests():
+    usage = InProcessUsageCounter()
+    user = SimpleNamespace(username="poller")
+    request = lambda header: SimpleNamespace(headers={"if-none-match": header} if header else {})
+
+    assert conditional_response(request(None), usage, user, '"abc"') is None
+    assert conditional_response(request('"old"'), usage, user, '"abc"') is None
+    assert usage.get("poller") == 0
+    response = conditional_response(request('"abc"'), usage, user, '"abc"')
+    assert response.status_code == 304 and response.headers["etag"] == '"abc"'
+    assert usage.get("poller") == 1
+
+
+def test_conditional_request_answers_304_and_counts_against_quota(make_store):
+    store = make_store()
+    pool = ComputePool(store, mode="thread", workers=1)
+    usage = InProcessUsageCounter()
+    app = FastAPI()
+    app.include_router(indicators.router)
+    app.state.compute_pool = pool
+    app.state.usage_counter = usage
+    user = SimpleNamespace(username="etag-poller", subscription_tier="Premium", requests_today=0,
+                           last_request_date=None)
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+    params = {"stock_symbol": "AAA", "start_date": "2022-01-01", "end_date": "2022-06-30"}
+
+    first = client.get("/indicators/rsi", params=params)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "public, no-cache"
+    assert first.headers["vary"] == "Accept"
+
+    repeat = client.get("/indicators/rsi", params=params, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert repeat.headers["etag"] == etag
+    assert usage.get("etag-poller") == 2
+
+    # Other parameters, another format or a new dataset version change the tag
+    assert client.get("/indicators/rsi", params=dict(params, period=10),
+                      headers={"If-None-Match": etag}).status_code == 200
+    arrow = client.get("/indicators/rsi", params=dict(params, format="arrow"), headers={"If-None-Match": etag})
+    assert arrow.status_code == 200 and arrow.headers["etag"] != etag
+    pool.store = make_store(seed=6)
+    pool.store.version = "v2"
+    assert client.get("/indicators/rsi", params=params, headers={"If-None-Match": etag}).status_code == 200
+    pool.shutdown()
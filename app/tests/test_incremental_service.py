@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.batch_indicators_service import materialize_defaults
+from app.services.incremental_service import IncrementalIngestor
+from app.services.indicator_cache import IndicatorCache
+from app.services.indicators_service import INDICATORS, compute_indicator_window, resolve_params
+from app.services.stock_store import StockStore
+from config import DATE_COL, CLOSE_COL, VOLUME_COL
+
+PARAMS = {
+    "SMA": [{"period": 20}, {"period": 5}],
+    "EMA": [{"period": 20}],
+    "RSI": [{"period": 14}, {"period": 3}],
+    "MACD": [{}],
+    "Bollinger": [{}, {"period": 10, "num_std_dev": 3}],
+}
+
+
+def _fill_cache(store, cache, symbols):
+    for symbol in symbols:
+        for indicator, param_sets in PARAMS.items():
+            for params in param_sets:
+                compute_indicator_window(store, symbol, indicator, resolve_params(indicator, params),
+                                         None, None, cache=cache)
+
+
+def _assert_matches_recompute(store, cache, symbol):
+    close = np.asarray(store.get_symbol_columns(symbol, [CLOSE_COL])[CLOSE_COL], dtype=np.float64)
+    for indicator, param_sets in PARAMS.items():
+        for params in param_sets:
+            params = resolve_params(indicator, params)
+            cached = cache.get(store.version, (indicator, symbol, *params.values()))
+            assert cached is not None, (indicator, symbol, params)
+            expected = INDICATORS[indicator][0](close, **params)
+            for col, values in expected.items():
+                np.testing.assert_allclose(cached[col], values, rtol=1e-9, atol=1e-9, err_msg=f"{indicator} {col}")
+
+
+def test_incremental_series_match_full_recompute_across_appends(make_frame):
+    dates = pd.bdate_range("2022-01-03", periods=300)
+    # "SHORT" has fewer rows than the longest warm-up, so its early-row paths are exercised
+    frame = pd.concat([
+        make_frame(("AAA", "BBB"), days=300, seed=17), make_frame(("SHORT",), days=4, seed=18, start=dates[-4]),
+    ])
+    store = StockStore.from_frame(frame, version="v1")
+    cache = IndicatorCache()
+    _fill_cache(store, cache, ["AAA", "BBB", "SHORT"])
+
+    ingestor = IncrementalIngestor()
+    next_days = pd.bdate_range(dates[-1] + pd.offsets.BDay(), periods=30)
+    for day in range(0, 30, 3):
+        new_dates = next_days[day:day + 3]
+        store = ingestor.append(store, make_frame(("AAA", "SHORT"), days=3, seed=day, start=new_dates[0]), cache=cache)
+        # Every cached series was carried over, none recomputed
+        assert len(cache) == 3 * sum(len(p) for p in PARAMS.values())
+        for symbol in ("AAA", "SHORT"):
+            _assert_matches_recompute(store, cache, symbol)
+    assert len(store.get_symbol_columns("AAA")[DATE_COL]) == 330
+    assert len(store.get_symbol_columns("BBB")[DATE_COL]) == 300
+
+
+def test_unchanged_symbols_are_kept_and_universe_entries_dropped(make_frame, make_store):
+    dates = pd.bdate_range("2022-01-03", periods=60)
+    store = make_store(days=60, seed=3)
+    cache = IndicatorCache()
+    _fill_cache(store, cache, ["BBB"])
+    bbb_sma = cache.get("v1", ("SMA", "BBB", 20))
+    cache.put("v1", ("SMA", "*", ("period", 20)), {"sma": np.zeros(3)})
+
+    new_bars = make_frame(("AAA", "NEW"), days=2, seed=4, start=dates[-1] + pd.offsets.BDay())
+    new_store = IncrementalIngestor().append(store, new_bars, cache=cache)
+
+    assert new_store.version != store.version
+    assert cache.get(new_store.version, ("SMA", "BBB", 20)) is bbb_sma
+    assert cache.get(new_store.version, ("SMA", "*", ("period", 20))) is None
+    assert list(new_store.symbols) == ["AAA", "BBB", "NEW"]
+    assert len(new_store.get_symbol_columns("NEW")[DATE_COL]) == 2
+
+    # Late requests still computing on the old store cannot repopulate the cache
+    cache.put(store.version, ("SMA", "AAA", 20), {"sma": np.zeros(3)})
+    assert cache.get(store.version, ("SMA", "AAA", 20)) is None
+    assert cache.stats()["version"] == new_store.version
+
+
+def test_append_rejects_bars_not_after_the_last_date(make_frame, make_store):
+    dates = pd.bdate_range("2022-01-03", periods=10)
+    store = make_store(("AAA",), days=10, seed=4)
+    ingestor = IncrementalIngestor()
+
+    with pytest.raises(ValueError, match="dated after"):
+        ingestor.append(store, make_frame(("AAA",), days=1, start=dates[-1]))
+    with pytest.raises(ValueError, match="repeat"):
+        ingestor.append(store, pd.concat([make_frame(("AAA",), days=1, start=dates[-1] + pd.offsets.BDay())] * 2))
+    with pytest.raises(ValueError, match="missing columns"):
+        ingestor.append(store, make_frame(("AAA",), days=1, start=dates[-1] + pd.offsets.BDay()).drop(columns=[VOLUME_COL]))
+
+
+@pytest.mark.parametrize("dtype,tol", [(np.float64, 1e-9), (np.float32, 1e-5)])
+def test_materialized_series_extend_like_a_recompute(dtype, tol, make_frame, make_store):
+    dates = pd.bdate_range("2022-01-03", periods=80)
+    store = make_store(("AAA", "BBB", "CCC"), days=80, seed=5)
+    store.materialized = materialize_defaults(store, list(PARAMS), dtype=dtype)
+
+    new_bars = make_frame(("AAA", "CCC", "NEW"), days=3, seed=6, start=dates[-1] + pd.offsets.BDay())
+    new_store = IncrementalIngestor().append(store, new_bars)
+
+    # A new symbol merges the rows into the columns, a later append of known symbols goes to the tail
+    more_bars = make_frame(("BBB", "NEW"), days=1, seed=7, start=dates[-1] + pd.offsets.BDay(4))
+    newer_store = IncrementalIngestor().append(new_store, more_bars)
+    assert new_store.tail is None and len(newer_store.tail) == 2
+
+    for extended in (new_store, newer_store):
+        expected = materialize_defaults(extended, list(PARAMS), dtype=dtype)
+        materialized = extended.compacted().materialized
+        assert set(materialized) == set(expected)
+        for key, series in expected.items():
+            for col, values in series.items():
+                assert materialized[key][col].dtype == dtype
+                np.testing.assert_allclose(materialized[key][col], values, rtol=tol, atol=tol, err_msg=f"{key} {col}")
+
+
+def test_extended_series_fill_spare_capacity(make_frame, make_store):
+    dates = pd.bdate_range("2022-01-03", periods=100)
+    store = make_store(("AAA",), days=100, seed=7)
+    cache = IndicatorCache()
+    _fill_cache(store, cache, ["AAA"])
+
+    ingestor = IncrementalIngestor()
+    series = []
+    for day in pd.bdate_range(dates[-1] + pd.offsets.BDay(), periods=3):
+        store = ingestor.append(store, make_frame(("AAA",), days=1, seed=day.day, start=day), cache=cache)
+        series.append(cache.get(store.version, ("SMA", "AAA", 20))["sma"])
+
+    # The first append copies the series into a buffer with spare room, the next ones write into it
+    assert [len(values) for values in series] == [101, 102, 103]
+    assert np.shares_memory(series[0], series[2])
+    _assert_matches_recompute(store, cache, "AAA")
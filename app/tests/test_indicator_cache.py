@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from app.services.indicator_cache import IndicatorCache
+from app.services.indicators_service import calculate_rsi, calculate_bollinger_bands
+from app.services.stock_store import StockStore
+from config import CLOSE_COL
+
+
+def test_cached_result_matches_uncached_and_counts_hits(make_store):
+    store = make_store(seed=5)
+    cache = IndicatorCache()
+
+    expected = calculate_rsi(store, "AAA", 14, "2022-06-01", "2022-07-01")
+    first = calculate_rsi(store, "AAA", 14, "2022-06-01", "2022-07-01", cache=cache)
+    second = calculate_rsi(store, "AAA", 14, "2022-02-01", "2022-03-01", cache=cache)
+
+    pd.testing.assert_frame_equal(first, expected)
+    assert len(second) > 0
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction_respects_byte_budget(make_store):
+    store = make_store(seed=5)
+    entry_bytes = 300 * 8 * 3
+    cache = IndicatorCache(max_bytes=entry_bytes * 2)
+
+    calculate_bollinger_bands(store, "AAA", 20, 2, "2022-06-01", "2022-07-01", cache=cache)
+    calculate_bollinger_bands(store, "BBB", 20, 2, "2022-06-01", "2022-07-01", cache=cache)
+    calculate_bollinger_bands(store, "AAA", 20, 2, "2022-06-01", "2022-07-01", cache=cache)
+    calculate_bollinger_bands(store, "AAA", 10, 2, "2022-06-01", "2022-07-01", cache=cache)
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= cache.max_bytes
+    assert cache.get("v1", ("Bollinger", "BBB", 20, 2)) is None
+
+
+def test_new_dataset_version_drops_stale_entries(make_frame):
+    df = make_frame(seed=5)
+    cache = IndicatorCache()
+    old_store = StockStore.from_frame(df, version="v1")
+    calculate_bollinger_bands(old_store, "AAA", 20, 2, "2022-06-01", "2022-07-01", cache=cache)
+
+    df[CLOSE_COL] = df[CLOSE_COL] * 2
+    new_store = StockStore.from_frame(df, version="v2")
+    result = calculate_bollinger_bands(new_store, "AAA", 20, 2, "2022-06-01", "2022-07-01", cache=cache)
+
+    pd.testing.assert_frame_equal(result, calculate_bollinger_bands(new_store, "AAA", 20, 2, "2022-06-01", "2022-07-01"))
+    assert cache.stats()["version"] == "v2"
+    assert cache.stats()["entries"] == 1
+
+
+def test_rebind_transforms_entries_outside_the_lock():
+    cache = IndicatorCache()
+    cache.put("v1", ("SMA", "AAA", 20), {"sma": np.zeros(3)})
+    cache.put("v1", ("SMA", "BBB", 20), {"sma": np.zeros(3)})
+
+    def transform(key, values):
+        # Requests on the new version are served (and stored) while entries are carried over
+        cache.put("v2", ("EMA", "AAA", 20), {"ema": np.ones(4)})
+        return None if key[1] == "BBB" else {"sma": np.ones(4)}
+
+    cache.rebind("v1", "v2", transform)
+
+    assert cache.stats()["version"] == "v2"
+    assert len(cache) == 2 and cache.current_bytes == 64
+    np.testing.assert_array_equal(cache.get("v2", ("SMA", "AAA", 20))["sma"], np.ones(4))
+    assert cache.get("v2", ("EMA", "AAA", 20)) is not None
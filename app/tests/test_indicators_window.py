@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.indicators_service import (
+    calculate_simple_moving_average,
+    calculate_exponential_moving_average,
+    calculate_rsi,
+    calculate_macd,
+    calculate_bollinger_bands,
+    calculate_indicator_batch,
+    window_bounds,
+)
+from app.services.indicator_cache import IndicatorCache
+from config import SYMBOL_COL, DATE_COL, CLOSE_COL, SMA_COL, EMA_COL, RSI_COL, MACD_COL, SIGNAL_COL, UPPER_BB_COL
+
+START, END = "2024-03-01", "2024-03-29"
+
+
+@pytest.fixture
+def store(make_store):
+    return make_store(days=800, seed=3, start="2021-01-04", version=None)
+
+
+def _full_history(store, symbol):
+    cols = store.get_symbol_columns(symbol)
+    return pd.Series(cols[CLOSE_COL]), pd.Series(cols[DATE_COL])
+
+
+def _in_window(series, dates):
+    mask = (dates >= START) & (dates <= END)
+    return series[mask].to_numpy()
+
+
+def _values(result, col):
+    return result[col].to_numpy(dtype=float)
+
+
+def test_window_bounds_binary_search():
+    dates = pd.bdate_range("2024-01-01", periods=10).to_numpy()
+    assert window_bounds(dates, "2024-01-03", "2024-01-05") == (2, 5)
+    assert window_bounds(dates, "2024-01-06", "2024-01-07") == (5, 5)
+    assert window_bounds(dates, None, None) == (0, 10)
+    assert window_bounds(dates, "2023-01-01", "2023-02-01") == (0, 0)
+
+
+def test_windowed_sma_and_bollinger_match_full_history(store):
+    close, dates = _full_history(store, "BBB")
+
+    sma = calculate_simple_moving_average(store, "BBB", 20, START, END)
+    np.testing.assert_allclose(_values(sma, SMA_COL), _in_window(close.rolling(20).mean(), dates), rtol=1e-12)
+
+    boll = calculate_bollinger_bands(store, "BBB", 20, 2, START, END)
+    expected_upper = close.rolling(20).mean() + close.rolling(20).std() * 2
+    np.testing.assert_allclose(_values(boll, UPPER_BB_COL), _in_window(expected_upper, dates), rtol=1e-12)
+
+
+def test_windowed_ewm_indicators_match_full_history(store):
+    close, dates = _full_history(store, "AAA")
+
+    ema = calculate_exponential_moving_average(store, "AAA", 20, START, END)
+    expected_ema = close.ewm(span=20, adjust=False).mean()
+    np.testing.assert_allclose(_values(ema, EMA_COL), _in_window(expected_ema, dates), rtol=1e-9)
+
+    macd = calculate_macd(store, "AAA", 12, 26, 9, START, END)
+    expected_macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    expected_signal = expected_macd.ewm(span=9, adjust=False).mean()
+    price_range = close.max() - close.min()
+    np.testing.assert_allclose(_values(macd, MACD_COL), _in_window(expected_macd, dates), atol=1e-9 * price_range)
+    np.testing.assert_allclose(_values(macd, SIGNAL_COL), _in_window(expected_signal, dates), atol=1e-9 * price_range)
+
+
+def test_windowed_rsi_matches_full_history(store):
+    close, dates = _full_history(store, "AAA")
+
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    expected = 100 - 100 / (1 + gain / loss)
+
+    rsi = calculate_rsi(store, "AAA", 14, START, END)
+    np.testing.assert_allclose(_values(rsi, RSI_COL), _in_window(expected, dates), rtol=1e-10)
+
+
+def test_warmup_rows_at_history_start_are_null(store):
+    sma = calculate_simple_moving_average(store, "AAA", 20, "2021-01-04", "2021-02-12")
+    records = sma.to_dict(orient="records")
+
+    assert records[0] == {SYMBOL_COL: "AAA", DATE_COL: "2021-01-04", SMA_COL: None}
+    assert records[18][SMA_COL] is None
+    assert isinstance(records[19][SMA_COL], float)
+
+
+def test_batch_matches_individual_calculators(store):
+    specs = [
+        ("AAA", "SMA", {"period": 20}, START, END),
+        ("BBB", "RSI", {}, "2023-01-02", "2023-02-01"),
+        ("AAA", "Bollinger", {"period": 20}, "2022-06-01", "2022-06-30"),
+        ("AAA", "MACD", {}, START, END),
+        ("AAA", "EMA", {"period": 26}, "2021-01-04", END),
+    ]
+    expected = [
+        calculate_simple_moving_average(store, "AAA", 20, START, END),
+        calculate_rsi(store, "BBB", 14, "2023-01-02", "2023-02-01"),
+        calculate_bollinger_bands(store, "AAA", 20, 2, "2022-06-01", "2022-06-30"),
+        calculate_macd(store, "AAA", 12, 26, 9, START, END),
+        calculate_exponential_moving_average(store, "AAA", 26, "2021-01-04", END),
+    ]
+
+    for cache in (None, IndicatorCache()):
+        results = calculate_indicator_batch(store, specs, cache=cache)
+        for actual, exp in zip(results, expected):
+            pd.testing.assert_frame_equal(
+                actual.astype({c: float for c in actual.columns[2:]}),
+                exp.astype({c: float for c in exp.columns[2:]}),
+                rtol=1e-9,
+            )
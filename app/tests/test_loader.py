@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+from app.services.indicators_service import calculate_rsi, compute_indicator_window, resolve_params
+from app.services.loader import load_stock_store
+from app.services.stock_store import read_snapshot_meta, write_snapshot_meta
+from config import DATE_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL
+
+
+def test_cold_then_warm_start(tmp_path, write_source, capsys):
+    source = tmp_path / "stocks.parquet"
+    snapshot = tmp_path / "snapshot"
+    write_source(source)
+
+    cold = load_stock_store(source, snapshot)
+    assert "cold start" in capsys.readouterr().out
+    warm = load_stock_store(source, snapshot)
+    assert "warm start" in capsys.readouterr().out
+
+    assert warm.version == cold.version
+    assert list(warm.symbols) == ["AAA", "BBB"]
+    assert warm.symbol_index == cold.symbol_index
+    for col in (DATE_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL):
+        np.testing.assert_array_equal(warm.columns[col], cold.columns[col])
+    assert not np.isnan(warm.columns[CLOSE_COL]).any()
+
+
+def test_touched_source_stays_warm_and_changed_source_rebuilds(tmp_path, write_source, capsys):
+    source = tmp_path / "stocks.parquet"
+    snapshot = tmp_path / "snapshot"
+    write_source(source)
+    first = load_stock_store(source, snapshot)
+    capsys.readouterr()
+
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    load_stock_store(source, snapshot)
+    assert "warm start" in capsys.readouterr().out
+    assert read_snapshot_meta(snapshot)["source_mtime_ns"] == source.stat().st_mtime_ns
+
+    write_source(source, seed=1)
+    rebuilt = load_stock_store(source, snapshot)
+    assert "cold start" in capsys.readouterr().out
+    assert rebuilt.version != first.version
+
+
+def test_mmap_mode_maps_snapshot_read_only(tmp_path, write_source):
+    source = tmp_path / "stocks.parquet"
+    snapshot = tmp_path / "snapshot"
+    write_source(source)
+
+    built = load_stock_store(source, snapshot, mmap=True)
+    mapped = load_stock_store(source, snapshot, mmap=True)
+
+    for store in (built, mapped):
+        close = store.columns[CLOSE_COL]
+        assert isinstance(close, np.memmap)
+        assert not close.flags.writeable
+        assert isinstance(store.offsets, np.memmap)
+    result = calculate_rsi(mapped, "BBB", 14, "2022-02-01", "2022-03-01")
+    assert len(result) == 21
+
+
+def test_switching_layout_rebuilds_with_its_own_version(tmp_path, write_source, capsys):
+    source = tmp_path / "stocks.parquet"
+    snapshot = tmp_path / "snapshot"
+    write_source(source)
+
+    full = load_stock_store(source, snapshot, compact=False)
+    compact = load_stock_store(source, snapshot, compact=True)
+    assert capsys.readouterr().out.count("cold start") == 2
+    assert compact.version != full.version
+    assert compact.columns[CLOSE_COL].dtype == np.float32
+
+    warm = load_stock_store(source, snapshot, compact=True)
+    assert "warm start" in capsys.readouterr().out
+    assert warm.version == compact.version and warm.columns[DATE_COL].dtype == np.dtype("datetime64[D]")
+
+
+def test_materialized_series_are_saved_and_match_live_computation(tmp_path, write_source, capsys):
+    source = tmp_path / "stocks.parquet"
+    snapshot = tmp_path / "snapshot"
+    write_source(source)
+
+    cold = load_stock_store(source, snapshot, materialize=("SMA", "MACD"))
+    warm = load_stock_store(source, snapshot, materialize=("SMA", "MACD"), mmap=True)
+    assert "warm start" in capsys.readouterr().out
+    assert set(warm.materialized) == {("SMA", 20), ("MACD", 12, 26, 9)}
+    assert isinstance(warm.materialized[("SMA", 20)]["sma"], np.memmap)
+    assert warm.materialized[("SMA", 20)]["sma"].dtype == np.float32
+
+    live = load_stock_store(source, None, materialize=())
+    assert not live.materialized
+    for store in (cold, warm):
+        for indicator, params in (("SMA", {"period": 20}), ("MACD", resolve_params("MACD"))):
+            expected_dates, expected = compute_indicator_window(live, "BBB", indicator, params, "2022-02-01", "2022-03-01")
+            dates, result = compute_indicator_window(store, "BBB", indicator, params, "2022-02-01", "2022-03-01")
+            np.testing.assert_array_equal(dates, expected_dates)
+            # Stored as float32: equal to the float64 computation to within float32 rounding
+            for col, values in expected.items():
+                np.testing.assert_allclose(result[col], values, rtol=1e-6, atol=1e-5)
+
+    # A snapshot storing the series as another type (float64 before) is rebuilt
+    meta = read_snapshot_meta(snapshot)
+    write_snapshot_meta(snapshot, dict(meta, materialized=[dict(entry, dtype="float64") for entry in meta["materialized"]]))
+    load_stock_store(source, snapshot, materialize=("SMA", "MACD"))
+    assert "cold start" in capsys.readouterr().out
+
+    load_stock_store(source, snapshot, materialize=("SMA",))
+    assert "cold start" in capsys.readouterr().out
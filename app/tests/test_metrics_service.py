@@ -0,0 +1,100 @@
+import re
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from app.services.compute_pool import ComputePool
+from app.services.indicator_cache import IndicatorCache
+from app.services.metrics_service import (
+    MetricsMiddleware, MetricsRegistry, Histogram, span, label_request, window_label, CONTENT_TYPE,
+)
+
+WINDOW = ("AAA", "RSI", {"period": 14}, "2022-01-01", "2022-06-30")
+
+
+def _sample(text, metric, **labels):
+    pattern = metric + r"\{" + ",".join(f'{k}="{re.escape(v)}"' for k, v in labels.items()) + r"[^}]*\} (\S+)"
+    return float(re.search(pattern, text).group(1))
+
+
+def test_span_is_a_noop_outside_a_request():
+    with span("kernel") as first, span("kernel") as second:
+        pass
+    assert first is None and second is None
+
+
+def test_window_label():
+    assert window_label("2024-01-02", "2024-01-02") == "1d"
+    assert window_label("2024-01-01", "2024-03-01") == "3m"
+    assert window_label("2020-01-01", "2024-01-01") == "max"
+    assert window_label("2024-13-01", "2024-01-01") == "invalid"
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1))
+    for seconds in (0.05, 0.1, 0.5, 2):
+        histogram.observe(("kernel",), seconds)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{stage="kernel",le="0.1"} 2',
+        'latency_seconds_bucket{stage="kernel",le="1"} 3',
+        'latency_seconds_bucket{stage="kernel",le="+Inf"} 4',
+        'latency_seconds_sum{stage="kernel"} 2.65',
+        'latency_seconds_count{stage="kernel"} 4',
+    ]
+
+
+def test_middleware_records_request_and_pool_spans(make_store):
+    registry = MetricsRegistry()
+    pool = ComputePool(make_store(), mode="thread", workers=1)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    @app.get("/rsi")
+    async def get_rsi(request: Request):
+        label_request("RSI", SimpleNamespace(subscription_tier="Pro"), WINDOW[3], WINDOW[4])
+        with span("check_access"):
+            pass
+        dates, _ = await pool.run("window", *WINDOW)
+        return {"rows": len(dates)}
+
+    @app.get("/metrics")
+    def get_metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    client = TestClient(app)
+    for _ in range(3):
+        assert client.get("/rsi").status_code == 200
+    assert client.get("/missing").status_code == 404
+    response = client.get("/metrics")
+    pool.shutdown()
+
+    text = response.text
+    assert response.headers["content-type"] == CONTENT_TYPE + "; charset=utf-8"
+    assert _sample(text, "http_request_duration_seconds_count", handler="get_rsi", method="GET", status="200") == 3
+    assert _sample(text, "http_request_duration_seconds_count", handler="unmatched", method="GET", status="404") == 1
+    labels = {"indicator": "RSI", "tier": "Pro", "window": "1y"}
+    for stage in ("total", "check_access", "compute", "worker", "symbol_slice", "kernel"):
+        assert _sample(text, "indicator_stage_seconds_count", stage=stage, **labels) == 3
+    assert (_sample(text, "indicator_stage_seconds_sum", stage="kernel", **labels)
+            <= _sample(text, "indicator_stage_seconds_sum", stage="compute", **labels)
+            <= _sample(text, "indicator_stage_seconds_sum", stage="total", **labels))
+
+
+def test_collectors_export_indicator_cache_counters():
+    registry = MetricsRegistry()
+    cache = IndicatorCache(max_bytes=100)
+    registry.register_collector("indicator_cache", cache.metric_samples)
+    cache.put("v1", ("SMA", "AAA", 20), {"sma": np.zeros(10)})
+    cache.put("v1", ("SMA", "BBB", 20), {"sma": np.zeros(10)})  # evicts AAA
+    cache.get("v1", ("SMA", "BBB", 20))
+    cache.get("v1", ("SMA", "AAA", 20))
+
+    text = registry.render()
+    assert "# TYPE indicator_cache_hits_total counter" in text
+    assert re.search(r"^indicator_cache_hits_total 1$", text, re.M)
+    assert re.search(r"^indicator_cache_misses_total 1$", text, re.M)
+    assert re.search(r"^indicator_cache_evictions_total 1$", text, re.M)
+    assert re.search(r"^indicator_cache_bytes 80$", text, re.M)
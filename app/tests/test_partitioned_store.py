@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.batch_indicators_service import screen_columns
+from app.services.indicators_service import compute_indicator_window
+from app.services.loader import load_partitioned_store
+from app.services.partitioned_store import PartitionedStockStore, write_partitioned
+from app.services.stock_store import StockStore
+from app.utils import clean_stock_data
+from config import DATE_COL, CLOSE_COL, VOLUME_COL, RSI_COL, MACD_COL, SIGNAL_COL
+
+
+SYMBOLS = ("BBB", "AAA", "C/D")
+
+
+@pytest.fixture
+def source(tmp_path, write_source):
+    return write_source(tmp_path / "stocks.parquet", SYMBOLS, days=1000, start="2020-01-01")
+
+
+@pytest.mark.parametrize("by_year", [False, True])
+def test_partitions_match_the_in_memory_store(tmp_path, source, by_year):
+    write_partitioned(source, tmp_path / "parts", by_year=by_year, metadata={"version": "v1"}, batch_rows=500)
+    store = PartitionedStockStore(tmp_path / "parts")
+    expected = StockStore.from_frame(clean_stock_data(pd.read_parquet(source)))
+
+    assert list(store.symbols) == ["AAA", "BBB", "C/D"]
+    assert len(store) == len(expected) and store.version == "v1"
+    for symbol in store.symbols:
+        got = store.get_symbol_columns(symbol)
+        for col, values in expected.get_symbol_columns(symbol).items():
+            np.testing.assert_array_equal(got[col], values)
+    assert len(store.get_symbol_columns("ZZZ")[CLOSE_COL]) == 0
+
+
+def test_window_reads_only_the_needed_chunks(tmp_path, source):
+    write_partitioned(source, tmp_path / "parts", metadata={"version": "v1"})
+    store = PartitionedStockStore(tmp_path / "parts")
+
+    cols = store.get_symbol_columns("AAA", [DATE_COL], "2022-06-01", "2022-06-30", warmup_rows=50)
+    # 2022 plus 2021 for the warm-up; 2020 and 2023 stay on disk
+    assert store.chunk_reads == 2
+    assert cols[DATE_COL][0] == np.datetime64("2021-01-01") and cols[DATE_COL][-1] == np.datetime64("2022-12-30")
+
+    store.get_symbol_columns("AAA", [DATE_COL], "2022-01-03", "2022-02-01")
+    assert store.chunk_reads == 2  # served from the chunk cache
+
+
+def test_chunk_cache_is_bounded(tmp_path, source):
+    write_partitioned(source, tmp_path / "parts", metadata={"version": "v1"})
+    store = PartitionedStockStore(tmp_path / "parts", cache_bytes=30_000)
+    for symbol in store.symbols:
+        store.get_symbol_columns(symbol)
+    stats = store.cache_stats()
+    assert stats["bytes"] <= 30_000 and stats["evictions"] > 0
+
+
+def test_indicators_and_screen_match_the_in_memory_store(tmp_path, source):
+    write_partitioned(source, tmp_path / "parts", metadata={"version": "v1"})
+    store = PartitionedStockStore(tmp_path / "parts")
+    expected = StockStore.from_frame(clean_stock_data(pd.read_parquet(source)))
+
+    for indicator, col in (("RSI", RSI_COL), ("MACD", SIGNAL_COL)):
+        dates, values = compute_indicator_window(store, "BBB", indicator, {}, "2022-03-01", "2022-09-30")
+        expected_dates, expected_values = compute_indicator_window(expected, "BBB", indicator, {}, "2022-03-01", "2022-09-30")
+        np.testing.assert_array_equal(dates, expected_dates)
+        np.testing.assert_allclose(values[col], expected_values[col], rtol=1e-9)
+
+    symbols, dates, values = screen_columns(store, "MACD", {}, "2022-03-01")
+    expected_symbols, expected_dates, expected_values = screen_columns(expected, "MACD", {}, "2022-03-01")
+    assert list(symbols) == list(expected_symbols)
+    np.testing.assert_array_equal(dates, expected_dates)
+    np.testing.assert_allclose(values[MACD_COL], expected_values[MACD_COL], rtol=1e-9)
+
+
+def test_load_reuses_builds_and_keeps_two(tmp_path, source, write_source, capsys):
+    directory = tmp_path / "partitioned"
+    first = load_partitioned_store(source, directory)
+    assert "cold start" in capsys.readouterr().out
+    assert load_partitioned_store(source, directory).version == first.version
+    assert "warm start" in capsys.readouterr().out
+
+    write_source(source, SYMBOLS, days=1000, seed=1, start="2020-01-01")
+    second = load_partitioned_store(source, directory)
+    assert second.version != first.version
+    # The store opened before the reload still reads its own files
+    assert len(first.get_symbol_columns("AAA", [VOLUME_COL])[VOLUME_COL]) == 1000
+
+    write_source(source, SYMBOLS, days=1000, seed=2, start="2020-01-01")
+    third = load_partitioned_store(source, directory)
+    assert sorted(p.name for p in directory.iterdir()) == sorted([second.directory.name, third.directory.name])
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.password_pool import PasswordHashPool
+
+
+def test_runs_calls_on_the_pool():
+    pool = PasswordHashPool(workers=2, max_pending=4)
+
+    async def main():
+        return await asyncio.gather(*(pool.run(lambda x: (x * 2, threading.current_thread().name), i) for i in range(4)))
+
+    results = asyncio.run(main())
+    assert [value for value, _ in results] == [0, 2, 4, 6]
+    assert all(name.startswith("password-hash") for _, name in results)
+    stats = pool.stats()
+    assert stats["completed"] == 4 and stats["pending"] == 0 and stats["rejected"] == 0
+    pool.shutdown()
+
+
+def test_rejects_calls_beyond_max_pending():
+    pool = PasswordHashPool(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def main():
+        blocked = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(release.wait)
+        assert exc.value.status_code == 503 and exc.value.headers == {"Retry-After": "1"}
+        assert pool.stats()["pending"] == 2
+        release.set()
+        await asyncio.gather(*blocked)
+
+    asyncio.run(main())
+    stats = pool.stats()
+    assert stats["rejected"] == 1 and stats["peak_pending"] == 2 and stats["completed"] == 2
+    assert stats["avg_queue_seconds"] > 0
+    samples = {name: value for name, _, _, value in pool.metric_samples()}
+    assert samples["password_hash_rejected_total"] == 1 and samples["password_hash_peak_pending"] == 2
+    assert samples["password_hash_pending"] == 0 and samples["password_hash_queue_seconds_total"] > 0
+    pool.shutdown()
+
+
+def test_cancelled_caller_keeps_its_slot_until_the_call_finishes():
+    pool = PasswordHashPool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def main():
+        waiter = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        waiter.cancel()  # client disconnect while bcrypt is running
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(HTTPException):
+                await asyncio.wait_for(pool.run(lambda: None), 1)
+        finally:
+            release.set()
+        for _ in range(100):
+            if pool.stats()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await pool.run(lambda: "admitted")
+
+    assert asyncio.run(main()) == "admitted"
+    pool.shutdown()
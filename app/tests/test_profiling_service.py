@@ -0,0 +1,66 @@
+import asyncio
+import pstats
+import threading
+import time
+
+import pytest
+
+from app.services.compute_pool import ComputePool
+from app.services.profiling_service import Profiler, sample_stacks, profiler
+
+WINDOW = ("AAA", "RSI", {"period": 14}, "2022-01-01", "2022-06-30")
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_collects_collapsed_stacks_of_other_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        stacks = sample_stacks(0.2, interval=0.005)
+    finally:
+        stop.set()
+        thread.join()
+    spinning = [stack for stack in stacks if stack.startswith("spinner;")]
+    # The innermost frame may be the spin loop or a call it makes (Event.is_set)
+    assert spinning and all("test_profiling_service._spin" in stack for stack in spinning)
+    assert not any("sample_stacks" in stack for stack in stacks)
+
+
+def test_cprofile_mode_profiles_pool_computations(tmp_path, make_store):
+    pool = ComputePool(make_store(), mode="thread", workers=1)
+    profile = {}
+    thread = threading.Thread(target=lambda: profile.update(body=profiler.profile(0.5, "cprofile")))
+    thread.start()
+    while profiler.collector is None:
+        time.sleep(0.001)
+    for _ in range(3):
+        dates, _ = asyncio.run(pool.run("window", *WINDOW))
+        assert len(dates)
+    thread.join()
+    # Idle again: computations no longer go through cProfile
+    assert profiler.collector is None
+    assert len(asyncio.run(pool.run("window", *WINDOW))[0]) == len(dates)
+    pool.shutdown()
+
+    path = tmp_path / "profile.pstats"
+    path.write_bytes(profile["body"])
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_rsi_kernel" in functions and "compute_indicator_windows" in functions
+
+
+def test_one_profile_at_a_time():
+    local = Profiler()
+    thread = threading.Thread(target=local.profile, args=(0.3, "cprofile"))
+    thread.start()
+    while local.collector is None:
+        time.sleep(0.001)
+    with pytest.raises(RuntimeError):
+        local.profile(0.1, "sample")
+    thread.join()
+    with pytest.raises(ValueError):
+        local.profile(0.1, "perf")
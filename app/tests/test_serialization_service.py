@@ -0,0 +1,121 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi import HTTPException
+
+from app.services import serialization_service
+from app.services.batch_indicators_service import materialize_defaults
+from app.services.indicators_service import compute_indicator_window, to_output_frame
+from app.services.serialization_service import (
+    BATCH_FORMATS,
+    arrow_ipc_bytes,
+    build_batch_response,
+    arrow_table,
+    columnar_json,
+    iso_date_bytes,
+    iter_ndjson,
+    negotiate_format,
+    parquet_bytes,
+    records_json,
+)
+
+DATES = pd.bdate_range("2022-03-01", periods=5).to_numpy()
+VALUES = {"macd": np.array([np.nan, 1.5, -0.25, 3.0, np.nan]), "signal": np.array([np.nan, np.nan, 0.1, 0.2, 0.3])}
+
+
+def test_negotiate_format():
+    assert negotiate_format(None, None) == "records"
+    assert negotiate_format("text/html, application/x-ndjson;q=0.9", None) == "ndjson"
+    assert negotiate_format("application/x-ndjson", "parquet") == "parquet"
+    with pytest.raises(HTTPException) as exc:
+        negotiate_format(None, "xml")
+    assert exc.value.status_code == 406
+
+    # A batch falls back to records for an Accept it cannot encode, and rejects it when asked explicitly
+    assert negotiate_format("application/vnd.apache.arrow.stream", None, formats=BATCH_FORMATS) == "records"
+    with pytest.raises(HTTPException):
+        negotiate_format(None, "arrow", formats=BATCH_FORMATS)
+
+
+def test_columnar_and_ndjson_match_records():
+    records = to_output_frame("AAA", DATES, VALUES).to_dict(orient="records")
+
+    payload = json.loads(columnar_json("AAA", DATES, VALUES))
+    assert payload["symbol"] == "AAA"
+    assert payload["date"] == [r["date"] for r in records]
+    assert payload["macd"] == [r["macd"] for r in records]
+
+    lines = b"".join(iter_ndjson("AAA", DATES, VALUES, chunk_rows=2)).decode().splitlines()
+    assert [json.loads(line) for line in lines] == records
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_records_json_matches_output_frame(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization_service, "orjson", None)
+    values = dict(VALUES, upper_band=np.array([np.inf, 1e-05, 1e20, 0.1 + 0.2, -7.0]))
+    symbols = np.array(["AAA", "B\"B", "AAA", "CCC", "B\"B"], dtype=object)
+
+    for stock_symbol in ("AAA", symbols):
+        expected = to_output_frame(stock_symbol, DATES, values).to_dict(orient="records")
+        expected[0]["upper_band"] = None
+        assert json.loads(records_json(stock_symbol, DATES, values)) == expected
+    assert records_json("AAA", DATES[:0], {"macd": VALUES["macd"][:0]}) == b"[]"
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_float32_series_keep_their_digits(monkeypatch, make_store, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization_service, "orjson", None)
+    store = make_store(("AAA",), days=40, compact=True)
+    store.materialized = materialize_defaults(store, ["RSI"], dtype=np.float32)
+    dates, values = compute_indicator_window(store, "AAA", "RSI", {}, "2022-02-01", "2022-02-25")
+    rsi = values["rsi"]
+    assert rsi.dtype == np.float32
+
+    # Each value is written with the shortest digits that read back as its float32
+    expected = [None if np.isnan(v) else float(str(v)) for v in rsi]
+    tokens = [row["rsi"] for row in json.loads(records_json("AAA", dates, values))]
+    assert tokens == expected
+    assert json.loads(columnar_json("AAA", dates, values))["rsi"] == expected
+    assert records_json("AAA", dates[:1], {"rsi": np.array([94.03573], dtype=np.float32)}).endswith(b'"rsi":94.03573}]')
+    assert arrow_table("AAA", dates, values).schema.field("rsi").type == pa.float32()
+
+
+def test_iso_date_bytes():
+    dates = np.array(["1969-12-31", "1970-01-01", "2000-02-29", "2024-12-31", "9999-01-09"], dtype="datetime64[D]")
+    assert iso_date_bytes(dates.astype("datetime64[ns]")[:4]).astype(str).tolist() == dates.astype(str).tolist()[:4]
+    assert iso_date_bytes(dates).astype(str).tolist() == dates.astype(str).tolist()
+
+
+def test_arrow_and_parquet_round_trip():
+    symbols = np.array(["AAA", "BBB", "AAA", "CCC", "BBB"], dtype=object)
+    table = arrow_table(symbols, DATES, VALUES)
+
+    from_ipc = pa.ipc.open_stream(arrow_ipc_bytes(table)).read_all()
+    from_parquet = pq.read_table(io.BytesIO(parquet_bytes(table)))
+
+    for result in (from_ipc, from_parquet):
+        assert result.column("symbol").to_pylist() == list(symbols)
+        assert result.column("macd").to_pylist() == [None, 1.5, -0.25, 3.0, None]
+        assert str(result.column("date")[0]) == "2022-03-01"
+
+
+def test_batch_items_use_the_response_encoders():
+    items = [
+        ({"stock_symbol": "AAA", "indicator": "MACD", "params": {}, "status_code": 200}, ("AAA", DATES, VALUES)),
+        ({"stock_symbol": "BBB", "indicator": "XYZ", "params": {}, "status_code": 400, "detail": "Unknown"}, None),
+    ]
+
+    records = json.loads(build_batch_response(items, "records").body)
+    assert records[0]["data"] == json.loads(records_json("AAA", DATES, VALUES))
+    assert records[1] == items[1][0]
+    columnar = json.loads(build_batch_response(items, "columnar").body)
+    assert columnar[0]["data"] == json.loads(columnar_json("AAA", DATES, VALUES))
+    lines = build_batch_response(items, "ndjson").body.decode().splitlines()
+    assert [json.loads(line) for line in lines] == records
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.indicators_service import calculate_simple_moving_average, calculate_macd, compute_indicator_window
+from app.services.stock_store import StockStore
+from config import SYMBOL_COL, DATE_COL, OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL, VOLUME_COL, MACD_COL
+
+
+SYMBOLS = ("AAA", "BBB", "CCC")
+
+
+def test_symbol_index_offsets(make_frame):
+    df = make_frame(SYMBOLS, days=60)
+    store = StockStore.from_frame(df)
+
+    assert list(store.symbols) == ["AAA", "BBB", "CCC"]
+    assert store.symbol_index["BBB"] == (60, 120)
+    assert len(store) == 180
+    cols = store.get_symbol_columns("BBB")
+    np.testing.assert_array_equal(cols[CLOSE_COL], df[CLOSE_COL].to_numpy()[60:120])
+    assert np.shares_memory(cols[CLOSE_COL], store.columns[CLOSE_COL])
+
+
+def test_unsorted_frame_is_sorted_on_build(make_frame):
+    df = make_frame(SYMBOLS, days=60).sample(frac=1, random_state=1)
+    store = StockStore.from_frame(df)
+
+    dates = store.get_symbol_columns("CCC")[DATE_COL]
+    assert np.all(dates[1:] > dates[:-1])
+    assert len(dates) == 60
+
+
+def test_unknown_symbol_is_empty(make_store):
+    store = make_store(SYMBOLS, days=60)
+    result = calculate_simple_moving_average(store, "ZZZ", 5, "2022-01-03", "2022-02-01")
+    assert result.empty
+
+
+def test_store_matches_dataframe_path(make_frame):
+    df = make_frame(SYMBOLS, days=60)
+    store = StockStore.from_frame(df)
+
+    expected = calculate_macd(df, "BBB", 12, 26, 9, "2022-02-01", "2022-03-01")
+    actual = calculate_macd(store, "BBB", 12, 26, 9, "2022-02-01", "2022-03-01")
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_compact_store_types_and_memory(make_frame):
+    df = make_frame(SYMBOLS, seed=1)
+    full = StockStore.from_frame(df)
+    compact = StockStore.from_frame(df, compact=True)
+
+    assert compact.columns[CLOSE_COL].dtype == np.float32
+    assert compact.columns[DATE_COL].dtype == np.dtype("datetime64[D]")
+    assert compact.columns[VOLUME_COL].dtype == np.int64
+    assert compact.memory_report()["bytes_per_row"] < 0.7 * full.memory_report()["bytes_per_row"]
+
+    # Indicator math still runs in float64, off only by the float32 rounding of prices
+    _, full_values = compute_indicator_window(full, "BBB", "MACD", {}, "2022-06-01", "2022-12-31")
+    dates, compact_values = compute_indicator_window(compact, "BBB", "MACD", {}, "2022-06-01", "2022-12-31")
+    assert compact_values[MACD_COL].dtype == np.float64
+    np.testing.assert_allclose(compact_values[MACD_COL], full_values[MACD_COL], atol=1e-4)
+    assert dates[0] == np.datetime64("2022-06-01")
+
+
+def test_compact_keeps_columns_that_would_lose_information(make_frame):
+    df = make_frame(SYMBOLS, days=10)
+    df.loc[3, VOLUME_COL] = np.nan
+    df[DATE_COL] = df[DATE_COL] + pd.Timedelta(hours=16)
+    compact = StockStore.from_frame(df, compact=True)
+    assert compact.columns[VOLUME_COL].dtype == np.float64
+    assert compact.columns[DATE_COL].dtype == np.dtype("datetime64[ns]")
+
+
+def test_append_rows_to_a_compact_store(make_store):
+    compact = make_store(SYMBOLS, days=10, compact=True)
+    new_rows = {
+        DATE_COL: np.array(["2022-02-01"], dtype="datetime64[ns]"),
+        CLOSE_COL: np.array([101.25]), OPEN_COL: np.array([100.0]), HIGH_COL: np.array([102.0]),
+        LOW_COL: np.array([99.0]), VOLUME_COL: np.array([500.0]),
+    }
+    extended = compact.append_rows(np.array(["AAA"], dtype=object), new_rows)
+    assert extended.columns[DATE_COL].dtype == np.dtype("datetime64[D]")
+    assert extended.get_symbol_columns("AAA")[VOLUME_COL][-1] == 500
+
+    new_rows[VOLUME_COL] = np.array([np.nan])
+    with pytest.raises(ValueError, match=VOLUME_COL):
+        compact.append_rows(np.array(["AAA"], dtype=object), new_rows)
+
+
+def test_save_replaces_the_snapshot_without_a_gap(tmp_path, make_store, monkeypatch):
+    snapshot = tmp_path / "snapshot"
+    make_store(SYMBOLS, days=10, version="v1").save(snapshot)
+
+    # Every path a reader can open while the new snapshot is switched in is a complete snapshot
+    seen = []
+    replace = os.replace
+
+    def checked_replace(src, dst):
+        replace(src, dst)
+        seen.append(StockStore.load(snapshot).version)
+
+    monkeypatch.setattr(os, "replace", checked_replace)
+    make_store(SYMBOLS, days=12, version="v2").save(snapshot)
+    monkeypatch.undo()
+
+    assert seen and seen[-1] == "v2"
+    assert snapshot.is_symlink() and len(StockStore.load(snapshot)) == 36
+    # The replaced build is deleted; only the live build and the link remain
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["snapshot", os.readlink(snapshot)])
+
+
+def test_appended_rows_stay_in_a_tail_until_it_is_merged(tmp_path, make_store, make_frame):
+    snapshot = tmp_path / "snapshot"
+    store = make_store(SYMBOLS, days=100)
+    store.save(snapshot)
+    next_days = pd.bdate_range("2022-01-03", periods=100)[-1] + pd.offsets.BDay()
+
+    def append(store, frame):
+        return store.append_rows(frame[SYMBOL_COL].to_numpy(dtype=object), {col: frame[col].to_numpy() for col in store.columns})
+
+    bars = make_frame(("AAA", "CCC"), days=1, seed=1, start=next_days)
+    extended = append(store, bars)
+    expected = StockStore.from_frame(pd.concat([make_frame(SYMBOLS, days=100), bars]))
+    # The base columns are shared, the new rows read like any others
+    assert extended.columns[CLOSE_COL] is store.columns[CLOSE_COL]
+    assert len(extended.tail) == 2 and len(extended) == 302
+    for symbol in SYMBOLS:
+        for col, values in expected.get_symbol_columns(symbol).items():
+            np.testing.assert_array_equal(extended.get_symbol_columns(symbol)[col], values)
+    pd.testing.assert_frame_equal(extended.to_frame(), expected.to_frame())
+
+    # The unchanged base files are linked into the new snapshot, not rewritten
+    close_file = os.stat(snapshot / f"{CLOSE_COL}.npy").st_ino
+    extended.save(snapshot)
+    assert os.stat(snapshot / f"{CLOSE_COL}.npy").st_ino == close_file
+    loaded = StockStore.load(snapshot)
+    assert len(loaded.tail) == 2
+    pd.testing.assert_frame_equal(loaded.to_frame(), expected.to_frame())
+
+    # Past APPEND_TAIL_MAX_FRACTION of the rows, the tail is merged into the columns
+    more = make_frame(("AAA",), days=20, seed=2, start=next_days + pd.offsets.BDay())
+    merged = append(loaded, more)
+    assert merged.tail is None and len(merged) == 322
+    pd.testing.assert_frame_equal(merged.to_frame(), StockStore.from_frame(pd.concat([expected.to_frame(), more])).to_frame())
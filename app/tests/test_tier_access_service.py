@@ -0,0 +1,112 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.tier_access_service import LimiterEngine
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_user(tier, requests_today=0, username="alice"):
+    return SimpleNamespace(username=username, subscription_tier=tier,
+                           requests_today=requests_today, last_request_date=date.today())
+
+
+def status_and_detail(engine, user, indicator, start="2022-01-01", end="2022-01-31"):
+    try:
+        engine.check(user, indicator, start, end)
+    except HTTPException as e:
+        return e.status_code, e.detail
+    return 200, None
+
+
+@pytest.mark.parametrize("tier, indicator, start, end, expected", [
+    ("Free", "RSI", "2022-01-01", "2022-01-31", (403, "Free tier: indicator not allowed")),
+    ("Free", "SMA", "2022-01-01", "2022-04-02", (403, "Free tier: max 90 days allowed")),
+    ("Pro", "MACD", "2021-01-01", "2022-01-02", (403, "Pro tier: max 1 year of data allowed")),
+    ("Pro", "Bollinger", "2022-01-01", "2022-01-31", (403, "Pro tier: indicator not allowed")),
+    ("Premium", "Bollinger", "2020-01-01", "2022-12-31", (200, None)),
+    ("Gold", "SMA", "2022-01-01", "2022-01-31", (403, "Unknown subscription tier: Gold")),
+])
+def test_tier_rules(tier, indicator, start, end, expected):
+    assert status_and_detail(LimiterEngine(), make_user(tier), indicator, start, end) == expected
+
+
+def test_daily_quota():
+    engine = LimiterEngine()
+    assert status_and_detail(engine, make_user("Free", requests_today=49), "SMA")[0] == 200
+    assert status_and_detail(engine, make_user("Free", requests_today=50), "SMA") == (403, "Free tier: daily request limit exceeded")
+    assert status_and_detail(engine, make_user("Premium", requests_today=10**6), "SMA")[0] == 200
+
+
+def test_request_cost_scales_with_indicator_and_window():
+    engine = LimiterEngine()
+    assert engine.request_cost("SMA", 30) == 1
+    assert engine.request_cost("Bollinger", 3 * 365) == 9
+    assert engine.request_cost("MACD", 366) == 6
+
+
+def test_token_bucket_burst_and_refill():
+    clock = FakeClock()
+    engine = LimiterEngine(clock=clock)
+    user = make_user("Free")  # burst 5, refill 1/s
+
+    for _ in range(5):
+        assert status_and_detail(engine, user, "SMA")[0] == 200
+    with pytest.raises(HTTPException) as exc:
+        engine.check(user, "SMA", "2022-01-01", "2022-01-31")
+    assert exc.value.status_code == 429 and exc.value.headers == {"Retry-After": "1"}
+
+    clock.now += 2
+    assert [status_and_detail(engine, user, "SMA")[0] for _ in range(3)] == [200, 200, 429]
+    # Buckets are per user
+    assert status_and_detail(engine, make_user("Free", username="bob"), "SMA")[0] == 200
+
+
+def test_heavy_requests_drain_the_bucket_faster():
+    clock = FakeClock()
+    engine = LimiterEngine(clock=clock)
+    user = make_user("Premium")  # burst 60, refill 20/s
+
+    admitted = 0
+    while status_and_detail(engine, user, "Bollinger", "2020-01-01", "2022-12-31")[0] == 200:
+        admitted += 1
+    assert admitted == 6  # cost 9 each
+
+    # A request costing more than the whole bucket waits for a full bucket and then goes into debt
+    engine = LimiterEngine(policies={"Tiny": {"indicators": ["SMA"], "burst": 2, "refill_per_second": 1}}, clock=clock)
+    user = make_user("Tiny")
+    assert status_and_detail(engine, user, "SMA", "2020-01-01", "2022-12-31")[0] == 200
+    clock.now += 1  # cost 3 left the bucket at -1
+    assert status_and_detail(engine, user, "SMA")[0] == 429
+    clock.now += 1
+    assert status_and_detail(engine, user, "SMA")[0] == 200
+
+
+def test_screen_is_gated_per_tier_and_priced_by_universe_size():
+    clock = FakeClock()
+    engine = LimiterEngine(clock=clock)
+
+    with pytest.raises(HTTPException) as exc:
+        engine.check_screen(make_user("Free"), "SMA", 2000)
+    assert (exc.value.status_code, exc.value.detail) == (403, "Free tier: screening not allowed")
+    with pytest.raises(HTTPException) as exc:
+        engine.check_screen(make_user("Pro"), "Bollinger", 2000)
+    assert exc.value.detail == "Pro tier: indicator not allowed"
+
+    assert engine.screen_cost("SMA", 1) == 1
+    assert engine.screen_cost("RSI", 2000) == 40
+    # Premium (burst 60): one 2,000-symbol MACD screen costs 60 and empties the bucket
+    user = make_user("Premium")
+    assert engine.check_screen(user, "MACD", 2000) == 60
+    with pytest.raises(HTTPException) as exc:
+        engine.check_screen(user, "SMA", 50)
+    assert exc.value.status_code == 429
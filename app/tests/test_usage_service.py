@@ -0,0 +1,183 @@
+import multiprocessing
+import threading
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.tier_access_service import check_access
+from app.services.usage_service import (
+    InMemoryUsageSink,
+    InProcessUsageCounter,
+    SharedMemoryUsageCounter,
+    SqlUsageSink,
+    UsageFlusher,
+)
+
+TODAY = date(2024, 3, 1)
+
+
+@pytest.fixture(params=["memory", "shm"])
+def counter(request, tmp_path):
+    if request.param == "memory":
+        yield InProcessUsageCounter()
+    else:
+        shm = SharedMemoryUsageCounter(tmp_path / "usage", slots=64)
+        yield shm
+        shm.close()
+
+
+def test_counter_days_and_seeding(counter):
+    counter.seed("alice", TODAY, 7)
+    assert counter.get("alice", TODAY) == 7
+    assert counter.increment("alice", day=TODAY) == 8
+
+    # An older persisted value never overrides a live counter
+    counter.seed("alice", TODAY - timedelta(days=1), 40)
+    assert counter.get("alice", TODAY) == 8
+
+    # A new day restarts the count
+    assert counter.get("alice", TODAY + timedelta(days=1)) == 0
+    assert counter.increment("alice", day=TODAY + timedelta(days=1)) == 1
+    assert counter.get("nobody", TODAY) == 0
+
+
+def test_drain_and_requeue(counter):
+    counter.seed("alice", TODAY, 10)
+    counter.increment("alice", day=TODAY)
+    counter.increment("bob", 3, day=TODAY)
+    assert counter.drain_dirty() == {"alice": (TODAY, 1), "bob": (TODAY, 3)}
+    assert counter.drain_dirty() == {}
+
+    counter.requeue({"bob": (TODAY, 3)})
+    counter.increment("bob", day=TODAY)
+    assert counter.drain_dirty() == {"bob": (TODAY, 4)}
+    assert counter.get("bob", TODAY) == 4
+
+
+def test_sync_adopts_database_totals(counter):
+    counter.seed("alice", TODAY, 10)
+    counter.increment("alice", 2, day=TODAY)
+    drained = counter.drain_dirty()
+    counter.increment("alice", day=TODAY)  # arrives while the flush is in flight
+
+    # The database also holds 5 requests another worker flushed
+    counter.sync({"alice": (TODAY, 10 + drained["alice"][1] + 5)})
+    assert counter.get("alice", TODAY) == 18
+    assert counter.drain_dirty() == {"alice": (TODAY, 1)}
+
+
+def test_concurrent_increments_are_not_lost(counter):
+    def worker():
+        for _ in range(500):
+            counter.increment("alice", day=TODAY)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.get("alice", TODAY) == 4000
+
+
+def _increment_in_child(path, n):
+    counter = SharedMemoryUsageCounter(path, slots=64)
+    for _ in range(n):
+        counter.increment("alice", day=TODAY)
+    counter.close()
+
+
+def test_shared_memory_counter_across_processes(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_increment_in_child, args=(tmp_path / "usage", 300)) for _ in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    counter = SharedMemoryUsageCounter(tmp_path / "usage", slots=64)
+    assert counter.get("alice", TODAY) == 1200
+    assert counter.drain_dirty() == {"alice": (TODAY, 1200)}
+    assert counter.drain_dirty() == {}
+    counter.close()
+
+
+def test_flusher_batches_and_retries_failed_writes():
+    counter = InProcessUsageCounter()
+    sink = InMemoryUsageSink()
+    flusher = UsageFlusher(counter, sink)
+
+    counter.increment("alice", day=TODAY)
+    counter.increment("bob", day=TODAY)
+    assert flusher.flush() == 2
+    assert sink.rows == {"alice": (TODAY, 1), "bob": (TODAY, 1)} and sink.batches == 1
+    assert flusher.flush() == 0
+
+    class FailingSink:
+        def write(self, usage):
+            raise ConnectionError("database down")
+
+    counter.increment("alice", day=TODAY)
+    with pytest.raises(ConnectionError):
+        UsageFlusher(counter, FailingSink()).flush()
+    assert flusher.flush() == 1
+    assert sink.rows["alice"] == (TODAY, 2)
+
+
+def test_workers_with_own_counters_do_not_overwrite_each_other():
+    sink = InMemoryUsageSink()
+    sink.rows["alice"] = (TODAY, 4)
+    workers = [InProcessUsageCounter(), InProcessUsageCounter()]
+    flushers = [UsageFlusher(counter, sink) for counter in workers]
+    for counter in workers:
+        counter.seed("alice", TODAY, 4)
+
+    workers[0].increment("alice", 3, day=TODAY)
+    workers[1].increment("alice", 2, day=TODAY)
+    for flusher in flushers:
+        flusher.flush()
+    assert sink.rows["alice"] == (TODAY, 9)
+    # The second flush read back the first worker's requests; the first sees them on its next flush
+    assert workers[1].get("alice", TODAY) == 9
+    workers[0].increment("alice", day=TODAY)
+    flushers[0].flush()
+    assert workers[0].get("alice", TODAY) == 10 and sink.rows["alice"] == (TODAY, 10)
+
+
+def test_sql_sink_writes_one_batch():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.db.models import Base, User
+
+    engine = sqlalchemy.create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    yesterday, tomorrow = TODAY - timedelta(days=1), TODAY + timedelta(days=1)
+    with Session() as session:
+        session.add_all([
+            User(username="alice", requests_today=5, last_request_date=TODAY),
+            User(username="bob", requests_today=9, last_request_date=yesterday),
+            User(username="carol", requests_today=2, last_request_date=tomorrow),
+        ])
+        session.commit()
+
+    totals = SqlUsageSink(Session).write({"alice": (TODAY, 6), "bob": (TODAY, 1), "carol": (TODAY, 3)})
+    with Session() as session:
+        rows = {u.username: (u.last_request_date, u.requests_today) for u in session.query(User)}
+    # Same day adds, a new day restarts, a delta of a past day is dropped
+    assert rows == {"alice": (TODAY, 11), "bob": (TODAY, 1), "carol": (tomorrow, 2)}
+    assert totals == rows
+
+
+def test_check_access_reads_usage_counter():
+    counter = InProcessUsageCounter()
+    user = SimpleNamespace(username="alice", subscription_tier="Free", requests_today=0, last_request_date=None)
+    counter.increment("alice", 49)
+    check_access(user, "SMA", "2022-01-01", "2022-02-01", counter)
+
+    counter.increment("alice")
+    with pytest.raises(HTTPException) as exc:
+        check_access(user, "SMA", "2022-01-01", "2022-02-01", counter)
+    assert exc.value.detail == "Free tier: daily request limit exceeded"
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from config import DATA_DIR, SYMBOL_COL, DATE_COL,OPEN_COL,HIGH_COL,LOW_COL,CLOSE_COL
 
@@ -20,47 +21,122 @@ from config import DATA_DIR, SYMBOL_COL, DATE_COL,OPEN_COL,HIGH_COL,LOW_COL,CLOS
 #     except Exception as e:
 #         print(f"Error: {e}")
 
-# def validate_stock_data(df: pd.DataFrame):
-#     missing = df.isnull().sum()
-#     if missing.any():
-#         print("Warning: Missing data detected!")
-#         print(missing[missing > 0])
-#     else:
-#         print("No missing values found.")
+OHLC_COLS = [OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL]
 
 
-def clean_stock_data(df: pd.DataFrame) -> pd.DataFrame:
+def validate_stock_data(df: pd.DataFrame) -> dict:
+    """
+    Summarise gaps in OHLC data without printing full isnull tables.
+
+    Expects lower-cased column names. Gap runs are counted per symbol in date order,
+    so the frame does not have to be sorted.
+
+    Returns:
+        dict: rows, symbols, missing values per column, symbols with any gap,
+        number of gap runs and the longest run of consecutive missing closes.
+    """
+    cols = [col for col in OHLC_COLS if col in df.columns]
+    ordered = df.sort_values([SYMBOL_COL, DATE_COL], kind="stable") if len(df) else df
+    symbols = ordered[SYMBOL_COL].to_numpy()
+    missing = ordered[cols].isna().to_numpy()
+    any_missing = missing.any(axis=1)
+
+    stats = {
+        "rows": int(len(df)),
+        "symbols": int(pd.unique(symbols).size),
+        "missing": {col: int(n) for col, n in zip(cols, missing.sum(axis=0))},
+        "missing_symbol_or_date": int(df[[SYMBOL_COL, DATE_COL]].isna().any(axis=1).sum()),
+        "symbols_with_gaps": int(pd.unique(symbols[any_missing]).size),
+        "gap_runs": 0,
+        "longest_gap": 0,
+    }
+    if CLOSE_COL in cols and missing[:, cols.index(CLOSE_COL)].any():
+        gap = missing[:, cols.index(CLOSE_COL)]
+        new_symbol = np.ones(len(symbols), dtype=bool)
+        new_symbol[1:] = symbols[1:] != symbols[:-1]
+        run_start = gap & (new_symbol | ~np.roll(gap, 1))
+        run_id = np.cumsum(run_start)[gap]
+        stats["gap_runs"] = int(run_start.sum())
+        stats["longest_gap"] = int(np.bincount(run_id).max())
+    return stats
+
+
+def _format_gap_stats(stats: dict) -> str:
+    missing = ", ".join(f"{col}={n}" for col, n in stats["missing"].items())
+    return (
+        f"{stats['rows']} rows / {stats['symbols']} symbols; missing {missing}; "
+        f"{stats['symbols_with_gaps']} symbols with gaps, {stats['gap_runs']} close gaps "
+        f"(longest {stats['longest_gap']} rows)"
+    )
+
+
+def segmented_fill(values: np.ndarray, symbols: np.ndarray) -> np.ndarray:
+    """
+    Forward- then backward-fill NaNs in each column without crossing symbol boundaries.
+
+    `values` is a 2-D float array whose rows are sorted by (symbol, date) and `symbols`
+    the matching symbol per row. Only the missing rows are visited: a binary search over
+    each column's valid row positions gives the nearest valid row before and after every
+    gap, and the earlier one is used when it lies inside the same symbol (as
+    ffill().bfill() per symbol would), otherwise the later one.
+    """
+    filled = values.copy()
+    n = len(values)
+    if n == 0:
+        return filled
+
+    boundaries = np.flatnonzero(np.concatenate(([True], symbols[1:] != symbols[:-1])))
+    segment_stops = np.append(boundaries[1:], n)
+
+    for j in range(values.shape[1]):
+        missing = np.isnan(values[:, j])
+        if not missing.any():
+            continue
+        gap_rows = np.flatnonzero(missing)
+        valid_rows = np.flatnonzero(~missing)
+        segment = np.searchsorted(boundaries, gap_rows, side="right") - 1
+
+        nearest = np.searchsorted(valid_rows, gap_rows)
+        previous = valid_rows[np.maximum(nearest - 1, 0)] if len(valid_rows) else gap_rows
+        following = valid_rows[np.minimum(nearest, len(valid_rows) - 1)] if len(valid_rows) else gap_rows
+        use_previous = (nearest > 0) & (previous >= boundaries[segment])
+        use_following = ~use_previous & (nearest < len(valid_rows)) & (following < segment_stops[segment])
+
+        source = np.where(use_previous, previous, following)
+        filled[gap_rows, j] = np.where(use_previous | use_following, values[source, j], np.nan)
+    return filled
+
+
+def clean_stock_data(df: pd.DataFrame, validate: bool = False) -> pd.DataFrame:
     """
     Clean stock OHLC data by handling missing values smartly.
     - Fills missing OHLC with forward/backward fill per stock.
     - Fills missing volume with 0.
     - Drops rows missing symbol or date.
-    - Prints summary of changes.
+    - Prints a one-line gap summary before and after cleaning when `validate` is set
+      (see validate_stock_data for the statistics).
 
     Returns:
-        Cleaned DataFrame.
+        Cleaned DataFrame, sorted by symbol and date.
     """
 
     df.columns = [col.strip().lower() for col in df.columns]
 
-    print("🔍 Initial missing values:")
-    print(df.isnull().sum())
+    if validate:
+        print("🔍 Before cleaning: " + _format_gap_stats(validate_stock_data(df)))
 
     df = df.dropna(subset=[SYMBOL_COL, DATE_COL])
     df[DATE_COL] = pd.to_datetime(df[DATE_COL])
-    df = df.sort_values([SYMBOL_COL, DATE_COL])
+    df = df.sort_values([SYMBOL_COL, DATE_COL], ignore_index=True)
 
-    df[[OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL]] = (
-        df.groupby(SYMBOL_COL)[[OPEN_COL, HIGH_COL, LOW_COL, CLOSE_COL]]
-        .apply(lambda g: g.ffill().bfill())
-        .reset_index(drop=True)
-    )
+    ohlc = [col for col in OHLC_COLS if col in df.columns]
+    df[ohlc] = segmented_fill(df[ohlc].to_numpy(dtype=np.float64), df[SYMBOL_COL].to_numpy())
 
     # if 'volume' in df.columns:
     #     df['volume'] = df['volume'].fillna(0)
 
-    print("\n✅ Missing values after cleaning:")
-    print(df.isnull().sum())
+    if validate:
+        print("✅ After cleaning: " + _format_gap_stats(validate_stock_data(df)))
 
     return df
 
@@ -68,7 +144,7 @@ def clean_stock_data(df: pd.DataFrame) -> pd.DataFrame:
 def data_cleaning(input_path):
     try:
         df = pd.read_parquet(input_path)
-        after_clean_df = clean_stock_data(df)
+        after_clean_df = clean_stock_data(df, validate=True)
 
     except Exception as e:
         print(f"Error: {e}")